@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Parsing of .pypirc files and repository lookups."""
+
+import os
+import shutil
+import tempfile
+
+from restricted_pkg import base
+
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def make_pypirc(path, size):
+    """Write a .pypirc with 'size' repositories, repo0 ... repo<size-1>."""
+    names = ['repo%d' % i for i in range(size)]
+    with open(path, 'w') as f:
+        f.write('[distutils]\nindex-servers =\n')
+        for name in names:
+            f.write('    %s\n' % name)
+        for i, name in enumerate(names):
+            f.write('\n[%s]\nrepository = https://pypi%d.example.org/%s/\n'
+                'username = user%d\npassword = secret\n' % (name, i % 10, name, i))
+
+
+class ConfigParsing(object):
+    params = SIZES
+    repeat = 3
+
+    def setup(self, size):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, '.pypirc')
+        make_pypirc(self.path, size)
+
+    def teardown(self, size):
+        shutil.rmtree(self.tmpdir)
+
+    def time_parse(self, size):
+        base.PyPIConfig(self.path)
+
+
+class RepoLookup(object):
+    params = SIZES
+
+    def setup(self, size):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, '.pypirc')
+        make_pypirc(path, size)
+        self.config = base.PyPIConfig(path)
+        last = size - 1
+        self.name = 'repo%d' % last
+        self.url = 'https://pypi%d.example.org/repo%d/' % (last % 10, last)
+
+    def teardown(self, size):
+        shutil.rmtree(self.tmpdir)
+
+    def time_by_name(self, size):
+        self.config.get_repo_config(self.name)
+
+    def time_by_url(self, size):
+        self.config.get_repo_config(self.url)
+
+    def time_by_prefix(self, size):
+        self.config.get_repo_config(self.url + 'simple/foo/')
+
+    def time_missing(self, size):
+        self.config.get_repo_config('https://other.example.org/')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Containment checks against private_repository allowlists."""
+
+from restricted_pkg import base
+
+
+SIZES = [1, 100, 10000]
+
+
+def make_patterns(size):
+    patterns = []
+    for i in range(size):
+        if i % 2:
+            patterns.append('https://*.region%d.example.org/' % i)
+        else:
+            patterns.append('https://pypi.example.org/teams/team%d/*/simple/' % i)
+    return patterns
+
+
+class Containment(object):
+    params = SIZES
+
+    def setup(self, size):
+        self.patterns = make_patterns(size)
+        self.matcher = base.RepositoryMatcher(self.patterns)
+        self.allowed = base.RepositoryURL('https://pypi.example.org/teams/team0/web/simple/')
+        self.denied = base.RepositoryURL('https://pypi.example.org/teams/other/web/simple/')
+
+    def time_allowed(self, size):
+        self.allowed in self.matcher
+
+    def time_denied(self, size):
+        self.denied in self.matcher
+
+
+class Compilation(object):
+    params = SIZES
+    repeat = 3
+
+    def setup(self, size):
+        self.patterns = make_patterns(size)
+
+    def time_compile(self, size):
+        base.RepositoryMatcher(self.patterns)
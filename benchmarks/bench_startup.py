@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Cold start: each call runs in a fresh interpreter."""
+
+import os
+import subprocess
+import sys
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP = (
+    "from %s import setup; "
+    "setup(name='foo', version='1.0', private_repository='https://pypi.example.org/', "
+    "script_args=['--version'])"
+)
+
+
+def run_python(code):
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, '-c', code], env=env,
+            stdout=devnull, stderr=devnull)
+
+
+class Startup(object):
+    number = 1
+    repeat = 10
+
+    def time_python(self):
+        """Baseline: an empty interpreter."""
+        run_python("pass")
+
+    def time_import(self):
+        run_python("import restricted_pkg")
+
+    def time_import_commands(self):
+        run_python("import restricted_pkg.commands")
+
+    def time_setup_lazy(self):
+        run_python(SETUP % 'restricted_pkg')
+
+    def time_setup_eager(self):
+        run_python(SETUP % 'restricted_pkg.commands')
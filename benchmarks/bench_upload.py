@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""End-to-end upload throughput, against a local stand-in index server."""
+
+import os
+import shutil
+import tempfile
+
+from distutils import log
+from setuptools.dist import Distribution
+
+from restricted_pkg import base
+from restricted_pkg import commands
+from tests.utils import IndexServer
+
+
+FILES = 8
+FILE_SIZE = 2 * 1024 * 1024
+
+
+class Upload(object):
+    """Upload FILES files of FILE_SIZE bytes, with 1 or 4 jobs."""
+    params = [1, 4]
+    number = 1
+
+    def setup(self, jobs):
+        log.set_threshold(log.WARN)
+        self.tmpdir = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.tmpdir
+        self.server = IndexServer()
+        self.server.start()
+        with open(os.path.join(self.tmpdir, '.pypirc'), 'w') as f:
+            f.write('[distutils]\nindex-servers = private\n\n[private]\n'
+                'repository = %s\nusername = john\npassword = doe\n' % self.server.url)
+        base.clear_config_cache()
+
+        self.dist_files = []
+        content = os.urandom(FILE_SIZE)
+        for i in range(FILES):
+            path = os.path.join(self.tmpdir, 'foo-1.0-py%d-none-any.whl' % i)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.dist_files.append(('bdist_wheel', 'py%d' % i, path))
+
+    def teardown(self, jobs):
+        self.server.stop()
+        if self.old_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.tmpdir)
+
+    def time_upload(self, jobs):
+        dist = Distribution({'name': 'foo', 'version': '1.0'})
+        dist.private_repository = self.server.url
+        dist.dist_files = self.dist_files
+        cmd = commands.upload(dist)
+        cmd.jobs = jobs
+        cmd.ensure_finalized()
+        cmd.run()
+        # Don't keep uploaded bodies around between samples
+        del self.server.requests[:]
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Run the benchmark suite, optionally against a baseline.
+
+Benchmarks follow asv's conventions: classes in benchmarks/bench_*.py, with
+time_* methods, optional setup() / teardown() methods, and an optional
+'params' list, passed to setup() and to each method. The 'number' attribute
+fixes the number of calls per sample (1 for cold-start benchmarks); otherwise,
+it is calibrated so that a sample takes about 50ms.
+
+The best sample of each benchmark, in seconds per call, is reported; with
+--compare, benchmarks slower than the baseline by more than --threshold are
+flagged and the exit status is 1.
+
+Usage:
+    python -m benchmarks.run [-b PATTERN] [--save baseline.json]
+    python -m benchmarks.run --compare benchmarks/baseline.json
+"""
+
+from __future__ import print_function
+
+import glob
+import importlib
+import inspect
+import json
+import optparse
+import os
+import re
+import sys
+import timeit
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_TIME = 0.05
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.5
+
+
+def discover(pattern=None):
+    """Find benchmarks.
+
+    Yields:
+        (str, class, str, object): name, class, method name and parameter
+        (None for unparametrized benchmarks)
+    """
+    regexp = re.compile(pattern) if pattern else None
+    for path in sorted(glob.glob(os.path.join(BENCHMARKS_DIR, 'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        module = importlib.import_module('benchmarks.' + module_name)
+        for class_name, klass in sorted(vars(module).items()):
+            if not inspect.isclass(klass) or klass.__module__ != module.__name__:
+                continue
+            for method in sorted(name for name in dir(klass) if name.startswith('time_')):
+                for param in getattr(klass, 'params', [None]):
+                    name = '%s.%s.%s' % (module_name, class_name, method)
+                    if param is not None:
+                        name = '%s(%r)' % (name, param)
+                    if regexp is None or regexp.search(name):
+                        yield name, klass, method, param
+
+
+def measure(klass, method, param, repeat):
+    """Time a benchmark.
+
+    Returns:
+        float: the best time per call, in seconds
+    """
+    args = () if param is None else (param,)
+    instance = klass()
+    if hasattr(instance, 'setup'):
+        instance.setup(*args)
+    try:
+        func = getattr(instance, method)
+        timer = timeit.Timer(lambda: func(*args))
+        number = getattr(instance, 'number', 0)
+        if not number:
+            number = 1
+            while timer.timeit(number) < SAMPLE_TIME and number < 10 ** 6:
+                number *= 10
+        samples = timer.repeat(getattr(instance, 'repeat', repeat), number)
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*args)
+    return min(samples) / number
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '%.3g%s' % (seconds / scale, unit)
+    return '%.3gns' % (seconds / 1e-9)
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-b', '--bench', metavar='PATTERN',
+        help="Only run benchmarks whose name matches this regexp")
+    parser.add_option('-r', '--repeat', type='int', default=DEFAULT_REPEAT,
+        help="Number of samples per benchmark [default: %default]")
+    parser.add_option('--save', metavar='FILE', help="Save results as a baseline")
+    parser.add_option('--compare', metavar='FILE', help="Compare results to a baseline")
+    parser.add_option('--threshold', type='float', default=DEFAULT_THRESHOLD,
+        help="Slowdown ratio reported as a regression [default: %default]")
+    options, _args = parser.parse_args(argv)
+
+    baseline = {}
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    for name, klass, method, param in discover(options.bench):
+        results[name] = seconds = measure(klass, method, param, options.repeat)
+        line = '%-70s %10s' % (name, format_time(seconds))
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += '  %5.2fx' % ratio
+            if ratio > options.threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+        sys.stdout.flush()
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if regressions:
+        print("%d benchmarks slower than the baseline by more than %.2fx"
+            % (len(regressions), options.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""A local credential agent, to avoid prompting for the same credentials.
+
+The agent is a small daemon listening on a Unix socket, keeping credentials
+in memory for a limited time.
+Commands find it through the RESTRICTED_PKG_AGENT_SOCK environment variable:
+
+    $ eval $(python -m restricted_pkg.agent)
+    $ python setup.py register
+    $ python setup.py sdist upload
+
+The protocol is a single JSON object per connection, each way:
+    {"action": "get", "url": ...} => {"username": ..., "password": ...} or {}
+    {"action": "set", "url": ..., "username": ..., "password": ...} => {"ok": true}
+"""
+
+import json
+import optparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from .compat import socketserver
+
+
+SOCKET_ENV_VAR = 'RESTRICTED_PKG_AGENT_SOCK'
+DEFAULT_TTL = 3600
+CLIENT_TIMEOUT = 1.0
+MAX_MESSAGE_SIZE = 64 * 1024
+
+
+def _read_message(sock):
+    """Read a newline-terminated JSON message from a socket."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if b'\n' in chunk or size > MAX_MESSAGE_SIZE:
+            break
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def _write_message(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+class CredentialStore(object):
+    """In-memory credentials, expiring after a TTL.
+
+    Attributes:
+        ttl (float): lifetime of stored credentials, in seconds
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._credentials = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Retrieve (username, password) for a URL, or None."""
+        with self._lock:
+            entry = self._credentials.get(url)
+            if entry is None:
+                return None
+            expires, username, password = entry
+            if expires < self.clock():
+                del self._credentials[url]
+                return None
+            return username, password
+
+    def set(self, url, username, password):
+        with self._lock:
+            self._credentials[url] = (self.clock() + self.ttl, username, password)
+
+
+class AgentRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        store = self.server.store
+        try:
+            message = _read_message(self.request)
+        except ValueError:
+            return
+
+        action = message.get('action')
+        if action == 'get':
+            credentials = store.get(message.get('url'))
+            if credentials is None:
+                response = {}
+            else:
+                response = {'username': credentials[0], 'password': credentials[1]}
+        elif action == 'set':
+            store.set(message.get('url'), message.get('username', ''), message.get('password', ''))
+            response = {'ok': True}
+        else:
+            response = {'error': "Unknown action %r" % action}
+        _write_message(self.request, response)
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """The credential agent server.
+
+    Attributes:
+        store (CredentialStore): the credentials held by the agent
+    """
+    daemon_threads = True
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.store = CredentialStore(ttl)
+        old_umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, AgentRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+
+class AgentClient(object):
+    """Client for a running credential agent.
+
+    Errors talking to the agent are never fatal: the agent is only a
+    shortcut, and callers fall back to prompting.
+    """
+
+    def __init__(self, path, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    def _query(self, message):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+            _write_message(sock, message)
+            return _read_message(sock)
+        except (socket.error, ValueError):
+            return {}
+        finally:
+            sock.close()
+
+    def get(self, url):
+        """Retrieve (username, password) for a URL, or None."""
+        response = self._query({'action': 'get', 'url': url})
+        if 'username' in response:
+            return response['username'], response.get('password', '')
+        return None
+
+    def set(self, url, username, password):
+        self._query({
+            'action': 'set',
+            'url': url,
+            'username': username,
+            'password': password,
+        })
+
+
+def get_client():
+    """Retrieve an AgentClient for the agent in use, if any."""
+    path = os.environ.get(SOCKET_ENV_VAR)
+    if not path or not hasattr(socket, 'AF_UNIX'):
+        return None
+    return AgentClient(path)
+
+
+def _detach():
+    """Detach the forked agent from its session and standard streams."""
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-a', '--socket', dest='socket',
+        help="Path to the Unix socket to listen on")
+    parser.add_option('-t', '--ttl', dest='ttl', type='int', default=DEFAULT_TTL,
+        help="Lifetime of stored credentials, in seconds [default: %default]")
+    parser.add_option('-d', '--foreground', dest='foreground', action='store_true',
+        help="Don't fork to the background")
+    options, _args = parser.parse_args(argv)
+
+    path = options.socket
+    tmpdir = None
+    if path is None:
+        tmpdir = tempfile.mkdtemp(prefix='restricted_pkg-')
+        path = os.path.join(tmpdir, 'agent.sock')
+
+    server = AgentServer(path, ttl=options.ttl)
+    sys.stdout.write("%s=%s; export %s;\n" % (SOCKET_ENV_VAR, path, SOCKET_ENV_VAR))
+    sys.stdout.flush()
+
+    if not options.foreground:
+        if os.fork():
+            return 0
+        _detach()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+        if tmpdir is not None:
+            os.rmdir(tmpdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
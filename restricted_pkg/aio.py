@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Publish distributions from an asyncio application (Python 3.7+).
+
+Uploads go through the 'upload' command, so repositories are resolved and
+checked against private_repository exactly as for 'setup.py upload'. The
+blocking parts (reading configuration files, streaming files to the
+repository) run in a thread pool, sized by the concurrency limit.
+
+Credentials are never prompted for: they must come from the environment,
+configuration files or a credential agent.
+
+Example:
+
+    publisher = aio.Publisher(concurrency=16)
+    await publisher.publish(['dist/foo-1.0.tar.gz'], 'https://@pypi.example.org/')
+"""
+
+import asyncio
+import concurrent.futures
+import os
+
+from distutils.errors import DistutilsError
+
+from . import commands
+from . import publish as publish_module
+from .dist import Distribution
+
+
+DEFAULT_CONCURRENCY = 8
+
+
+def guess_metadata(filename):
+    """Extract the project name and version from a distribution file name.
+
+    Returns:
+        dict: with 'name' and 'version' keys
+    Raises:
+        ValueError: if the file name isn't recognized
+    """
+    entry = publish_module.dist_file(filename)
+    if entry is None:
+        raise ValueError("Unknown distribution format: %s" % filename)
+    basename = os.path.basename(filename)
+    for suffix, _command in publish_module.DIST_COMMANDS:
+        if basename.endswith(suffix):
+            stem = basename[:-len(suffix)]
+            break
+    if entry[0] == 'sdist':
+        name, _sep, version = stem.rpartition('-')
+    else:
+        # name-version-...; dashes within names are escaped as underscores
+        name, _sep, version = stem.partition('-')
+        version = version.split('-', 1)[0]
+    if not name or not version:
+        raise ValueError("Unable to find the name and version of %s" % filename)
+    return {'name': name, 'version': version}
+
+
+class Publisher(object):
+    """Upload distributions on an event loop, with a shared concurrency limit.
+
+    A single Publisher may serve many concurrent publish() calls: at most
+    'concurrency' files are uploaded at any time, across all of them.
+
+    Attributes:
+        concurrency (int): the maximum number of concurrent uploads
+        pypirc (str): path to the .pypirc file, for credentials
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, pypirc=None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1, got %r" % concurrency)
+        self.concurrency = concurrency
+        self.pypirc = pypirc
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # Created lazily, so that it binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def make_upload(self, filename, private_repository, metadata=None, repository=None,
+            skip_existing=False):
+        """Prepare the upload command of a file; this reads configuration files.
+
+        Raises:
+            DistutilsError: if the file can't be uploaded to that repository,
+                e.g. for lack of credentials
+        """
+        entry = publish_module.dist_file(filename)
+        if entry is None:
+            raise DistutilsError("Unknown distribution format: %s" % filename)
+        attrs = dict(metadata or guess_metadata(filename))
+        attrs['private_repository'] = private_repository
+
+        distribution = Distribution(attrs)
+        distribution.dist_files = [entry]
+        cmd = commands.upload(distribution)
+        cmd.pypirc = self.pypirc
+        cmd.repository = repository
+        cmd.skip_existing = skip_existing
+        # No terminal to prompt from, and prompting would block a worker
+        cmd.prompt = False
+        cmd.ensure_finalized()
+        return cmd
+
+    async def upload(self, filename, private_repository, metadata=None, repository=None,
+            skip_existing=False):
+        """Upload a single file, once a concurrency slot is available.
+
+        If cancelled while the file is being sent, the transfer itself runs to
+        completion in its thread; files still waiting for a slot are never sent.
+        """
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            cmd = await loop.run_in_executor(self.executor, lambda: self.make_upload(
+                filename, private_repository, metadata, repository, skip_existing))
+            await loop.run_in_executor(self.executor, cmd.run)
+
+    async def publish(self, files, private_repository, metadata=None, repository=None,
+            skip_existing=False):
+        """Upload distribution files to a private repository.
+
+        Args:
+            files (str list): paths to the distribution files
+            private_repository (str or str list): the package's private_repository
+                setting, as passed to setup()
+            metadata (dict): setup() metadata (name, version, ...) of the files;
+                guessed from each file name if unset
+            repository (str): URL or alias of the target repository, which must
+                be allowed by private_repository
+            skip_existing (bool): whether to skip files already published
+
+        Raises:
+            DistutilsError: once all uploads are done, if any of them failed
+            asyncio.CancelledError: if cancelled; pending uploads are cancelled too
+        """
+        files = list(files)
+        results = await asyncio.gather(*[
+            self.upload(filename, private_repository, metadata, repository, skip_existing)
+            for filename in files
+        ], return_exceptions=True)
+
+        failures = []
+        for filename, result in zip(files, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                failures.append('%s (%s)' % (os.path.basename(filename), result))
+        if failures:
+            raise DistutilsError("Upload of %d of %d files failed: %s"
+                % (len(failures), len(files), ', '.join(failures)))
+
+    def close(self):
+        """Release the worker threads, once running uploads are done."""
+        self.executor.shutdown(wait=True)
+
+
+async def publish(files, private_repository, metadata=None, repository=None,
+        skip_existing=False, concurrency=DEFAULT_CONCURRENCY, pypirc=None):
+    """Upload distribution files with a dedicated Publisher.
+
+    See Publisher.publish(); use a shared Publisher to bound concurrency
+    across several calls.
+    """
+    publisher = Publisher(concurrency, pypirc)
+    try:
+        await publisher.publish(files, private_repository, metadata, repository, skip_existing)
+    finally:
+        # Don't block the event loop on transfers left running by a cancellation
+        publisher.executor.shutdown(wait=False)
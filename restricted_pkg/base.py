@@ -5,93 +5,20 @@
 
 """Handle repository-related logic."""
 
+import bisect
 import getpass
+import os
 import sys
+import threading
 
+from . import compat
+from . import retry
+from . import timing
 from .compat import configparser
-from .compat import urlparse, urlunparse
-
-
-class RepositoryURL(object):
-    """Representation of a repository URL.
-
-    Also handles auth.
-
-    Attributes:
-        scheme, netloc, path, params, query, fragment: usual URL components
-        with_auth (bool): whether the URL requires auth
-        username (str): Username to use for the URL
-        password (str): password to use for the URL
-    """
-
-    def __init__(self, url):
-        scheme, netloc, path, params, query, fragment = urlparse(url)
-        self.scheme = scheme
-
-        self.with_auth = False
-        self.username = self.password = ''
-
-        if '@' in netloc:
-            self.with_auth = True
-            ident, self.netloc = netloc.rsplit('@', 1)
-            if ':' in ident:
-                self.username, self.password = ident.split(':', 1)
-            else:
-                self.username = ident
-
-        else:
-            self.netloc = netloc
-
-        self.path = path
-        self.params = params
-        self.query = query
-        self.fragment = fragment
-
-    def __contains__(self, other):
-        """Another url is 'contained' if it shares scheme, host, path prefix."""
-        if not isinstance(other, RepositoryURL):
-            return NotImplemented
-
-        return (self.scheme == other.scheme
-            and self.netloc == other.netloc
-            and other.path.startswith(self.path)
-        )
-
-    @property
-    def needs_auth(self):
-        """Whether this server needs auth."""
-        return bool(self.with_auth or self.username or self.password)
-
-    @property
-    def base_url(self):
-        """The base, unauthenticated URL for the repository."""
-        return urlunparse((
-            self.scheme,
-            self.netloc,
-            self.path,
-            self.params,
-            self.query,
-            self.fragment,
-        ))
-
-    @property
-    def full_url(self):
-        """The full URL, including username/password."""
-        if self.needs_auth:
-            netloc = '%s:%s@%s' % (self.username, self.password, self.netloc)
-        else:
-            netloc = self.netloc
-        return urlunparse((
-            self.scheme,
-            netloc,
-            self.path,
-            self.params,
-            self.query,
-            self.fragment,
-        ))
-
-    def __str__(self):
-        return self.full_url
+from .urls import (
+    RepositoryMatcher, RepositoryURL, is_pattern, mirror_urls, repository_urls,
+    split_host,
+)
 
 
 def config_get(config, section, option, default=None):
@@ -101,6 +28,24 @@ def config_get(config, section, option, default=None):
         return default
 
 
+def config_number(config, section, option, kind, default):
+    """Read a numeric option.
+
+    Raises:
+        ValueError: if the option is set to an invalid or negative number
+    """
+    value = config_get(config, section, option)
+    if value is None:
+        return default
+    try:
+        number = kind(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise ValueError("Invalid %s in [%s]: %r" % (option, section, value))
+    return number
+
+
 class RepositoryConfig(object):
     """Holds data about a .pypirc repository entry.
 
@@ -109,6 +54,9 @@ class RepositoryConfig(object):
         url (RepositoryURL): the URL of the repository
         username (str): username to connect to the repository
         password (str): password to connect to the repository
+        retry_policy (retry.RetryPolicy): how to retry requests rejected
+            by the repository, from the 'retries', 'retry-backoff' and
+            'retry-max-backoff' options
     """
 
     DEFAULT_REPOSITORIES = {
@@ -120,6 +68,7 @@ class RepositoryConfig(object):
         self.url = None
         self.username = ''
         self.password = ''
+        self.retry_policy = retry.RetryPolicy()
 
     def fill(self, config, section):
         """Fill data from a given configuration section.
@@ -130,68 +79,151 @@ class RepositoryConfig(object):
         """
         if config.has_section(section):
             default_url = self.DEFAULT_REPOSITORIES.get(self.name, '')
-            self.url = RepositoryURL(config_get(config, section, 'repository', default_url))
+            self.url = RepositoryURL.interned(
+                config_get(config, section, 'repository', default_url))
             self.username = config_get(config, section, 'username', '')
             self.password = config_get(config, section, 'password', '')
-
+            self.retry_policy = retry.RetryPolicy(
+                retries=config_number(config, section, 'retries', int,
+                    retry.DEFAULT_RETRIES),
+                backoff=config_number(config, section, 'retry-backoff', float,
+                    retry.DEFAULT_BACKOFF),
+                max_backoff=config_number(config, section, 'retry-max-backoff', float,
+                    retry.DEFAULT_MAX_BACKOFF),
+            )
+
+    @timing.timed('RepositoryConfig.prompt_auth')
     def prompt_auth(self):
         """Prompt the user for login/pass, if needed."""
         if self.username and self.password:
             return
         sys.stdout.write("Please insert your credentials for %s\n" % self.url.base_url)
         while not self.username:
-            self.username = raw_input("Username [%s]: " % getpass.getuser())
+            self.username = compat.raw_input("Username [%s]: " % getpass.getuser())
 
         while not self.password:
             self.password = getpass.getpass("Password: ")
 
+    def fetch_agent_auth(self, client):
+        """Fill missing login/pass from a credential agent.
+
+        Args:
+            client (agent.AgentClient): the agent to query
+        """
+        credentials = client.get(self.url.base_url)
+        if credentials is None:
+            return
+        username, password = credentials
+        if self.username and self.username != username:
+            # Stored credentials are for another account
+            return
+        self.username = username
+        self.password = self.password or password
+
     @property
     def needs_auth(self):
         """Whether this repository needs authentication."""
         return self.username or self.password or (self.url and self.url.needs_auth)
 
-    def get_clean_url(self):
-        """Retrieve the clean, full URL - including username/password."""
-        if self.needs_auth:
-            self.prompt_auth()
-        url = RepositoryURL(self.url.full_url)
-        url.username = self.username
-        url.password = self.password
-        return url
+    @timing.timed('RepositoryConfig.get_clean_url')
+    def get_clean_url(self, url=None, prompt=True):
+        """Retrieve the clean, full URL - including username/password.
+
+        Args:
+            url (RepositoryURL): the URL to add credentials to, defaults to
+                the repository's, e.g. a URL below it
+            prompt (bool): whether to prompt for missing credentials
+
+        Raises:
+            ValueError: if credentials are missing, and prompt is unset
+        """
+        if self.needs_auth and not (self.username and self.password):
+            # Imported here so that 'python -m restricted_pkg.agent' works cleanly
+            from . import agent
+            client = agent.get_client()
+            if client is not None:
+                self.fetch_agent_auth(client)
+            if not (self.username and self.password):
+                if not prompt:
+                    raise ValueError("Missing credentials for %s" % self.url.base_url)
+                self.prompt_auth()
+                if client is not None:
+                    client.set(self.url.base_url, self.username, self.password)
+        return (url or self.url).replace(
+            with_auth=self.url.needs_auth,
+            username=self.username,
+            password=self.password,
+        )
 
 
 class PyPIConfig(object):
     """Representation of a .pypirc config file.
 
     Attributes:
-        path (str): path to the .pypirc file
+        path (str): path to the .pypirc config file
         repositories (RepositoryConfig list): configured repositories
     """
+
+    # Section listing repositories in its 'index-servers' option
+    INDEX_SECTION = 'distutils'
+    # Name of the section describing a repository
+    SERVER_SECTION = '%s'
+
     def __init__(self, path):
         self.path = path
         self.repositories = []
+        # name => RepositoryConfig
+        self._by_name = {}
+        # (scheme, netloc) => {path: RepositoryConfig}
+        self._by_location = {}
+        # (scheme, netloc) => sorted list of paths from _by_location
+        self._sorted_paths = {}
         self._read_config()
 
+    @timing.timed('PyPIConfig._read_config')
     def _read_config(self):
         """Read the configuration file."""
         config = configparser.ConfigParser()
         config.read(self.path)
-        if config.has_section('distutils'):
-            server_names = config.get('distutils', 'index-servers')
+        if config.has_section(self.INDEX_SECTION):
+            server_names = config.get(self.INDEX_SECTION, 'index-servers')
             servers = [name.strip() for name in server_names.split('\n')]
             servers = [server for server in servers if server]
 
             for server in servers:
                 repo_config = RepositoryConfig(server)
-                repo_config.fill(config, server)
+                repo_config.fill(config, self.SERVER_SECTION % server)
                 self.repositories.append(repo_config)
 
         repo_config = RepositoryConfig('default')
         repo_config.fill(config, 'server-login')
 
+        self._build_index()
+
+    def _build_index(self):
+        """Index repositories by name and by location.
+
+        When several entries share a name or a URL, the first one wins.
+        """
+        for repo_config in self.repositories:
+            self._by_name.setdefault(repo_config.name, repo_config)
+            url = repo_config.url
+            if url is None or not url.netloc:
+                continue
+            paths = self._by_location.setdefault((url.scheme, url.netloc), {})
+            paths.setdefault(url.path, repo_config)
+
+        for location, paths in self._by_location.items():
+            self._sorted_paths[location] = sorted(paths)
+
     def get_repo_config(self, repo='default'):
         """Retrieve configuration for a given repository.
 
+        Lookups by URL return, in order of preference:
+        - the repository with that exact URL
+        - the repository whose URL is the longest prefix of the given URL
+        - the closest repository located below the given URL
+
         Args:
             repo (str): a repository "realm" (alias) or its URL
 
@@ -199,8 +231,189 @@ class PyPIConfig(object):
             RepositoryConfig: if there is configuration for that repository
             None: otherwise
         """
-        for repo_config in self.repositories:
-            if repo_config.name == repo or repo_config.url in RepositoryURL(repo):
-                return repo_config
+        repo_config = self._by_name.get(repo)
+        if repo_config is not None:
+            return repo_config
+
+        url = RepositoryURL.interned(repo)
+        location = (url.scheme, url.netloc)
+        paths = self._by_location.get(location)
+        if not paths:
+            return None
+
+        # Exact match, or longest configured prefix of the URL
+        for prefix in _path_prefixes(url.path):
+            if prefix in paths:
+                return paths[prefix]
+
+        # A configured repository below the URL
+        sorted_paths = self._sorted_paths[location]
+        index = bisect.bisect_left(sorted_paths, url.path)
+        if index < len(sorted_paths) and sorted_paths[index].startswith(url.path):
+            return paths[sorted_paths[index]]
 
         return None
+
+
+class ProjectConfig(PyPIConfig):
+    """Repositories declared in a project's setup.cfg.
+
+    Sections are namespaced, so as not to clash with command options::
+
+        [restricted_pkg]
+        index-servers = private
+
+        [restricted_pkg:private]
+        repository = https://pypi.example.org/
+    """
+
+    INDEX_SECTION = 'restricted_pkg'
+    SERVER_SECTION = 'restricted_pkg:%s'
+
+
+class EnvironmentConfig(object):
+    """Repository credentials from environment variables.
+
+    $RESTRICTED_PKG_USERNAME and $RESTRICTED_PKG_PASSWORD apply to URLs below
+    $RESTRICTED_PKG_REPOSITORY, or to any URL if it isn't set. Lookups never
+    touch the filesystem.
+    """
+
+    REPOSITORY_VAR = 'RESTRICTED_PKG_REPOSITORY'
+    USERNAME_VAR = 'RESTRICTED_PKG_USERNAME'
+    PASSWORD_VAR = 'RESTRICTED_PKG_PASSWORD'
+
+    def __init__(self, environ=None):
+        self.environ = os.environ if environ is None else environ
+
+    def get_repo_config(self, repo):
+        """Retrieve credentials for a repository URL.
+
+        Returns:
+            RepositoryConfig: for the requested URL, if credentials apply to it
+            None: otherwise
+        """
+        username = self.environ.get(self.USERNAME_VAR, '')
+        password = self.environ.get(self.PASSWORD_VAR, '')
+        if not (username or password) or '://' not in repo:
+            return None
+
+        url = RepositoryURL.interned(repo)
+        configured = self.environ.get(self.REPOSITORY_VAR)
+        if configured and url not in RepositoryMatcher.compiled([configured]):
+            return None
+
+        repo_config = RepositoryConfig('environment')
+        repo_config.url = url
+        repo_config.username = username
+        repo_config.password = password
+        return repo_config
+
+
+SYSTEM_PYPI_RC = '/etc/pypirc'
+PROJECT_CONFIG = 'setup.cfg'
+
+
+def iter_config_layers(pypirc, project_dir=None, environ=None, files_only=False):
+    """Yield configuration layers, most specific first.
+
+    Layers are built lazily: the environment (unless files_only is set), the
+    project's setup.cfg, the user's .pypirc, then the system-wide /etc/pypirc.
+    """
+    if not files_only:
+        yield EnvironmentConfig(environ)
+    yield get_pypi_config(
+        os.path.join(project_dir or os.getcwd(), PROJECT_CONFIG), ProjectConfig)
+    yield get_pypi_config(pypirc)
+    yield get_pypi_config(SYSTEM_PYPI_RC)
+
+
+def find_repo_config(repo, pypirc, project_dir=None, environ=None, files_only=False):
+    """Retrieve configuration for a repository, from the first layer knowing it.
+
+    Args:
+        repo (str): a repository alias or URL
+        pypirc (str): path to the user's .pypirc file
+        project_dir (str): directory holding the project's setup.cfg,
+            defaults to the current directory
+        environ (dict): the environment, defaults to os.environ
+        files_only (bool): skip the environment, which only holds credentials
+
+    Returns:
+        RepositoryConfig: if a layer has configuration for that repository
+        None: otherwise
+    """
+    for layer in iter_config_layers(pypirc, project_dir, environ, files_only):
+        repo_config = layer.get_repo_config(repo)
+        if repo_config is not None:
+            return repo_config
+    return None
+
+
+def _path_prefixes(path):
+    """Yield the prefixes of a URL path, longest first.
+
+    Prefixes are cut at '/' boundaries, both with and without the trailing
+    slash: '/a/b' yields '/a/b/', '/a/b', '/a/', '/a', '/', ''.
+    """
+    if not path.endswith('/'):
+        yield path + '/'
+    yield path
+    end = len(path)
+    while end > 0:
+        end = path.rfind('/', 0, end)
+        if end < 0:
+            break
+        if end + 1 < len(path):
+            yield path[:end + 1]
+        yield path[:end]
+
+
+_CONFIG_CACHE = {}
+_CONFIG_CACHE_LOCK = threading.Lock()
+
+
+def file_signature(path):
+    """Compute a cheap change marker for a file: (mtime, size, inode).
+
+    Returns None if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+    return (mtime, stat.st_size, stat.st_ino)
+
+
+def get_pypi_config(path, config_class=PyPIConfig):
+    """Retrieve the PyPIConfig for a .pypirc file, through a process-wide cache.
+
+    The parsed configuration is reused as long as the file's stat signature
+    (mtime, size, inode) doesn't change.
+
+    Args:
+        path (str): path to the .pypirc config file
+        config_class (type): PyPIConfig or a subclass, to parse the file
+
+    Returns:
+        PyPIConfig: the (possibly shared) parsed configuration
+    """
+    path = os.path.abspath(os.path.expanduser(path))
+    key = (path, config_class)
+    signature = file_signature(path)
+    with _CONFIG_CACHE_LOCK:
+        cached = _CONFIG_CACHE.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    pypi_config = config_class(path)
+    with _CONFIG_CACHE_LOCK:
+        _CONFIG_CACHE[key] = (signature, pypi_config)
+    return pypi_config
+
+
+def clear_config_cache():
+    """Drop all cached PyPIConfig objects."""
+    with _CONFIG_CACHE_LOCK:
+        _CONFIG_CACHE.clear()
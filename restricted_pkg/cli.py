@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""The 'restricted-pkg' command line tool."""
+
+from __future__ import print_function
+
+import importlib
+import sys
+
+
+# command => (module, description)
+COMMANDS = {
+    'publish': ('restricted_pkg.publish', "Build and upload many packages at once"),
+    'serve': ('restricted_pkg.serve', "Serve a local index merging the private repository and PyPI"),
+}
+
+
+def usage(stream):
+    print("Usage: restricted-pkg COMMAND [options]\n\nCommands:", file=stream)
+    for name, (_module, description) in sorted(COMMANDS.items()):
+        print("    %-12s %s" % (name, description), file=stream)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        usage(sys.stdout if argv else sys.stderr)
+        return 0 if argv else 2
+    if argv[0] not in COMMANDS:
+        print("Unknown command %r." % argv[0], file=sys.stderr)
+        usage(sys.stderr)
+        return 2
+
+    module = importlib.import_module(COMMANDS[argv[0]][0])
+    return module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
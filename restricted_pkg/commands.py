@@ -4,17 +4,25 @@
 
 import os
 import re
+import shutil
+import socket
 import sys
+import tempfile
+import threading
 
-from distutils.errors import DistutilsOptionError, DistutilsSetupError
+from distutils.errors import DistutilsError, DistutilsOptionError, DistutilsSetupError
 from distutils import log
+from distutils.cmd import Command
+from distutils.spawn import spawn
+import pkg_resources
 import setuptools
 from setuptools.command.install import install as base_install
 from setuptools.command.easy_install import easy_install as base_easy_install
 from setuptools.command.upload_docs import upload_docs as base_upload_docs
+from setuptools.package_index import PackageIndex
 
 
-from .compat import urlparse
+from .compat import http_client, unquote, urljoin, urlparse
 
 
 try:
@@ -27,37 +35,180 @@ except ImportError:
     from setuptools.command.register import register as base_register
 
 from . import base
+from . import digests
+from . import docs
+from . import httpcache
+from . import index
+from . import multipart
+from . import parallel
+from . import prefetch
+from . import retry
+from . import timing
+from . import transport
+from . import wheelhouse
+# Historical location of setup(), which registers lazy proxies for our commands
+from .lazy import setup
 
 
 DEFAULT_PYPI_RC = '~/.pypirc'
+DEFAULT_PREFETCH_JOBS = 8
+DEFAULT_INSTALL_JOBS = 4
+INSTALL_BACKENDS = ('easy_install', 'pip')
 
+# (form field, hashlib algorithm, algorithm options) for file content digests
+FILE_CONTENT_DIGESTS = [
+    ('md5_digest', 'md5', {}),
+    ('sha256_digest', 'sha256', {}),
+    ('blake2_256_digest', 'blake2b', {'digest_size': 32}),
+]
 
-def get_repo_url(pypirc, repository):
+
+def _is_installed(requirement):
+    """Whether a requirement is satisfied by the current working set."""
+    try:
+        return pkg_resources.working_set.find(requirement) is not None
+    except pkg_resources.VersionConflict:
+        return False
+
+
+def _find_repo_config(pypirc, repository, files_only=False):
+    try:
+        return base.find_repo_config(repository, pypirc, files_only=files_only)
+    except ValueError as e:
+        raise DistutilsOptionError("Invalid configuration: %s" % e)
+
+
+@timing.timed('get_repo_url')
+def get_repo_url(pypirc, repository, prompt=True):
     """Fetch the RepositoryURL for a given repository, reading info from pypirc.
 
-    Will try to find the repository in the .pypirc, including username/password.
+    Will try to find the repository, including username/password, in the
+    environment, the project's setup.cfg, the .pypirc then /etc/pypirc.
 
     Args:
         pypirc (str): path to the .pypirc config file
         repository (str): URL or alias for the repository
+        prompt (bool): whether to prompt for missing credentials
 
     Returns:
         base.RepositoryURL for the repository
+    Raises:
+        DistutilsOptionError: if credentials are missing, and prompt is unset
     """
-    pypirc = os.path.abspath(os.path.expanduser(pypirc))
-    pypi_config = base.PyPIConfig(pypirc)
-    repo_config = pypi_config.get_repo_config(repository)
-    if repo_config:
-        return repo_config.get_clean_url()
-    else:
+    repo_config = _find_repo_config(pypirc, repository)
+    if not repo_config:
         return base.RepositoryURL(repository)
+    url = None
+    if '://' in repository:
+        requested = base.RepositoryURL.interned(repository)
+        if repo_config.url not in requested:
+            # A parent repository: only its credentials apply
+            url = requested
+    try:
+        return repo_config.get_clean_url(url, prompt=prompt)
+    except ValueError as e:
+        raise DistutilsOptionError(str(e))
+
+
+def get_retry_policy(pypirc, repository):
+    """Fetch the retry settings of a repository, from its configuration files.
+
+    The environment is skipped: it only holds credentials, and would hide
+    the settings of the repository's .pypirc section.
+
+    Returns:
+        retry.RetryPolicy
+    Raises:
+        DistutilsOptionError: if the configured settings are invalid
+    """
+    repo_config = _find_repo_config(pypirc, repository, files_only=True)
+    if repo_config is None:
+        return retry.RetryPolicy()
+    return repo_config.retry_policy
+
+
+def get_install_repo_url(pypirc, private_repository):
+    """Resolve the private repository packages are installed from: its first URL.
+
+    Raises:
+        DistutilsSetupError: if private_repository only holds patterns
+    """
+    urls = base.mirror_urls(private_repository)
+    if not urls:
+        raise DistutilsSetupError(
+            "The 'private_repository' argument to the setup() call must hold at least one URL.")
+    return get_repo_url(pypirc, urls[0])
+
+
+def get_private_repo_urls(pypirc, private_repository, repository=None, prompt=True):
+    """Resolve the private repositories a package is published to.
+
+    Args:
+        pypirc (str): path to the .pypirc config file
+        private_repository (str or str list): the private_repository setting,
+            with one or several mirror URLs and allowlist patterns
+        repository (str): URL or alias from a --repository option, if any;
+            it must be allowed by private_repository
+        prompt (bool): whether to prompt for missing credentials
 
+    Returns:
+        base.RepositoryURL list: the target repositories, with credentials
+    Raises:
+        DistutilsOptionError: if repository isn't allowed, if no repository
+            is given and private_repository only holds patterns, or if
+            credentials are missing and prompt is unset
+    """
+    patterns = base.repository_urls(private_repository)
+    if repository:
+        repo_url = get_repo_url(pypirc, repository, prompt)
+        if repo_url not in base.RepositoryMatcher.compiled(patterns):
+            raise DistutilsOptionError(
+                "The --repository option of private packages must match the "
+                "configured private repository, %s." % ', '.join(patterns)
+            )
+        return [repo_url]
+
+    mirrors = base.mirror_urls(private_repository)
+    if not mirrors:
+        raise DistutilsOptionError(
+            "The configured private repository, %s, only holds patterns: "
+            "a --repository option is required." % ', '.join(patterns)
+        )
+    return [get_repo_url(pypirc, mirror, prompt) for mirror in mirrors]
+
+
+TIMING_REPORT_OPTION = (
+    'timing-report=', None, "Write a JSON breakdown of the time spent to this file")
+
+
+class TimingReportMixin(object):
+    """Enable timing spans, for the whole process, with --timing-report."""
 
-class install(base_install):
-    """Overridden install which adds --disable-pypi and --pypirc options."""
+    def ensure_finalized(self):
+        if not self.finalized and self.timing_report:
+            timing.enable(os.path.abspath(self.timing_report))
+        Command.ensure_finalized(self)
+
+
+class install(TimingReportMixin, base_install):
+    """Overridden install which adds --disable-pypi, --pypirc, --cache-dir and --wheelhouse options.
+
+    With --backend=pip, dependencies are resolved by pip, then built and
+    installed as wheels, --jobs at a time, before easy_install installs the
+    package itself.
+    """
     user_options = base_install.user_options + [
         ('disable-pypi', None, "Don't use PyPI package index"),
         ('pypirc=', None, "Path to .pypirc configuration file"),
+        ('cache-dir=', None, "Directory for caching index pages and downloads"),
+        ('prefetch-jobs=', None,
+            "Number of parallel requests when prefetching dependencies (0 to disable)"),
+        ('wheelhouse=', None,
+            "Install offline, from a directory filled by the 'fetch' command"),
+        ('backend=', None,
+            "Installer for dependencies: %s [default: easy_install]" % ', '.join(INSTALL_BACKENDS)),
+        ('jobs=', 'j', "Number of dependencies installed in parallel, with --backend=pip"),
+        TIMING_REPORT_OPTION,
     ]
     boolean_options = base_install.boolean_options + ['disable-pypi']
 
@@ -65,9 +216,140 @@ class install(base_install):
         base_install.initialize_options(self)
         self.disable_pypi = None
         self.pypirc = None
+        self.cache_dir = None
+        self.prefetch_jobs = None
+        self.wheelhouse = None
+        self.backend = None
+        self.jobs = None
+        self.timing_report = None
+        self.pip_install_args = []
+
+    @timing.timed('install.finalize_options')
+    def finalize_options(self):
+        self.backend = self.backend or INSTALL_BACKENDS[0]
+        if self.backend not in INSTALL_BACKENDS:
+            raise DistutilsOptionError("--backend must be one of %s, got %r."
+                % (', '.join(INSTALL_BACKENDS), self.backend))
+        try:
+            self.jobs = int(self.jobs or DEFAULT_INSTALL_JOBS)
+        except ValueError:
+            raise DistutilsOptionError("--jobs must be an integer, got %r." % self.jobs)
+        if self.jobs < 1:
+            raise DistutilsOptionError("--jobs must be at least 1.")
+
+        # Installation scheme requested by the user, before it gets expanded
+        self.pip_install_args = []
+        if self.user:
+            self.pip_install_args.append('--user')
+        if self.root:
+            self.pip_install_args.extend(['--root', self.root])
+        if self.prefix:
+            self.pip_install_args.extend(['--prefix', self.prefix])
+
+        base_install.finalize_options(self)
 
+    def do_egg_install(self):
+        if self.backend == 'pip':
+            self.install_requirements()
+        base_install.do_egg_install(self)
+
+    @timing.timed('install.install_requirements')
+    def install_requirements(self):
+        """Install missing dependencies through pip, as wheels."""
+        self.pypirc = self.pypirc or DEFAULT_PYPI_RC
+        requirements = [
+            str(req) for req in
+            pkg_resources.parse_requirements(self.distribution.install_requires or [])
+            if not _is_installed(req)
+        ]
+        if not requirements:
+            return
 
-class easy_install(base_easy_install):
+        index_args, index_environ = [], None
+        if self.wheelhouse:
+            index_args = ['--no-index', '--find-links', os.path.abspath(self.wheelhouse)]
+        else:
+            if self.distribution.private_repository is None:
+                raise DistutilsSetupError(
+                    "The 'private_repository' argument to the setup() call is required."
+                )
+            repo_url = get_install_repo_url(self.pypirc, self.distribution.private_repository)
+            log.info("Installing dependencies from %s", repo_url.base_url)
+            index_environ = wheelhouse.pip_index_environ(repo_url, self.disable_pypi)
+        wheelhouse.install(requirements, index_args, self.pip_install_args, self.jobs,
+            index_environ)
+
+
+class PrivatePackageIndex(PackageIndex):
+    """PackageIndex streaming the project pages of the private repository.
+
+    Project pages under index_url are parsed by index.LinkParser while being
+    read, instead of being loaded and regex-scanned whole; during
+    find_packages(), only links to archives matching the requirement are
+    kept. A page filtered for another requirement is read again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        PackageIndex.__init__(self, *args, **kwargs)
+        self._requirement = None
+        # page URL => the requirement its links were filtered with
+        self._filtered_pages = {}
+
+    def find_packages(self, requirement):
+        for name in (requirement.unsafe_name, requirement.project_name):
+            url = self.index_url + name + '/'
+            if self._filtered_pages.get(url, requirement) != requirement:
+                self.fetched_urls.pop(url, None)
+        self._requirement = requirement
+        try:
+            return PackageIndex.find_packages(self, requirement)
+        finally:
+            self._requirement = None
+
+    def _page_project(self, url):
+        """The project whose page is at url, None for other URLs."""
+        if not url.startswith(self.index_url):
+            return None
+        parts = url[len(self.index_url):].split('/')
+        if len(parts) != 2 or not parts[0] or parts[1]:
+            return None
+        return unquote(parts[0])
+
+    def process_url(self, url, retrieve=False):
+        project = self._page_project(url) if retrieve else None
+        if project is None or url in self.fetched_urls or not self.url_ok(url):
+            return PackageIndex.process_url(self, url, retrieve)
+
+        self.scanned_urls[url] = True
+        self.info("Reading %s", url)
+        self.fetched_urls[url] = True
+        response = self.open_url(url,
+            "Download error on %s: %%s -- Some packages may not be found!" % url)
+        if response is None:
+            return
+        try:
+            if getattr(response, 'code', 200) != 200:
+                self.info("Unable to read %s: %s %s", url, response.code, response.msg)
+                return
+            requirement = self._requirement
+            if requirement is not None and (
+                    index.normalize_name(requirement.project_name)
+                    != index.normalize_name(project)):
+                requirement = None
+            links = index.iter_page_links(
+                iter(lambda: response.read(multipart.CHUNK_SIZE), b''),
+                response.geturl(), response.info().get('Content-Type'), requirement)
+            for link in links:
+                PackageIndex.process_url(self, link.full_url)
+        finally:
+            response.close()
+
+        self._filtered_pages[url] = requirement
+        # As PackageIndex.process_index() does for the pages it reads
+        self.package_pages.setdefault(pkg_resources.safe_name(project).lower(), {})[url] = True
+
+
+class easy_install(TimingReportMixin, base_easy_install):
     """Overridden easy_install which adds a url from private_repository.
 
     Also handles username/password prompting for that private_repository.
@@ -76,6 +358,12 @@ class easy_install(base_easy_install):
     user_options = base_easy_install.user_options + [
         ('disable-pypi', None, "Don't use PyPI package index"),
         ('pypirc=', None, "Path to .pypirc configuration file"),
+        ('cache-dir=', None, "Directory for caching index pages and downloads"),
+        ('prefetch-jobs=', None,
+            "Number of parallel requests when prefetching dependencies (0 to disable)"),
+        ('wheelhouse=', None,
+            "Install offline, from a directory filled by the 'fetch' command"),
+        TIMING_REPORT_OPTION,
     ]
     boolean_options = base_easy_install.boolean_options + ['disable-pypi']
 
@@ -83,7 +371,12 @@ class easy_install(base_easy_install):
         base_easy_install.initialize_options(self)
         self.disable_pypi = None
         self.pypirc = None
+        self.cache_dir = None
+        self.prefetch_jobs = None
+        self.wheelhouse = None
+        self.timing_report = None
 
+    @timing.timed('easy_install.finalize_options')
     def finalize_options(self):
         if self.distribution.private_repository is None:
             raise DistutilsSetupError(
@@ -91,10 +384,27 @@ class easy_install(base_easy_install):
             )
         self.pypirc = self.pypirc or DEFAULT_PYPI_RC
 
-        repo_url = get_repo_url(self.pypirc, self.distribution.private_repository)
+        # Retrieve disable_pypi, cache_dir, ... from install
+        self.set_undefined_options('install',
+            ('disable_pypi', 'disable_pypi'),
+            ('cache_dir', 'cache_dir'),
+            ('prefetch_jobs', 'prefetch_jobs'),
+            ('wheelhouse', 'wheelhouse'),
+        )
+        if self.wheelhouse:
+            self.finalize_offline_options()
+            base_easy_install.finalize_options(self)
+            return
 
-        # Retrieve disable_pypi from install
-        self.set_undefined_options('install', ('disable_pypi', 'disable_pypi'))
+        repo_url = get_install_repo_url(self.pypirc, self.distribution.private_repository)
+        self.cache_dir = self.cache_dir or httpcache.default_cache_dir()
+        if self.prefetch_jobs is None:
+            self.prefetch_jobs = DEFAULT_PREFETCH_JOBS
+        try:
+            self.prefetch_jobs = int(self.prefetch_jobs)
+        except ValueError:
+            raise DistutilsOptionError(
+                "--prefetch-jobs must be an integer, got %r." % self.prefetch_jobs)
 
         if self.disable_pypi:
             log.info("Replacing PyPI with private repository %s.",
@@ -117,18 +427,117 @@ class easy_install(base_easy_install):
         # Parent options
         base_easy_install.finalize_options(self)
 
+    def finalize_offline_options(self):
+        """Only look for distributions in the wheelhouse, without network access."""
+        self.wheelhouse = os.path.abspath(self.wheelhouse)
+        if not os.path.isdir(self.wheelhouse):
+            raise DistutilsOptionError(
+                "The wheelhouse %s doesn't exist; fill it with the 'fetch' command."
+                % self.wheelhouse)
+
+        log.info("Installing from wheelhouse %s, without network access.", self.wheelhouse)
+        self.index_url = wheelhouse.wheelhouse_url(self.wheelhouse)
+        self.find_links = [self.wheelhouse]
+        self.allow_hosts = wheelhouse.NO_HOSTS
+        self.prefetch_jobs = 0
+        self.cache_dir = None
+
+    @timing.timed('easy_install.run')
+    def run(self, *args, **kwargs):
+        if self.prefetch_jobs > 0 and not self.no_deps:
+            self.prefetch()
+        return base_easy_install.run(self, *args, **kwargs)
+
+    @timing.timed('easy_install.prefetch')
+    def prefetch(self):
+        """Fetch index pages for all install_requires concurrently.
+
+        With an HTTP cache, the best candidate archives are downloaded as well.
+        """
+        install_requires = self.distribution.install_requires or []
+        requirements = [
+            req for req in pkg_resources.parse_requirements(install_requires)
+            if not _is_installed(req)
+        ]
+        if requirements:
+            prefetch.prefetch_requirements(self.package_index, requirements,
+                jobs=self.prefetch_jobs, archives=bool(self.cache_dir))
+
+    def create_index(self, *args, **kwargs):
+        """Build the PackageIndex, fetching through the HTTP cache if enabled.
+
+        When the private repository replaces PyPI, its project pages are
+        streamed (see PrivatePackageIndex).
+        """
+        if self.disable_pypi and not self.wheelhouse:
+            package_index = PrivatePackageIndex(*args, **kwargs)
+        else:
+            package_index = PackageIndex(*args, **kwargs)
+        if self.cache_dir:
+            cache = httpcache.HTTPCache(self.cache_dir)
+            package_index.opener = cache.opener(package_index.opener)
+        return package_index
+
+
+class fetch(TimingReportMixin, setuptools.Command):
+    """Download and build all dependencies into a wheelhouse, for offline installs.
+
+    Dependencies are looked up on the private repository and, unless
+    --disable-pypi is set, on PyPI; this relies on 'pip wheel'.
+    """
+
+    description = "build all dependencies into a wheelhouse, for 'install --wheelhouse'"
+    user_options = [
+        ('wheelhouse=', 'w', "Directory where dependencies are stored"),
+        ('disable-pypi', None, "Don't use PyPI package index"),
+        ('pypirc=', None, "Path to .pypirc configuration file"),
+        TIMING_REPORT_OPTION,
+    ]
+    boolean_options = ['disable-pypi']
+
+    def initialize_options(self):
+        self.wheelhouse = None
+        self.disable_pypi = None
+        self.pypirc = None
+        self.timing_report = None
+
+    @timing.timed('fetch.finalize_options')
+    def finalize_options(self):
+        if self.distribution.private_repository is None:
+            raise DistutilsSetupError(
+                "The 'private_repository' argument to the setup() call is required."
+            )
+        if not self.wheelhouse:
+            raise DistutilsOptionError("The --wheelhouse option is required.")
+        self.wheelhouse = os.path.abspath(self.wheelhouse)
+        self.pypirc = self.pypirc or DEFAULT_PYPI_RC
+
+    @timing.timed('fetch.run')
+    def run(self):
+        repo_url = get_install_repo_url(self.pypirc, self.distribution.private_repository)
+        requirements = [
+            str(req) for req in
+            pkg_resources.parse_requirements(self.distribution.install_requires or [])
+        ]
+        log.info("Fetching dependencies from %s", repo_url.base_url)
+        wheelhouse.fetch(requirements, self.wheelhouse,
+            index_environ=wheelhouse.pip_index_environ(repo_url, self.disable_pypi))
 
-class register(base_register):
+
+class register(TimingReportMixin, base_register):
     """Overridden register command restricting upload to the private repo."""
 
     user_options = base_register.user_options + [
         ('pypirc=', None, "Path to .pypirc configuration file"),
+        TIMING_REPORT_OPTION,
     ]
 
     def initialize_options(self):
         base_register.initialize_options(self)
         self.pypirc = None
+        self.timing_report = None
 
+    @timing.timed('register.finalize_options')
     def finalize_options(self):
         if self.distribution.private_repository is None:
             raise DistutilsSetupError(
@@ -136,34 +545,103 @@ class register(base_register):
             )
 
         self.pypirc = self.pypirc or DEFAULT_PYPI_RC
-        package_repo = base.RepositoryURL(self.distribution.private_repository)
-        repo_url = get_repo_url(self.pypirc, self.repository or package_repo.base_url)
-
-        if self.repository and repo_url not in package_repo:
-            raise DistutilsOptionError(
-                "The --repository option of private packages must match the "
-                "configured private repository, %s." % package_repo.base_url
-            )
+        repo_url = get_private_repo_urls(
+            self.pypirc, self.distribution.private_repository, self.repository)[0]
 
-        log.info("Switching to private repository at %s", package_repo.base_url)
+        log.info("Switching to private repository at %s", repo_url.base_url)
         self.repository = repo_url.base_url
         self.username = repo_url.username
         self.password = repo_url.password
 
         base_register.finalize_options(self)
 
+    @timing.timed('register.run')
+    def run(self):
+        base_register.run(self)
+
+    @timing.timed('register.post_to_server')
+    def post_to_server(self, data, auth=None):
+        """Post a query to the server, through the shared connection pool.
+
+        Returns:
+            (int, str): the status code and reason of the response
+        """
+        if 'name' in data:
+            log.info("Registering %s to %s", data['name'], self.repository)
 
-class upload(base_upload):
-    """Overridden upload command restricting upload to the private repo."""
+        content_type, body = multipart.encode_multipart(sorted(data.items()))
+        headers = {
+            'Content-Type': content_type + '; charset=utf-8',
+            'Content-Length': str(len(body)),
+        }
+        if auth is not None:
+            # Credentials typed at send_metadata()'s prompt only live in auth
+            username, password = auth.find_user_password(
+                self.realm, urlparse(self.repository)[1])
+            if username is None:
+                username, password = self.username, self.password
+            headers['Authorization'] = transport.basic_auth(username, password)
+
+        try:
+            response = retry.send(
+                lambda: transport.get_pool().request('POST', self.repository, body, headers),
+                get_retry_policy(self.pypirc, self.repository),
+                description=data.get(':action', 'registration'))
+        except (socket.error, http_client.HTTPException) as e:
+            return 500, str(e)
+
+        if self.show_response:
+            text = response.data.decode('utf-8', 'replace')
+            log.info('\n'.join(('-' * 75, text, '-' * 75)))
+        if response.status == 200:
+            return 200, 'OK'
+        return response.status, response.reason
+
+
+class upload(TimingReportMixin, base_upload):
+    """Overridden upload command restricting upload to the private repo.
+
+    Also allows uploading several files in parallel, with --jobs, and skipping
+    files already published on the repository, with --skip-existing.
+
+    File digests are cached in a manifest next to the files (see
+    restricted_pkg.digests): unchanged files are never hashed twice.
+
+    When private_repository lists several mirrors, files are sent to all of
+    them; --skip-existing only looks at the first one.
+
+    Requests rejected by an overloaded repository are retried, as configured
+    in the .pypirc (see base.RepositoryConfig); concurrent uploads to it are
+    then reduced, and ramped up again as it recovers.
+
+    Missing credentials are prompted for, unless the 'prompt' attribute is
+    unset beforehand, e.g. by callers without a terminal.
+    """
 
     user_options = base_upload.user_options + [
         ('pypirc=', None, "Path to .pypirc configuration file"),
+        ('jobs=', 'j', "Number of files to upload in parallel"),
+        ('skip-existing', None, "Don't upload files already present on the repository"),
+        ('simple-index=', None,
+            "URL of the repository's simple index [default: <repository>/simple/]"),
+        TIMING_REPORT_OPTION,
     ]
+    boolean_options = base_upload.boolean_options + ['skip-existing']
 
     def initialize_options(self):
         base_upload.initialize_options(self)
         self.pypirc = None
+        self.jobs = None
+        self.skip_existing = None
+        self.simple_index = None
+        self.timing_report = None
+        self.mirrors = []
+        self.prompt = True
+        self.digest_cache = None
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
 
+    @timing.timed('upload.finalize_options')
     def finalize_options(self):
         if self.distribution.private_repository is None:
             raise DistutilsSetupError(
@@ -171,34 +649,309 @@ class upload(base_upload):
             )
 
         self.pypirc = self.pypirc or DEFAULT_PYPI_RC
-        package_repo = base.RepositoryURL(self.distribution.private_repository)
-        repo_url = get_repo_url(self.pypirc, self.repository or package_repo.base_url)
+        self.mirrors = get_private_repo_urls(
+            self.pypirc, self.distribution.private_repository, self.repository, self.prompt)
+        repo_url = self.mirrors[0]
 
-        if self.repository and repo_url not in package_repo:
-            raise DistutilsOptionError(
-                "The --repository option of private packages must match the "
-                "configured private repository, %s." % package_repo.base_url
-            )
-
-        log.info("Switching to private repository at %s", package_repo.base_url)
+        if len(self.mirrors) > 1:
+            log.info("Switching to private repository mirrors at %s",
+                ', '.join(mirror.base_url for mirror in self.mirrors))
+        else:
+            log.info("Switching to private repository at %s", repo_url.base_url)
         self.repository = repo_url.base_url
         self.username = repo_url.username
         self.password = repo_url.password
 
         base_upload.finalize_options(self)
+        # distutils reloads the credentials from ~/.pypirc, only one of the layers
+        self.repository = repo_url.base_url
+        self.username = repo_url.username
+        self.password = repo_url.password or self.distribution.password
+
+        try:
+            self.jobs = int(self.jobs or 1)
+        except ValueError:
+            raise DistutilsOptionError("--jobs must be an integer, got %r." % self.jobs)
+        if self.jobs < 1:
+            raise DistutilsOptionError("--jobs must be at least 1.")
+
+        if self.simple_index is None:
+            self.simple_index = urljoin(self.repository, 'simple/')
+        self.digest_cache = digests.DigestCache(
+            [(algorithm, options) for _name, algorithm, options in FILE_CONTENT_DIGESTS])
+
+    @timing.timed('upload.published_files')
+    def published_files(self):
+        """Fetch the files already published for this project.
+
+        Returns:
+            dict: filename => index.Link
+        """
+        name = self.distribution.metadata.get_name()
+        headers = {}
+        if self.username or self.password:
+            headers['Authorization'] = transport.basic_auth(self.username, self.password)
+        try:
+            links = index.fetch_project_links(self.simple_index, name, headers=headers)
+        except (IOError, http_client.HTTPException) as e:
+            raise DistutilsError("Unable to list published files of %s: %s" % (name, e))
+        return dict((link.filename, link) for link in links)
+
+    def missing_files(self, dist_files):
+        """Filter out dist_files already published with the same content."""
+        published = self.published_files()
+        local_digests = self.digest_cache.compute([
+            dist_file[2] for dist_file in dist_files
+            if os.path.basename(dist_file[2]) in published
+        ], self.jobs)
+        missing = []
+        for dist_file in dist_files:
+            filename = dist_file[2]
+            link = published.get(os.path.basename(filename))
+            if link is None:
+                missing.append(dist_file)
+                continue
+
+            for algorithm, digest in sorted(link.hashes.items()):
+                local_digest = local_digests[filename].get(algorithm)
+                if local_digest is None or len(local_digest) != len(digest):
+                    # Not cached, or of another size (e.g. blake2b)
+                    local_digest = digests.hash_file(filename, [(algorithm, {})]).get(algorithm)
+                    if local_digest is None:
+                        # Unsupported algorithm
+                        continue
+                if local_digest != digest:
+                    raise DistutilsError(
+                        "%s is already published on %s with a different content."
+                        % (os.path.basename(filename), self.repository))
+                break
+            log.info("Skipping %s, already published.", filename)
+        return missing
+
+    @timing.timed('upload.run')
+    def run(self):
+        if not self.distribution.dist_files:
+            return base_upload.run(self)
+
+        dist_files = self.distribution.dist_files
+        if self.skip_existing:
+            dist_files = self.missing_files(dist_files)
+
+        def upload_one(dist_file):
+            command, pyversion, filename = dist_file
+            self.upload_file(command, pyversion, filename)
+
+        def report(dist_file, _result, error):
+            filename = dist_file[2]
+            if error is None:
+                log.info("Uploaded %s", filename)
+            else:
+                log.error("Failed to upload %s: %s", filename, error)
+
+        if self.jobs > 1:
+            log.info("Uploading %d files to %s with %d jobs",
+                len(dist_files), self.repository, self.jobs)
+        parallel.run_parallel(upload_one, dist_files, self.jobs, callback=report)
+
+    def upload_data(self, command, pyversion, filename, content):
+        """Build the form fields describing an uploaded file.
+
+        Args:
+            command (str): the command which built the file
+            pyversion (str): the target Python version
+            filename (str): path to the file
+            content (multipart.FileContent or multipart.FanOutBranch): the
+                streamed file content; digests are sent after it, once computed
+        """
+        meta = self.distribution.metadata
+        data = [
+            # action
+            (':action', 'file_upload'),
+            ('protocol_version', '1'),
+            # identify release
+            ('name', meta.get_name()),
+            ('version', meta.get_version()),
+            ('filetype', command),
+            ('pyversion', pyversion),
+            # additional meta-data
+            ('metadata_version', '1.0'),
+            ('summary', meta.get_description()),
+            ('home_page', meta.get_url()),
+            ('author', meta.get_contact()),
+            ('author_email', meta.get_contact_email()),
+            ('license', meta.get_licence()),
+            ('description', meta.get_long_description()),
+            ('keywords', meta.get_keywords()),
+            ('platform', meta.get_platforms()),
+            ('classifiers', meta.get_classifiers()),
+            ('download_url', meta.get_download_url()),
+            # PEP 314
+            ('provides', meta.get_provides()),
+            ('requires', meta.get_requires()),
+            ('obsoletes', meta.get_obsoletes()),
+            ('comment', ''),
+            # file content
+            ('content', (os.path.basename(filename), content)),
+        ]
 
+        for digest_name, algorithm, options in FILE_CONTENT_DIGESTS:
+            try:
+                data.append((digest_name, multipart.Digest(content, algorithm, options)))
+            except ValueError:
+                # hash digest not available or blocked by security policy
+                pass
 
-class upload_docs(base_upload_docs):
-    """Overridden upload_docs command restricting upload to the private repo."""
+        if self.sign:
+            with open(filename + '.asc', 'rb') as f:
+                data.append(('gpg_signature', (os.path.basename(filename) + '.asc', f.read())))
+        return data
+
+    @timing.timed('upload.upload_file')
+    def upload_file(self, command, pyversion, filename):
+        """Upload a file to all mirrors, through the shared connection pool.
+
+        The file is streamed from disk rather than loaded in memory; with
+        several mirrors, it is read once and sent to all of them concurrently.
+
+        Raises:
+            DistutilsError: if the upload failed on any mirror
+        """
+        targets = [(self.repository, self.username, self.password)] + [
+            (mirror.base_url, mirror.username, mirror.password) for mirror in self.mirrors[1:]
+        ]
+        for url, _username, _password in targets:
+            repo_url = base.RepositoryURL.interned(url)
+            if repo_url.params or repo_url.query or repo_url.fragment:
+                raise DistutilsOptionError("Incompatible url %s" % url)
+            if repo_url.scheme not in ('http', 'https'):
+                raise DistutilsOptionError("Unsupported scheme %s" % repo_url.scheme)
+
+        if self.sign:
+            gpg_args = ["gpg", "--detach-sign", "-a", filename]
+            if self.identity:
+                gpg_args[2:2] = ["--local-user", self.identity]
+            spawn(gpg_args, dry_run=self.dry_run)
+
+        # Unknown digests are computed while sending the file
+        signature = digests.file_signature(filename)
+        known_digests = self.digest_cache.get(filename)
+        content = multipart.FileContent(filename, self.digest_cache.algorithms,
+            digests=known_digests)
+        self.post_all(targets, command, pyversion, filename, content)
+        if known_digests is None and content.digests is not None:
+            self.digest_cache.store(filename, content.digests, signature)
+
+    def post_all(self, targets, command, pyversion, filename, content):
+        """Send a file to each (url, username, password) target concurrently.
+
+        Raises:
+            DistutilsError: if the upload failed on any target
+        """
+        if len(targets) == 1:
+            url, username, password = targets[0]
+            self.post_file(url, username, password, command, pyversion, filename, content)
+            return
+
+        fanout = multipart.FanOut(content, len(targets))
+
+        def post(index):
+            url, username, password = targets[index]
+            try:
+                self.post_file(url, username, password,
+                    command, pyversion, filename, fanout.branches[index])
+            finally:
+                fanout.branches[index].close()
+
+        failures = []
+
+        def report(index, _result, error):
+            url = targets[index][0]
+            if error is None:
+                log.info("Uploaded %s to %s", filename, url)
+            else:
+                log.error("Failed to upload %s to %s: %s", filename, url, error)
+                failures.append(url)
+
+        try:
+            parallel.run_parallel(post, range(len(targets)), len(targets), callback=report)
+        except (socket.error, http_client.HTTPException, DistutilsError):
+            raise DistutilsError("Upload of %s failed on %d of %d mirrors: %s"
+                % (filename, len(failures), len(targets), ', '.join(sorted(failures))))
+
+    def limiter(self, url):
+        """Retrieve the concurrency limiter of a repository.
+
+        Returns:
+            retry.AIMDLimiter
+        """
+        with self._limiters_lock:
+            if url not in self._limiters:
+                self._limiters[url] = retry.AIMDLimiter(self.jobs)
+            return self._limiters[url]
+
+    def post_file(self, url, username, password, command, pyversion, filename, content):
+        """Send a file to a repository.
+
+        Args:
+            url (str): the repository URL
+            username (str): the login for the repository
+            password (str): the password for the repository
+            content (multipart.FileContent or multipart.FanOutBranch): the
+                streamed file content
+        """
+        body = multipart.MultipartEncoder(self.upload_data(command, pyversion, filename, content))
+        headers = {
+            'Content-Type': body.content_type,
+            'Content-Length': str(body.content_length),
+            'Authorization': transport.basic_auth(username, password),
+        }
+
+        log.info("Submitting %s to %s", filename, url)
+        try:
+            response = retry.send(
+                lambda: transport.get_pool().request('POST', url, body, headers),
+                get_retry_policy(self.pypirc, url), self.limiter(url), filename)
+        except (socket.error, http_client.HTTPException) as e:
+            log.error("%s", e)
+            raise
+
+        if response.status == 200:
+            log.info("Server response (%s): %s", response.status, response.reason)
+            if self.show_response:
+                text = response.data.decode('utf-8', 'replace')
+                log.info('\n'.join(('-' * 75, text, '-' * 75)))
+        else:
+            msg = "Upload failed (%s): %s" % (response.status, response.reason)
+            log.error(msg)
+            raise DistutilsError(msg)
+
+
+class upload_docs(TimingReportMixin, base_upload_docs):
+    """Overridden upload_docs command restricting upload to the private repo.
+
+    The archive ships a manifest of the documentation (see restricted_pkg.docs);
+    the upload is skipped when the published manifest matches the built docs.
+    """
 
     user_options = base_upload_docs.user_options + [
         ('pypirc=', None, "Path to .pypirc configuration file"),
+        ('jobs=', 'j', "Number of files hashed and compressed in parallel"),
+        ('docs-url=', None,
+            "URL of the published documentation [default: <repository>/docs/<name>/]"),
+        ('force', 'f', "Upload even if the published documentation is up to date"),
+        TIMING_REPORT_OPTION,
     ]
+    boolean_options = base_upload_docs.boolean_options + ['force']
 
     def initialize_options(self):
         base_upload_docs.initialize_options(self)
         self.pypirc = None
+        self.jobs = None
+        self.docs_url = None
+        self.force = None
+        self.timing_report = None
 
+    @timing.timed('upload_docs.finalize_options')
     def finalize_options(self):
         if self.distribution.private_repository is None:
             raise DistutilsSetupError(
@@ -206,30 +959,109 @@ class upload_docs(base_upload_docs):
             )
 
         self.pypirc = self.pypirc or DEFAULT_PYPI_RC
-        package_repo = base.RepositoryURL(self.distribution.private_repository)
-        repo_url = get_repo_url(self.pypirc, self.repository or package_repo.base_url)
-
-        if self.repository and repo_url not in package_repo:
-            raise DistutilsOptionError(
-                "The --repository option of private packages must match the "
-                "configured private repository, %s." % package_repo.base_url
-            )
+        repo_url = get_private_repo_urls(
+            self.pypirc, self.distribution.private_repository, self.repository)[0]
 
-        log.info("Switching to private repository at %s", package_repo.base_url)
+        log.info("Switching to private repository at %s", repo_url.base_url)
         self.repository = repo_url.base_url
         self.username = repo_url.username
         self.password = repo_url.password
 
         base_upload_docs.finalize_options(self)
+        # distutils reloads the credentials from ~/.pypirc, only one of the layers
+        self.repository = repo_url.base_url
+        self.username = repo_url.username
+        self.password = repo_url.password or self.distribution.password
+
+        try:
+            self.jobs = int(self.jobs or docs.DEFAULT_JOBS)
+        except ValueError:
+            raise DistutilsOptionError("--jobs must be an integer, got %r." % self.jobs)
+        if self.jobs < 1:
+            raise DistutilsOptionError("--jobs must be at least 1.")
 
+        if self.docs_url is None:
+            self.docs_url = urljoin(self.repository,
+                'docs/%s/' % self.distribution.metadata.get_name())
+        elif not self.docs_url.endswith('/'):
+            self.docs_url += '/'
 
-def setup(**kwargs):
-    """Custom setup() function, inserting our custom classes."""
+    @timing.timed('upload_docs.published_digest')
+    def published_digest(self):
+        """Fetch the digest of the published documentation.
 
-    cmdclass = kwargs.setdefault('cmdclass', {})
-    cmdclass['easy_install'] = easy_install
-    cmdclass['install'] = install
-    cmdclass['register'] = register
-    cmdclass['upload'] = upload
-    cmdclass['upload_docs'] = upload_docs
-    return setuptools.setup(**kwargs)
+        Returns:
+            str: the digest from the published manifest, None if unavailable
+        """
+        headers = {}
+        if self.username or self.password:
+            headers['Authorization'] = transport.basic_auth(self.username, self.password)
+        url = urljoin(self.docs_url, docs.MANIFEST_NAME)
+        try:
+            response = transport.get_pool().request('GET', url, headers=headers)
+        except (socket.error, http_client.HTTPException) as e:
+            log.warn("Unable to fetch the published documentation manifest: %s", e)
+            return None
+        if response.status != 200:
+            return None
+        return docs.parse_manifest(response.data)
+
+    @timing.timed('upload_docs.run')
+    def run(self):
+        for cmd_name in self.get_sub_commands():
+            self.run_command(cmd_name)
+
+        self.mkpath(self.target_dir)
+        manifest = docs.build_manifest(self.target_dir, self.jobs)
+        if not manifest['files']:
+            raise DistutilsOptionError(
+                "no files found in upload directory '%s'" % self.target_dir)
+
+        if not self.force and self.published_digest() == manifest['digest']:
+            log.info("Documentation is up to date on %s, skipping upload.", self.docs_url)
+            return
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            zip_file = os.path.join(tmp_dir, '%s.zip' % self.distribution.metadata.get_name())
+            log.info("Archiving %d documentation files with %d jobs",
+                len(manifest['files']), self.jobs)
+            docs.write_archive(self.target_dir, manifest, zip_file, self.jobs)
+            self.upload_file(zip_file)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    @timing.timed('upload_docs.upload_file')
+    def upload_file(self, filename):
+        """Upload the docs archive, through the shared connection pool."""
+        meta = self.distribution.metadata
+        body = multipart.MultipartEncoder([
+            (':action', 'doc_upload'),
+            ('name', meta.get_name()),
+            ('content', (os.path.basename(filename), multipart.FileContent(filename))),
+        ])
+        headers = {
+            'Content-Type': body.content_type,
+            'Content-Length': str(body.content_length),
+            'Authorization': transport.basic_auth(self.username, self.password),
+        }
+
+        log.info("Submitting documentation to %s", self.repository)
+        try:
+            response = transport.get_pool().request('POST', self.repository, body, headers)
+        except (socket.error, http_client.HTTPException) as e:
+            log.error("%s", e)
+            return
+
+        if response.status == 200:
+            log.info("Server response (%s): %s", response.status, response.reason)
+        elif response.status == 301:
+            location = response.getheader('Location')
+            if location is None:
+                location = 'https://pythonhosted.org/%s/' % meta.get_name()
+            log.info("Upload successful. Visit %s", location)
+        else:
+            log.error("Upload failed (%s): %s", response.status, response.reason)
+        if self.show_response:
+            text = response.data.decode('utf-8', 'replace')
+            log.info('\n'.join(('-' * 75, text, '-' * 75)))
@@ -2,6 +2,7 @@
 # Copyright (c) 2012-2013 Raphaël Barrois.
 # Distributed under the MIT License.
 
+import os
 import sys
 
 PY3 = sys.version_info[0] == 3
@@ -9,9 +10,35 @@ PY3 = sys.version_info[0] == 3
 if PY3:
     import urllib
     import configparser
+    import socketserver
+    import http.client as http_client
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from html import unescape
+    from urllib.parse import quote, unquote, urljoin
+    from urllib.request import (
+        HTTPPasswordMgr, Request, getproxies, pathname2url, proxy_bypass, urlopen,
+    )
+    from urllib.error import HTTPError
+    from urllib.response import addinfourl
+    raw_input = input
 else:
     import urllib2 
     import ConfigParser as configparser
+    import SocketServer as socketserver
+    import httplib as http_client
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+    from urllib import getproxies, pathname2url, proxy_bypass, quote, unquote
+    from urlparse import urljoin
+    from urllib2 import HTTPError, HTTPPasswordMgr, Request, urlopen
+    from urllib import addinfourl
+    raw_input = raw_input
+
+try:
+    from concurrent import futures
+except ImportError:  # Python2 without the 'futures' backport
+    futures = None
 
 
 def urlparse(*args, **kwargs):
@@ -25,3 +52,12 @@ def urlunparse(*args, **kwargs):
         return urllib.parse.urlunparse(*args)
     else:
         return urllib2.urlparse.urlunparse(*args)
+
+
+def cpu_count(default=4):
+    """The number of CPUs, or default if unknown.
+
+    os.cpu_count() is missing on Python2, and may return None.
+    """
+    count = os.cpu_count() if hasattr(os, 'cpu_count') else None
+    return count or default
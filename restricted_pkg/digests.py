@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Cache of distribution file digests, in a manifest next to the files.
+
+Each directory holding hashed files gets a '.restricted_pkg-digests.json'
+manifest:
+    {<filename>: {"signature": [mtime, size, inode], "digests": {<algorithm>: <hex>}}}
+
+An entry is only used while the file's signature is unchanged, so that
+re-running an upload never reads an unchanged file just to hash it.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from distutils import log
+
+from . import multipart
+from . import parallel
+from . import timing
+from .base import file_signature
+
+
+MANIFEST_NAME = '.restricted_pkg-digests.json'
+
+
+def hash_file(path, algorithms):
+    """Compute several hex digests of a file, reading it once.
+
+    Args:
+        path (str): the file to hash
+        algorithms (list): (algorithm, options) to compute; unavailable
+            algorithms are skipped
+
+    Returns:
+        dict: algorithm => hex digest
+    """
+    hashers = {}
+    for algorithm, options in algorithms:
+        try:
+            hashers[algorithm] = hashlib.new(algorithm, **options)
+        except ValueError:
+            # hash digest not available or blocked by security policy
+            pass
+    if not hashers:
+        return {}
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(multipart.CHUNK_SIZE), b''):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    return dict((algorithm, hasher.hexdigest()) for algorithm, hasher in hashers.items())
+
+
+class DigestCache(object):
+    """Digests of files, persisted in per-directory manifests.
+
+    Attributes:
+        algorithms (list): (algorithm, options) computed for each file
+    """
+
+    def __init__(self, algorithms):
+        self.algorithms = list(algorithms)
+        # algorithm => length of its hex digests, for available algorithms
+        self._lengths = {}
+        for algorithm, options in self.algorithms:
+            try:
+                self._lengths[algorithm] = 2 * hashlib.new(algorithm, **options).digest_size
+            except ValueError:
+                continue
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def _manifest(self, dirname):
+        """Load the manifest of a directory; must be called with the lock held."""
+        manifest = self._manifests.get(dirname)
+        if manifest is None:
+            try:
+                with open(os.path.join(dirname, MANIFEST_NAME)) as f:
+                    manifest = json.load(f)
+            except (IOError, OSError, ValueError):
+                manifest = {}
+            if not isinstance(manifest, dict):
+                manifest = {}
+            self._manifests[dirname] = manifest
+        return manifest
+
+    def get(self, path):
+        """Retrieve the cached digests of a file.
+
+        Returns:
+            dict: algorithm => hex digest, if the file is unchanged since it
+                was hashed
+            None: otherwise
+        """
+        path = os.path.abspath(path)
+        signature = file_signature(path)
+        if signature is None:
+            return None
+        with self._lock:
+            entry = self._manifest(os.path.dirname(path)).get(os.path.basename(path))
+        if not isinstance(entry, dict) or tuple(entry.get('signature') or ()) != signature:
+            return None
+        digests = entry.get('digests') or {}
+        # Digests are sent with a precomputed Content-Length: check their size
+        for algorithm, length in self._lengths.items():
+            digest = digests.get(algorithm)
+            if not isinstance(digest, type(u'')) or len(digest) != length:
+                return None
+        return dict(digests)
+
+    def store(self, path, digests, signature):
+        """Record the digests of a file, and save its directory's manifest.
+
+        Args:
+            path (str): the hashed file
+            digests (dict): algorithm => hex digest
+            signature (tuple): the file_signature() taken before hashing it
+        """
+        if signature is None or signature != file_signature(path):
+            # Changed while being hashed
+            return
+        path = os.path.abspath(path)
+        dirname = os.path.dirname(path)
+        with self._lock:
+            manifest = self._manifest(dirname)
+            manifest[os.path.basename(path)] = {
+                'signature': list(signature),
+                'digests': dict(digests),
+            }
+            # Drop entries of removed files
+            for filename in list(manifest):
+                if not os.path.exists(os.path.join(dirname, filename)):
+                    del manifest[filename]
+            self._save(dirname, manifest)
+
+    def _save(self, dirname, manifest):
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=MANIFEST_NAME, dir=dirname)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.rename(tmp_path, os.path.join(dirname, MANIFEST_NAME))
+        except (IOError, OSError) as e:
+            log.debug("Unable to save the digests manifest of %s: %s", dirname, e)
+
+    @timing.timed('digests.compute')
+    def compute(self, paths, jobs=1):
+        """Retrieve the digests of files, hashing those not cached in parallel.
+
+        Args:
+            paths (str list): the files
+            jobs (int): number of files hashed concurrently
+
+        Returns:
+            dict: path => (algorithm => hex digest)
+        """
+        results = {}
+        missing = []
+        for path in paths:
+            digests = self.get(path)
+            if digests is None:
+                missing.append(path)
+            else:
+                results[path] = digests
+
+        def hash_one(path):
+            signature = file_signature(path)
+            digests = hash_file(path, self.algorithms)
+            self.store(path, digests, signature)
+            return digests
+
+        if missing:
+            log.info("Hashing %d files", len(missing))
+        for path, digests in zip(missing, parallel.run_parallel(hash_one, missing, jobs)):
+            results[path] = digests
+        return results
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""A Distribution accepting restricted_pkg's setup() arguments."""
+
+from setuptools.dist import Distribution as base_Distribution
+
+
+class Distribution(base_Distribution):
+    """Distribution with a 'private_repository' attribute.
+
+    setuptools only keeps setup() arguments declared by installed
+    'distutils.setup_keywords' entry points; declaring the attribute here lets
+    setup() work from a source checkout of restricted_pkg too, e.g. when a
+    monorepo's packages are loaded by 'restricted-pkg publish'.
+    """
+    private_repository = None
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Documentation archives, built incrementally.
+
+A manifest lists the sha256 of each file of the built documentation, and a
+digest of the whole tree; it is shipped at the root of the archive, so that
+the next 'upload_docs' can fetch it from the published documentation and
+skip the upload when nothing changed.
+
+Archives are written straight to a file, files being compressed in parallel
+(zlib releases the GIL); only a window of compressed files is held in memory.
+"""
+
+import collections
+import hashlib
+import itertools
+import json
+import os
+import struct
+import time
+import zlib
+
+from distutils.errors import DistutilsError
+
+from . import compat
+from . import parallel
+from .compat import futures
+
+
+MANIFEST_NAME = '.restricted_pkg-docs.json'
+DEFAULT_JOBS = compat.cpu_count()
+COMPRESS_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+
+# Zip records, see the PKWARE APPNOTE
+_LOCAL_HEADER = struct.Struct('<4sHHHHHLLLHH')
+_CENTRAL_HEADER = struct.Struct('<4sHHHHHHLLLHHHHHLL')
+_END_RECORD = struct.Struct('<4sHHHHLLH')
+_ZIP_VERSION = 20
+_UTF8_FLAG = 0x800
+_STORED, _DEFLATED = 0, 8
+_MAX_SIZE = 0xffffffff
+_MAX_ENTRIES = 0xffff
+
+
+def list_files(root):
+    """List the files of a documentation tree, as sorted '/'-separated relative paths."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        relative = os.path.relpath(dirpath, root)
+        for filename in filenames:
+            path = filename if relative == os.curdir else os.path.join(relative, filename)
+            path = path.replace(os.path.sep, '/')
+            if path != MANIFEST_NAME:
+                paths.append(path)
+    return sorted(paths)
+
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def build_manifest(root, jobs=DEFAULT_JOBS):
+    """Hash all files of a documentation tree, in parallel.
+
+    Returns:
+        dict: {'files': {path: sha256}, 'digest': sha256 of the whole tree}
+    """
+    paths = list_files(root)
+    hashes = parallel.run_parallel(
+        lambda path: _sha256(os.path.join(root, *path.split('/'))), paths, jobs)
+    tree = hashlib.sha256()
+    for path, digest in zip(paths, hashes):
+        tree.update(('%s\0%s\n' % (path, digest)).encode('utf-8'))
+    return {'files': dict(zip(paths, hashes)), 'digest': tree.hexdigest()}
+
+
+def parse_manifest(data):
+    """Extract the tree digest from a published manifest.
+
+    Returns:
+        str: the digest, None if the manifest is invalid
+    """
+    try:
+        manifest = json.loads(data.decode('utf-8'))
+    except ValueError:
+        return None
+    if not isinstance(manifest, dict):
+        return None
+    return manifest.get('digest')
+
+
+class _Entry(object):
+    """A compressed archive member."""
+
+    def __init__(self, name, data, mtime, mode):
+        self.name = name.encode('utf-8')
+        self.size = len(data)
+        self.crc = zlib.crc32(data) & 0xffffffff
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            self.method, self.data = _DEFLATED, compressed
+        else:
+            self.method, self.data = _STORED, data
+        self.compressed_size = len(self.data)
+        self.mode = mode
+        # MS-DOS date and time, the zip format's epoch being 1980
+        year, month, day, hour, minute, second = time.localtime(max(mtime, 315532800))[:6]
+        self.dos_date = (year - 1980) << 9 | month << 5 | day
+        self.dos_time = hour << 11 | minute << 5 | second // 2
+        self.flags = 0 if name.encode('ascii', 'replace') == self.name else _UTF8_FLAG
+        self.offset = None
+
+    def local_header(self):
+        return _LOCAL_HEADER.pack(b'PK\x03\x04', _ZIP_VERSION, self.flags, self.method,
+            self.dos_time, self.dos_date, self.crc, self.compressed_size, self.size,
+            len(self.name), 0) + self.name
+
+    def central_header(self):
+        return _CENTRAL_HEADER.pack(b'PK\x01\x02', _ZIP_VERSION, _ZIP_VERSION, self.flags,
+            self.method, self.dos_time, self.dos_date, self.crc, self.compressed_size, self.size,
+            len(self.name), 0, 0, 0, 0, (self.mode & 0xffff) << 16, self.offset) + self.name
+
+
+def _compress(root, path):
+    full_path = os.path.join(root, *path.split('/'))
+    stat = os.stat(full_path)
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    return _Entry(path, data, stat.st_mtime, stat.st_mode)
+
+
+def _iter_compressed(root, paths, jobs):
+    """Compress files in parallel, yielding _Entry objects in order.
+
+    At most 2 * jobs compressed files are held in memory.
+    """
+    if futures is None or jobs <= 1:
+        for path in paths:
+            yield _compress(root, path)
+        return
+
+    paths = iter(paths)
+    with futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque(
+            executor.submit(_compress, root, path) for path in itertools.islice(paths, 2 * jobs))
+        while pending:
+            entry = pending.popleft().result()
+            path = next(paths, None)
+            if path is not None:
+                pending.append(executor.submit(_compress, root, path))
+            yield entry
+
+
+def write_archive(root, manifest, target, jobs=DEFAULT_JOBS):
+    """Write a zip archive of a documentation tree, including its manifest.
+
+    Args:
+        root (str): the documentation tree
+        manifest (dict): its manifest, from build_manifest()
+        target (str): path to the archive to write
+        jobs (int): number of files compressed concurrently
+
+    Raises:
+        DistutilsError: if the archive would need zip64 extensions
+    """
+    paths = sorted(manifest['files'])
+    if len(paths) + 1 > _MAX_ENTRIES:
+        raise DistutilsError("Too many documentation files (%d)" % len(paths))
+
+    manifest_entry = _Entry(MANIFEST_NAME,
+        json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'), time.time(), 0o100644)
+    entries = []
+    with open(target, 'wb') as f:
+        offset = 0
+        for entry in itertools.chain(_iter_compressed(root, paths, jobs), [manifest_entry]):
+            if offset + entry.compressed_size > _MAX_SIZE or entry.size > _MAX_SIZE:
+                raise DistutilsError("Documentation archive too large (over 4GB)")
+            entry.offset = offset
+            header = entry.local_header()
+            f.write(header)
+            f.write(entry.data)
+            offset += len(header) + entry.compressed_size
+            # Only headers are needed for the central directory
+            entry.data = None
+            entries.append(entry)
+
+        central_offset = offset
+        central_size = 0
+        for entry in entries:
+            header = entry.central_header()
+            f.write(header)
+            central_size += len(header)
+        if central_offset + central_size > _MAX_SIZE:
+            raise DistutilsError("Documentation archive too large (over 4GB)")
+        f.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, len(entries), len(entries),
+            central_size, central_offset, 0))
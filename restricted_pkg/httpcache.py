@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""A persistent, size-bounded HTTP cache for index pages and downloads.
+
+Layout of the cache directory:
+    meta/<sha256 of the URL>.json: headers and validators of a response
+    blobs/<sha256 of the content>: response bodies, shared between URLs
+
+Entries are revalidated with conditional GETs (ETag / Last-Modified), unless
+fetched less than max_age seconds ago, or for URLs carrying a '#sha256=...'
+fragment whose content is already cached. Files are written atomically, and
+readable by all, so that several processes and users on the same host can
+share a cache directory; entries which can't be read are fetched again.
+Least recently used blobs and meta files are evicted once the cache grows above
+its maximum size.
+"""
+
+import email
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .compat import HTTPError, Request, addinfourl, urlopen
+
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+CACHE_DIR_ENV_VAR = 'RESTRICTED_PKG_CACHE_DIR'
+CHUNK_SIZE = 1024 * 1024
+# mkstemp() creates files only readable by their owner
+FILE_MODE = 0o644
+
+
+def default_cache_dir():
+    """The cache directory configured through the environment, if any."""
+    return os.environ.get(CACHE_DIR_ENV_VAR) or None
+
+
+def _url_key(url):
+    url = url.split('#', 1)[0]
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _fragment_sha256(url):
+    fragment = url.partition('#')[2]
+    if fragment.startswith('sha256='):
+        return fragment[len('sha256='):].lower()
+    return None
+
+
+def _write_atomic(path, data):
+    """Write a file through a temporary file, renamed once complete."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, FILE_MODE)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class HTTPCache(object):
+    """An on-disk HTTP cache.
+
+    Attributes:
+        root (str): the cache directory
+        max_size (int): maximum total size of cached files, in bytes
+    """
+
+    def __init__(self, root, max_size=DEFAULT_MAX_SIZE):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_size = max_size
+        self.meta_dir = os.path.join(self.root, 'meta')
+        self.blob_dir = os.path.join(self.root, 'blobs')
+        for directory in (self.meta_dir, self.blob_dir):
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # Created concurrently
+                    if not os.path.isdir(directory):
+                        raise
+        self._evict_lock = threading.Lock()
+        # Estimated size of the cache, None until the directories are scanned
+        self._size = None
+
+    def _meta_path(self, url):
+        return os.path.join(self.meta_dir, _url_key(url) + '.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    @staticmethod
+    def _touch(path):
+        """Mark a file as recently used."""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _load_meta(self, url):
+        path = self._meta_path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+        self._touch(path)
+        return meta
+
+    def _open_blob(self, digest):
+        """Open a cached blob.
+
+        Returns:
+            file: the blob, opened for reading
+            None: if the blob was evicted, or can't be read
+        """
+        path = self._blob_path(digest)
+        try:
+            blob = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+        self._touch(path)
+        return blob
+
+    def _respond(self, url, headers, blob):
+        """Build a response object serving an opened blob."""
+        headers = email.message_from_string(headers)
+        return addinfourl(blob, headers, url, 200)
+
+    def _store(self, url, response):
+        """Store a response in the cache.
+
+        Returns:
+            (dict, file): the meta data of the entry, and its blob, opened for
+                reading even if evicted meanwhile
+        """
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.tmp-')
+        blob = os.fdopen(fd, 'w+b')
+        try:
+            size = 0
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+                blob.write(chunk)
+                size += len(chunk)
+            blob.flush()
+            blob.seek(0)
+            os.chmod(tmp_path, FILE_MODE)
+            digest = hasher.hexdigest()
+            os.rename(tmp_path, self._blob_path(digest))
+        except Exception:
+            blob.close()
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        headers = response.info()
+        meta = {
+            'url': url,
+            'blob': digest,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'headers': str(headers),
+            'fetched': time.time(),
+        }
+        data = json.dumps(meta).encode('utf-8')
+        try:
+            _write_atomic(self._meta_path(url), data)
+        except Exception:
+            blob.close()
+            raise
+        self._added(size + len(data), digest, url)
+        return meta, blob
+
+    def open(self, request, opener=urlopen, max_age=None):
+        """Open a URL or Request through the cache.
+
+        Args:
+            request (str or Request): what to fetch
+            opener (callable): the function performing actual requests
+            max_age (float): if set, cached entries fetched or revalidated
+                less than max_age seconds ago are used without revalidation
+
+        Returns:
+            a file-like response, as returned by urlopen()
+        """
+        if not isinstance(request, Request):
+            request = Request(request)
+        url = request.get_full_url()
+        if request.get_method() != 'GET':
+            return opener(request)
+
+        expected = _fragment_sha256(url)
+        blob = self._open_blob(expected) if expected else None
+        if blob is not None:
+            meta = self._load_meta(url)
+            headers = meta['headers'] if meta else ''
+            return self._respond(url, headers, blob)
+
+        meta = self._load_meta(url)
+        # Opened beforehand, so that a 304 response can't find it evicted
+        blob = self._open_blob(meta['blob']) if meta is not None else None
+        if blob is not None and max_age is not None and (
+                time.time() - meta.get('fetched', 0) < max_age):
+            return self._respond(url, meta['headers'], blob)
+        if blob is not None:
+            if meta.get('etag'):
+                request.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                request.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            response = opener(request)
+        except HTTPError as e:
+            if e.code == 304 and blob is not None:
+                if max_age is not None:
+                    meta['fetched'] = time.time()
+                    _write_atomic(self._meta_path(url), json.dumps(meta).encode('utf-8'))
+                return self._respond(url, meta['headers'], blob)
+            if blob is not None:
+                blob.close()
+            raise
+        except Exception:
+            if blob is not None:
+                blob.close()
+            raise
+        if blob is not None:
+            # Superseded by the response
+            blob.close()
+
+        cache_control = response.info().get('Cache-Control') or ''
+        if getattr(response, 'code', 200) != 200 or 'no-store' in cache_control:
+            return response
+
+        try:
+            meta, blob = self._store(url, response)
+        finally:
+            response.close()
+        return self._respond(response.geturl(), meta['headers'], blob)
+
+    def opener(self, opener=urlopen):
+        """Wrap an opener function so that it goes through the cache."""
+        def cached_opener(request, *args, **kwargs):
+            return self.open(request, opener=lambda req: opener(req, *args, **kwargs))
+        return cached_opener
+
+    def _added(self, size, digest, url):
+        """Account for newly stored files, evicting others if needed.
+
+        The directories are only scanned once the estimated size exceeds
+        max_size; files added by other processes are found at that point.
+        """
+        with self._evict_lock:
+            if self._size is not None:
+                self._size += size
+                if self._size <= self.max_size:
+                    return
+        self.evict(keep=digest, keep_url=url)
+
+    def _scan(self, directory, keep):
+        """List the files of a cache directory.
+
+        Returns:
+            (int, list): their total size, and (mtime, size, path) entries
+                of those which can be evicted
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(directory):
+            if name.startswith('.tmp-'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total += stat.st_size
+            if path not in keep:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return total, entries
+
+    def evict(self, keep=None, keep_url=None):
+        """Remove least recently used blobs and meta files until the cache fits max_size.
+
+        Args:
+            keep (str): digest of a blob which must not be removed
+            keep_url (str): URL whose meta file must not be removed
+        """
+        keep_paths = set()
+        if keep is not None:
+            keep_paths.add(self._blob_path(keep))
+        if keep_url is not None:
+            keep_paths.add(self._meta_path(keep_url))
+
+        with self._evict_lock:
+            total = 0
+            entries = []
+            for directory in (self.blob_dir, self.meta_dir):
+                size, files = self._scan(directory, keep_paths)
+                total += size
+                entries.extend(files)
+
+            entries.sort()
+            for _mtime, size, path in entries:
+                if total <= self.max_size:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+            self._size = total
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Read PEP 503 "simple" repository pages."""
+
+import codecs
+import re
+
+from . import transport
+from .compat import unescape, unquote, urljoin
+
+
+_NORMALIZE_RE = re.compile(r'[-_.]+')
+
+
+def normalize_name(name):
+    """Normalize a project name, as in PEP 503."""
+    return _NORMALIZE_RE.sub('-', name).lower()
+
+
+class Link(object):
+    """A link to a distribution file.
+
+    Attributes:
+        url (str): absolute URL of the file, without fragment
+        fragment (str): the URL fragment, e.g. 'sha256=...'
+        filename (str): name of the file
+        hashes (dict): algorithm => hex digest, from the URL fragment
+        requires_python (str): the data-requires-python attribute, if any
+    """
+
+    def __init__(self, url, requires_python=None):
+        url, _sep, fragment = url.partition('#')
+        self.url = url
+        self.fragment = fragment
+        self.filename = unquote(url.split('?', 1)[0].rsplit('/', 1)[-1])
+        self.hashes = {}
+        if '=' in fragment:
+            algorithm, digest = fragment.split('=', 1)
+            self.hashes[algorithm] = digest
+        self.requires_python = requires_python
+
+    @property
+    def full_url(self):
+        """The URL of the file, including its fragment."""
+        if self.fragment:
+            return '%s#%s' % (self.url, self.fragment)
+        return self.url
+
+    def __repr__(self):
+        return '<Link: %s>' % self.filename
+
+
+_TAG_RE = re.compile(r'<(a|base)\s([^>]*)>', re.IGNORECASE)
+_ATTR_RE = re.compile(r"""([-\w:]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+
+# (extension, whether the version is followed by more '-'-separated tags)
+ARCHIVE_EXTENSIONS = [
+    ('.tar.gz', False),
+    ('.tar.bz2', False),
+    ('.tar.xz', False),
+    ('.tgz', False),
+    ('.zip', False),
+    ('.whl', True),
+    ('.egg', True),
+]
+
+
+def link_version(filename, project):
+    """Extract the version from the name of a file of a project.
+
+    Returns:
+        str: the version, or None if the file isn't an archive of that project
+    """
+    for extension, tagged in ARCHIVE_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            break
+    else:
+        return None
+
+    if tagged:
+        # Wheels and eggs escape '-' in names and versions
+        parts = stem.split('-')
+        if len(parts) < 2 or normalize_name(parts[0]) != normalize_name(project):
+            return None
+        return parts[1]
+
+    name_length = len(project)
+    if (stem[name_length:name_length + 1] != '-'
+            or normalize_name(stem[:name_length]) != normalize_name(project)):
+        return None
+    return stem[name_length + 1:] or None
+
+
+class LinkParser(object):
+    """Incremental parser for PEP 503 simple index pages.
+
+    Only <a> and <base> tags are looked at; the page may be fed in chunks of
+    any size, and links are returned as soon as their tag is complete.
+    """
+
+    def __init__(self, base_url, requirement=None):
+        """
+        Args:
+            base_url (str): URL of the page, to resolve relative links
+            requirement (pkg_resources.Requirement): if set, only links to
+                archives of that project, with a matching version, are kept
+        """
+        self.base_url = base_url
+        self.requirement = requirement
+        self._buffer = ''
+
+    def _parse_tag(self, match):
+        attrs = {}
+        for attr in _ATTR_RE.finditer(match.group(2)):
+            value = attr.group(2)
+            if value is None:
+                value = attr.group(3) if attr.group(3) is not None else attr.group(4)
+            attrs[attr.group(1).lower()] = unescape(value)
+
+        href = attrs.get('href')
+        if not href:
+            return None
+        if match.group(1).lower() == 'base':
+            self.base_url = urljoin(self.base_url, href)
+            return None
+
+        link = Link(urljoin(self.base_url, href), requires_python=attrs.get('data-requires-python'))
+        if self.requirement is not None:
+            version = link_version(link.filename, self.requirement.project_name)
+            if version is None or version not in self.requirement:
+                return None
+        return link
+
+    def feed(self, data):
+        """Parse a chunk of the page.
+
+        Returns:
+            Link list: the links completed by this chunk
+        """
+        buffer = self._buffer + data
+        links = []
+        end = 0
+        for match in _TAG_RE.finditer(buffer):
+            end = match.end()
+            link = self._parse_tag(match)
+            if link is not None:
+                links.append(link)
+
+        # Keep a possibly incomplete tag for the next chunk
+        tail = buffer.rfind('<', end)
+        self._buffer = buffer[tail:] if tail >= 0 else ''
+        return links
+
+
+def parse_links(page, base_url, requirement=None):
+    """Extract the links of a simple index page.
+
+    Args:
+        page (str): the HTML page
+        base_url (str): URL of the page, to resolve relative links
+        requirement (pkg_resources.Requirement): if set, only keep links to
+            archives matching that requirement
+
+    Returns:
+        Link list
+    """
+    return LinkParser(base_url, requirement).feed(page)
+
+
+def project_url(index_url, project):
+    """URL of the page of a project on a simple index."""
+    if not index_url.endswith('/'):
+        index_url += '/'
+    return '%s%s/' % (index_url, normalize_name(project))
+
+
+def content_charset(content_type, default='utf-8'):
+    match = re.search(r'charset=["\']?([-\w]+)', content_type or '')
+    return match.group(1) if match else default
+
+
+def iter_page_links(chunks, url, content_type=None, requirement=None):
+    """Parse a page while it is being read.
+
+    Args:
+        chunks (iterable): the body of the page, as chunks of bytes
+        url (str): URL of the page, to resolve relative links
+        content_type (str): the Content-Type header of the page, for its charset
+        requirement (pkg_resources.Requirement): if set, only yield links to
+            archives matching that requirement
+
+    Yields:
+        Link
+    """
+    decoder = codecs.getincrementaldecoder(content_charset(content_type))('replace')
+    parser = LinkParser(url, requirement)
+    for chunk in chunks:
+        for link in parser.feed(decoder.decode(chunk)):
+            yield link
+    for link in parser.feed(decoder.decode(b'', True)):
+        yield link
+
+
+def iter_project_links(index_url, project, requirement=None, headers=None):
+    """Stream the links published for a project on a simple index.
+
+    The page is parsed while being received, and never held in memory.
+
+    Args:
+        index_url (str): URL of the simple index
+        project (str): name of the project
+        requirement (pkg_resources.Requirement): if set, only yield links to
+            archives matching that requirement
+        headers (dict): additional request headers, e.g. Authorization
+
+    Yields:
+        Link
+    Raises:
+        IOError: if the index couldn't be read
+    """
+    url = project_url(index_url, project)
+    with transport.get_pool().request('GET', url, headers=headers, stream=True) as response:
+        if response.status == 404:
+            return
+        if response.status != 200:
+            raise IOError("Unable to read %s (%s): %s" % (url, response.status, response.reason))
+
+        for link in iter_page_links(response.iter_content(), url,
+                response.getheader('Content-Type'), requirement):
+            yield link
+
+
+def fetch_project_links(index_url, project, requirement=None, headers=None):
+    """Fetch the links published for a project on a simple index.
+
+    Returns:
+        Link list: the links, empty if the project doesn't exist
+    Raises:
+        IOError: if the index couldn't be read
+    """
+    return list(iter_project_links(index_url, project, requirement, headers))
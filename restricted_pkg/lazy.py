@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Lazily loaded command classes.
+
+restricted_pkg.commands pulls in most of setuptools' commands and an HTTP
+stack. setup() only registers proxies: the actual command classes are imported
+the first time a proxy is looked at, i.e. when the command is parsed or run,
+so that e.g. 'setup.py egg_info' or 'setup.py --version' never load them.
+"""
+
+import importlib
+
+
+COMMANDS_MODULE = 'restricted_pkg.commands'
+COMMANDS = ('easy_install', 'fetch', 'install', 'register', 'upload', 'upload_docs')
+
+
+class LazyCommandType(type):
+    """Metaclass of command proxies: class attributes come from the actual class."""
+
+    def __getattr__(cls, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(cls.load(), attr)
+
+    # Defined on distutils' Command, hence not reaching __getattr__
+    @property
+    def sub_commands(cls):
+        return cls.load().sub_commands
+
+
+def lazy_command(module, name):
+    """Build a proxy for a command class.
+
+    The proxy is a distutils Command subclass, as required by distutils;
+    instantiating it returns an instance of the actual class.
+
+    Args:
+        module (str): the module defining the command class
+        name (str): the name of the command class
+
+    Returns:
+        LazyCommandType
+    """
+    from distutils.cmd import Command
+
+    loaded = []
+
+    def load(cls):
+        """Import the actual command class."""
+        if not loaded:
+            loaded.append(getattr(importlib.import_module(module), name))
+        return loaded[0]
+
+    def __new__(cls, *args, **kwargs):
+        return cls.load()(*args, **kwargs)
+
+    return LazyCommandType(name, (Command, object), {
+        '__doc__': "Lazy proxy for %s.%s" % (module, name),
+        '__new__': __new__,
+        'load': classmethod(load),
+    })
+
+
+def setup(**kwargs):
+    """Custom setup() function, inserting our custom classes."""
+    import setuptools
+    from .dist import Distribution
+
+    kwargs.setdefault('distclass', Distribution)
+    cmdclass = kwargs.setdefault('cmdclass', {})
+    for name in COMMANDS:
+        cmdclass[name] = lazy_command(COMMANDS_MODULE, name)
+    return setuptools.setup(**kwargs)
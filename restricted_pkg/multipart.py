@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Encoding of multipart/form-data bodies, as expected by package indexes.
+
+Bodies are streamed: file contents are read chunk by chunk while sending,
+and their digests are computed in the same pass, to be sent in fields placed
+after the file content.
+"""
+
+import hashlib
+import os
+import threading
+
+BOUNDARY = '--------------GHSKFJDLGDS7543FJKLFHRE75642756743254'
+CHUNK_SIZE = 1024 * 1024
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, type(u'')):
+        value = '%s' % value
+    return value.encode('utf-8')
+
+
+class FileContent(object):
+    """The content of a file, read and hashed while being streamed.
+
+    Attributes:
+        path (str): path to the file
+        size (int): size of the file
+        hashers (dict): algorithm name => hashlib object, filled while
+            streaming the file
+        digests (dict): algorithm name => hex digest, once known
+    """
+
+    def __init__(self, path, algorithms=(), chunk_size=CHUNK_SIZE, digests=None):
+        """
+        Args:
+            path (str): path to the file
+            algorithms (list): (algorithm, options) to compute on the content
+            digests (dict): already known hex digests of the content; the
+                file is then not hashed again
+        """
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.algorithms = list(algorithms)
+        self.chunk_size = chunk_size
+        self.hashers = {}
+        self.digests = digests
+
+    def __len__(self):
+        return self.size
+
+    def hexdigest(self, algorithm):
+        if self.digests is not None:
+            return self.digests[algorithm]
+        return self.hashers[algorithm].hexdigest()
+
+    def __iter__(self):
+        if self.digests is not None:
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                    yield chunk
+            return
+
+        hashers = {}
+        for algorithm, options in self.algorithms:
+            try:
+                hashers[algorithm] = hashlib.new(algorithm, **options)
+            except ValueError:
+                # hash digest not available or blocked by security policy
+                pass
+        self.hashers = hashers
+
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+                yield chunk
+        # Sent again on retries: don't hash it again
+        self.digests = dict(
+            (algorithm, hasher.hexdigest()) for algorithm, hasher in hashers.items())
+
+
+class Digest(object):
+    """The hex digest of a FileContent, available once it has been streamed."""
+
+    def __init__(self, content, algorithm, options=None):
+        self.content = content
+        self.algorithm = algorithm
+        self.length = 2 * hashlib.new(algorithm, **(options or {})).digest_size
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.content.hexdigest(self.algorithm).encode('ascii')
+
+
+class FanOut(object):
+    """Stream a FileContent to several consumers, reading the file once.
+
+    Each consumer iterates over its own branch (see .branches), which may be
+    used in place of the FileContent; branches share the chunks read from disk,
+    and a branch more than `window` chunks ahead of the slowest one waits for
+    it. A consumer giving up must close() its branch, so as not to hold the
+    others back.
+
+    Attributes:
+        content (FileContent): the streamed content
+        branches (FanOutBranch list): one per consumer
+    """
+
+    def __init__(self, content, count, window=4):
+        self.content = content
+        self.window = window
+        self.branches = [FanOutBranch(self, index) for index in range(count)]
+        self._source = None
+        self._eof = False
+        # Index of the next chunk to read from the source
+        self._read = 0
+        # chunk index => chunk, for chunks not yet consumed by all branches
+        self._chunks = {}
+        # branch index => index of its next chunk; closed branches are removed
+        self._positions = dict((index, 0) for index in range(count))
+        self._cond = threading.Condition()
+
+    def _slowest(self):
+        return min(self._positions.values()) if self._positions else self._read
+
+    def get(self, branch, index):
+        """Retrieve a chunk for a branch, reading it from the file if needed.
+
+        Returns:
+            bytes: the chunk, or None at the end of the file
+        """
+        with self._cond:
+            while True:
+                if index in self._chunks:
+                    chunk = self._chunks[index]
+                    break
+                if self._eof:
+                    chunk = None
+                    break
+                if index < self._read:
+                    raise IOError("Chunk %d of %s is no longer available" % (index, self.content.path))
+                if index == self._read and index - self._slowest() < self.window:
+                    if self._source is None:
+                        self._source = iter(self.content)
+                    chunk = next(self._source, None)
+                    if chunk is None:
+                        self._eof = True
+                        break
+                    self._chunks[index] = chunk
+                    self._read += 1
+                    break
+                self._cond.wait()
+
+            if branch in self._positions:
+                self._positions[branch] = index + 1
+            slowest = self._slowest()
+            for consumed in [key for key in self._chunks if key < slowest]:
+                del self._chunks[consumed]
+            self._cond.notify_all()
+        return chunk
+
+    def close(self, branch):
+        """Stop waiting for a branch."""
+        with self._cond:
+            self._positions.pop(branch, None)
+            slowest = self._slowest()
+            for consumed in [key for key in self._chunks if key < slowest]:
+                del self._chunks[consumed]
+            self._cond.notify_all()
+
+
+class FanOutBranch(object):
+    """A consumer's view of a FanOut, usable in place of its FileContent."""
+
+    def __init__(self, fanout, index):
+        self.fanout = fanout
+        self.index = index
+        self._position = 0
+
+    def __len__(self):
+        return len(self.fanout.content)
+
+    @property
+    def hashers(self):
+        return self.fanout.content.hashers
+
+    def hexdigest(self, algorithm):
+        return self.fanout.content.hexdigest(algorithm)
+
+    def __iter__(self):
+        if self._position:
+            # Iterated again, e.g. to retry a request: shared chunks may be gone,
+            # read the file again, then keep following the shared stream which
+            # computes the digests.
+            content = self.fanout.content
+            with open(content.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(content.chunk_size), b''):
+                    yield chunk
+            while self.fanout.get(self.index, self._position) is not None:
+                self._position += 1
+            return
+
+        while True:
+            chunk = self.fanout.get(self.index, self._position)
+            if chunk is None:
+                return
+            self._position += 1
+            yield chunk
+
+    def close(self):
+        self.fanout.close(self.index)
+
+
+class MultipartEncoder(object):
+    """A streamed multipart/form-data body.
+
+    Iterating over the encoder yields the body, chunk by chunk; it may be
+    iterated several times, e.g. to retry a request.
+
+    Attributes:
+        content_type (str): value for the Content-Type header
+        content_length (int): length of the encoded body
+    """
+
+    def __init__(self, fields, boundary=BOUNDARY):
+        """
+        Args:
+            fields (list): (name, value) pairs; a value may be a list of values,
+                a (filename, bytes, FileContent or FanOutBranch) tuple for file fields,
+                or a Digest
+        """
+        self.content_type = 'multipart/form-data; boundary=%s' % boundary
+        sep_boundary = b'\r\n--' + boundary.encode('ascii')
+        self._parts = []
+        for name, values in fields:
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                title = '\r\nContent-Disposition: form-data; name="%s"' % name
+                if isinstance(value, tuple):
+                    title += '; filename="%s"' % value[0]
+                    value = value[1]
+                if not isinstance(value, (FileContent, FanOutBranch, Digest)):
+                    value = _encode(value)
+                self._parts.append(sep_boundary + _encode(title) + b'\r\n\r\n')
+                self._parts.append(value)
+        self._parts.append(sep_boundary + b'--\r\n')
+        self.content_length = sum(len(part) for part in self._parts)
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                for chunk in part:
+                    yield chunk
+
+    def to_bytes(self):
+        return b''.join(self)
+
+
+def encode_multipart(fields, boundary=BOUNDARY):
+    """Encode form fields into an in-memory multipart/form-data body.
+
+    Returns:
+        (str, bytes): the content type and the encoded body
+    """
+    encoder = MultipartEncoder(fields, boundary)
+    return encoder.content_type, encoder.to_bytes()
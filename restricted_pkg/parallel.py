@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Run independent tasks on a bounded pool of threads."""
+
+from .compat import futures
+
+
+def run_parallel(func, items, jobs, callback=None):
+    """Call func(item) for each item, with at most `jobs` calls in flight.
+
+    Fails fast: on the first error, pending calls are cancelled and the error
+    is raised once the running calls have completed.
+
+    Without concurrent.futures (Python2 without the 'futures' backport), calls
+    are run sequentially.
+
+    Args:
+        func (callable): the function to call for each item
+        items (iterable): the items to process
+        jobs (int): maximum number of concurrent calls
+        callback (callable): if set, called as callback(item, result, error)
+            as soon as each call completes
+
+    Returns:
+        list: the results of func(item), in the order of items
+    """
+    items = list(items)
+    if futures is None or jobs <= 1 or len(items) <= 1:
+        results = []
+        for item in items:
+            try:
+                result = func(item)
+            except Exception as e:
+                if callback is not None:
+                    callback(item, None, e)
+                raise
+            if callback is not None:
+                callback(item, result, None)
+            results.append(result)
+        return results
+
+    with futures.ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+        pending = dict((executor.submit(func, item), index) for index, item in enumerate(items))
+        results = [None] * len(items)
+        error = None
+        for future in futures.as_completed(list(pending)):
+            if future.cancelled():
+                continue
+            index = pending[future]
+            exception = future.exception()
+            if callback is not None:
+                callback(items[index], None if exception else future.result(), exception)
+            if exception is None:
+                results[index] = future.result()
+            elif error is None:
+                error = exception
+                for other in pending:
+                    other.cancel()
+
+    if error is not None:
+        raise error
+    return results
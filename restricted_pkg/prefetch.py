@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Concurrent prefetching of index pages for a set of requirements.
+
+easy_install resolves requirements one at a time, paying one round trip per
+index page. The Prefetcher fetches the pages of all known requirements on a
+bounded thread pool first, then serves them to the (single-threaded)
+PackageIndex through its opener.
+
+Only the declared requirements are prefetched: their own dependencies are
+unknown until their archives have been unpacked by easy_install.
+"""
+
+import io
+import threading
+
+from distutils import log
+import pkg_resources
+from setuptools.package_index import open_with_auth
+
+from . import index
+from . import parallel
+from .compat import HTTPError, addinfourl
+
+
+class Prefetcher(object):
+    """Prefetch pages for a PackageIndex.
+
+    Attributes:
+        opener (callable): the opener used for actual requests
+        jobs (int): maximum number of concurrent requests
+    """
+
+    def __init__(self, opener, jobs):
+        self.opener = opener
+        self.jobs = jobs
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, url):
+        """Fetch a URL, keeping the response for a later call to open()."""
+        requested = []
+
+        def recording_opener(request):
+            requested.append(request.get_full_url())
+            return self.opener(request)
+
+        try:
+            response = open_with_auth(url, recording_opener)
+        except HTTPError as e:
+            entry = ('error', e.code, e.msg, e.hdrs, e.read())
+        else:
+            try:
+                entry = ('ok', response.geturl(), response.info(), response.read())
+            finally:
+                response.close()
+
+        with self._lock:
+            self._responses[requested[0]] = entry
+        return entry
+
+    def prefetch(self, urls):
+        """Fetch a list of URLs concurrently.
+
+        Errors are only logged: the PackageIndex will try again and report them.
+
+        Returns:
+            list: the fetched entries, None for failed URLs
+        """
+        return parallel.run_parallel(
+            lambda url: _ignore_errors(self._fetch, url), urls, self.jobs)
+
+    def open(self, request, *args, **kwargs):
+        """Opener for the PackageIndex: serve prefetched responses once."""
+        with self._lock:
+            entry = self._responses.pop(request.get_full_url(), None)
+        if entry is None:
+            return self.opener(request, *args, **kwargs)
+
+        if entry[0] == 'error':
+            _kind, code, msg, headers, body = entry
+            raise HTTPError(request.get_full_url(), code, msg, headers, io.BytesIO(body))
+        _kind, url, headers, body = entry
+        return addinfourl(io.BytesIO(body), headers, url, 200)
+
+
+def best_links(page, page_url, requirement):
+    """Find the URLs of the best candidate archives for a requirement.
+
+    Returns:
+        str list: URLs of the archives of the best matching version
+    """
+    candidates = []
+    for link in index.parse_links(page, page_url, requirement):
+        version = index.link_version(link.filename, requirement.project_name)
+        candidates.append((pkg_resources.parse_version(version), link))
+    if not candidates:
+        return []
+    best = max(version for version, _link in candidates)
+    return [link.full_url for version, link in candidates if version == best]
+
+
+def prefetch_requirements(package_index, requirements, jobs, archives=False):
+    """Prefetch index pages (and optionally archives) for requirements.
+
+    Args:
+        package_index (setuptools.package_index.PackageIndex): the index
+            to warm up; its opener is replaced
+        requirements (pkg_resources.Requirement list): the requirements
+        jobs (int): maximum number of concurrent requests
+        archives (bool): whether to also download the best candidate archives;
+            only useful if the opener stores them, e.g. in an HTTP cache
+    """
+    prefetcher = Prefetcher(package_index.opener, jobs)
+    package_index.opener = prefetcher.open
+
+    page_urls = [package_index.index_url + req.unsafe_name + '/' for req in requirements]
+    log.info("Prefetching index pages for %d requirements", len(page_urls))
+    entries = prefetcher.prefetch(page_urls)
+    if not archives:
+        return
+
+    archive_urls = []
+    for requirement, page_url, entry in zip(requirements, page_urls, entries):
+        if entry is None or entry[0] != 'ok':
+            continue
+        _kind, url, headers, body = entry
+        page = body.decode(headers.get_param('charset') or 'latin-1', 'ignore')
+        archive_urls.extend(best_links(page, url, requirement))
+
+    def download(url):
+        response = open_with_auth(url, prefetcher.opener)
+        try:
+            while response.read(1024 * 1024):
+                pass
+        finally:
+            response.close()
+
+    log.info("Prefetching %d archives", len(archive_urls))
+    parallel.run_parallel(lambda url: _ignore_errors(download, url), archive_urls, jobs)
+
+
+def _ignore_errors(func, url):
+    try:
+        return func(url)
+    except Exception as e:
+        log.debug("Unable to prefetch %s: %s", url, e)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Build and publish many restricted packages from a single process.
+
+Distributions are built concurrently, each in its own 'setup.py' process;
+uploads then run in this process, so that all packages share the parsed
+.pypirc, the credentials entered at prompts and the connection pool.
+
+Usage: restricted-pkg publish [options] PATH...
+"""
+
+from __future__ import print_function
+
+import contextlib
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from distutils import log
+
+from . import compat
+from . import parallel
+
+
+DEFAULT_FORMATS = 'sdist,bdist_wheel'
+DEFAULT_BUILD_JOBS = compat.cpu_count()
+DEFAULT_UPLOAD_JOBS = 4
+
+# Directories never searched for packages
+SKIPPED_DIRS = frozenset(['build', 'dist', 'node_modules', '__pycache__'])
+
+# Distribution file suffix => command building it
+DIST_COMMANDS = [
+    ('.whl', 'bdist_wheel'),
+    ('.egg', 'bdist_egg'),
+    ('.tar.gz', 'sdist'),
+    ('.tar.bz2', 'sdist'),
+    ('.zip', 'sdist'),
+]
+
+
+class Package(object):
+    """A package to publish.
+
+    Attributes:
+        path (str): the directory holding its setup.py
+        name (str): the project name, once loaded
+        dist_files (list): (command, pyversion, filename) of built distributions
+        status (str): 'pending', 'built', 'uploaded' or 'failed'
+        error (str): the reason of a failure
+        build_time (float): time spent building, in seconds
+        upload_time (float): time spent uploading, in seconds
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.dist_files = []
+        self.status = 'pending'
+        self.error = None
+        self.build_time = 0.0
+        self.upload_time = 0.0
+
+    def fail(self, error):
+        self.status = 'failed'
+        self.error = str(error)
+
+    def __repr__(self):
+        return '<Package: %s>' % self.path
+
+
+def find_packages(paths):
+    """Find the directories holding a setup.py under some paths.
+
+    Directories holding a setup.py aren't searched further.
+
+    Returns:
+        Package list
+    """
+    packages = []
+    for path in paths:
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(path)):
+            if 'setup.py' in filenames:
+                packages.append(Package(dirpath))
+                dirnames[:] = []
+                continue
+            dirnames[:] = sorted(
+                name for name in dirnames
+                if not name.startswith('.') and name not in SKIPPED_DIRS
+            )
+    return packages
+
+
+def dist_file(path):
+    """Describe a built distribution as a (command, pyversion, filename) entry."""
+    filename = os.path.basename(path)
+    for suffix, command in DIST_COMMANDS:
+        if filename.endswith(suffix):
+            break
+    else:
+        return None
+    pyversion = ''
+    if command != 'sdist':
+        # name-version(-build)?-pyversion-abi-platform.whl, name-version-pyversion.egg
+        tags = filename[:-len(suffix)].split('-')
+        pyversion = tags[-3] if command == 'bdist_wheel' else tags[-1]
+    return (command, pyversion, path)
+
+
+def build(package, formats, dist_dir):
+    """Build the distributions of a package, in a separate process."""
+    start = time.time()
+    out_dir = os.path.join(dist_dir, os.path.basename(package.path))
+    command = [sys.executable, 'setup.py', '-q']
+    for build_format in formats:
+        command.extend([build_format, '--dist-dir', out_dir])
+    try:
+        process = subprocess.Popen(command, cwd=package.path,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        package.fail("build failed: %s" % e)
+        return
+    output = process.communicate()[0]
+    package.build_time = time.time() - start
+    if process.returncode != 0:
+        lines = output.decode('utf-8', 'replace').strip().splitlines()
+        package.fail("build failed: %s" % (lines[-1] if lines else process.returncode))
+        return
+
+    try:
+        names = sorted(os.listdir(out_dir))
+    except OSError:
+        # The setup.py didn't even create the dist directory
+        names = []
+    package.dist_files = [
+        entry for entry in (dist_file(os.path.join(out_dir, name)) for name in names)
+        if entry is not None
+    ]
+    if package.dist_files:
+        package.status = 'built'
+    else:
+        package.fail("no distribution built")
+
+
+@contextlib.contextmanager
+def _chdir(path):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def load_distribution(package):
+    """Run a package's setup.py, up to the creation of its Distribution."""
+    from distutils.core import run_setup
+
+    with _chdir(package.path):
+        return run_setup('setup.py', script_args=[], stop_after='init')
+
+
+def make_upload(package, pypirc, skip_existing, repository=None):
+    """Prepare the upload command of a built package; may prompt for credentials."""
+    from . import commands
+
+    distribution = load_distribution(package)
+    package.name = distribution.get_name()
+    if getattr(distribution, 'private_repository', None) is None:
+        raise ValueError("not a restricted package (no private_repository)")
+    distribution.dist_files = package.dist_files
+
+    cmd = commands.upload(distribution)
+    cmd.pypirc = pypirc
+    cmd.skip_existing = skip_existing
+    cmd.repository = repository
+    # From the package's directory, for its setup.cfg to apply
+    with _chdir(package.path):
+        cmd.ensure_finalized()
+    return cmd
+
+
+def publish(packages, formats, build_jobs, upload_jobs, pypirc=None,
+        skip_existing=False, repository=None):
+    """Build and upload packages; failures are recorded on each Package."""
+    dist_dir = tempfile.mkdtemp(prefix='restricted-pkg-')
+    try:
+        log.info("Building %d packages with %d jobs", len(packages), build_jobs)
+        parallel.run_parallel(lambda package: build(package, formats, dist_dir),
+            packages, build_jobs)
+
+        # Finalized one by one, as credentials may be prompted for
+        uploads = []
+        for package in packages:
+            if package.status != 'built':
+                continue
+            try:
+                uploads.append((package, make_upload(package, pypirc, skip_existing, repository)))
+            except Exception as e:
+                package.fail(e)
+
+        def upload(item):
+            package, cmd = item
+            start = time.time()
+            try:
+                cmd.run()
+            except Exception as e:
+                package.fail(e)
+            else:
+                package.status = 'uploaded'
+            package.upload_time = time.time() - start
+
+        parallel.run_parallel(upload, uploads, upload_jobs)
+    finally:
+        shutil.rmtree(dist_dir)
+
+
+def print_summary(packages, stream=None):
+    stream = stream or sys.stdout
+    width = max([len(package.name) for package in packages] + [10])
+    for package in packages:
+        line = '%-*s  %-8s  %2d files  build %6.1fs  upload %6.1fs' % (
+            width, package.name, package.status, len(package.dist_files),
+            package.build_time, package.upload_time)
+        if package.error:
+            line += '  %s' % package.error
+        print(line, file=stream)
+    failed = [package for package in packages if package.status == 'failed']
+    print("%d packages published, %d failed" % (len(packages) - len(failed), len(failed)),
+        file=stream)
+
+
+def main(argv):
+    parser = optparse.OptionParser(prog='restricted-pkg publish', usage="%prog [options] PATH...",
+        description="Build and upload all restricted packages found under PATHs.")
+    parser.add_option('-f', '--formats', default=DEFAULT_FORMATS,
+        help="Comma-separated distribution commands to run [default: %default]")
+    parser.add_option('-j', '--jobs', type='int', default=DEFAULT_BUILD_JOBS,
+        help="Number of packages built in parallel [default: %default]")
+    parser.add_option('-u', '--upload-jobs', type='int', default=DEFAULT_UPLOAD_JOBS,
+        help="Number of packages uploaded in parallel [default: %default]")
+    parser.add_option('--pypirc', help="Path to .pypirc configuration file")
+    parser.add_option('-r', '--repository',
+        help="Upload to this repository (it must match each package's private_repository)")
+    parser.add_option('--skip-existing', action='store_true', default=False,
+        help="Don't upload files already present on the repository")
+    options, paths = parser.parse_args(argv)
+    if not paths:
+        parser.error("At least one PATH is required.")
+
+    log.set_verbosity(1)
+    packages = find_packages(paths)
+    if not packages:
+        parser.error("No setup.py found under %s." % ', '.join(paths))
+
+    publish(packages,
+        formats=[name.strip() for name in options.formats.split(',') if name.strip()],
+        build_jobs=max(1, options.jobs),
+        upload_jobs=max(1, options.upload_jobs),
+        pypirc=options.pypirc,
+        skip_existing=options.skip_existing,
+        repository=options.repository,
+    )
+    print_summary(packages)
+    return 1 if any(package.status == 'failed' for package in packages) else 0
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Retries of requests rejected by an overloaded server.
+
+Requests answered with 429 or 5xx "unavailable" statuses, or failing at the
+connection level before being sent, are retried after an exponential backoff
+with full jitter; a Retry-After header sets a lower bound to the delay.
+Requests which may have reached the server, e.g. timing out while waiting
+for the response, are never sent again: uploads aren't idempotent.
+
+Concurrent requests to a repository go through an AIMDLimiter: each pushback
+halves the number of requests allowed in flight, each success raises it back
+by a fraction of a slot (additive increase, multiplicative decrease).
+"""
+
+import contextlib
+import email.utils
+import random
+import socket
+import threading
+import time
+
+from distutils import log
+
+from .compat import http_client
+
+
+# Statuses meaning "try again later"
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 60.0
+
+
+def parse_retry_after(value, now=None):
+    """Parse a Retry-After header, as a number of seconds or an HTTP date.
+
+    Returns:
+        float: the delay in seconds, None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, email.utils.mktime_tz(parsed) - now)
+
+
+class RetryPolicy(object):
+    """How often, and after which delays, to retry a request.
+
+    Attributes:
+        retries (int): maximum number of retries, 0 to disable them
+        backoff (float): base delay, in seconds, doubled on each retry
+        max_backoff (float): upper bound of the exponential backoff
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+            max_backoff=DEFAULT_MAX_BACKOFF, random_func=random.random):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.random = random_func
+
+    def delay(self, attempt, retry_after=None):
+        """Compute the delay before a retry.
+
+        Args:
+            attempt (int): number of retries already made
+            retry_after (float): the delay requested by the server, if any
+
+        Returns:
+            float: the delay in seconds
+        """
+        ceiling = min(self.max_backoff, self.backoff * (2 ** attempt))
+        delay = self.random() * ceiling
+        if retry_after is not None:
+            # The server knows best, even beyond max_backoff
+            delay = max(delay, retry_after)
+        return delay
+
+    def __repr__(self):
+        return '<RetryPolicy: %d retries, backoff %.1fs to %.1fs>' % (
+            self.retries, self.backoff, self.max_backoff)
+
+
+class AIMDLimiter(object):
+    """An adaptive bound on the number of requests in flight.
+
+    Attributes:
+        maximum (int): the upper bound, e.g. the --jobs option
+        limit (float): the current bound, between 1 and maximum
+        in_flight (int): requests currently in flight
+    """
+
+    def __init__(self, maximum):
+        self.maximum = max(1, maximum)
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Context manager holding a slot for a request, waiting for one if needed."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def success(self):
+        """Record an accepted request: grow the limit by 1 / limit."""
+        with self._condition:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._condition.notify_all()
+
+    def pushback(self):
+        """Record a request rejected by an overloaded server: halve the limit."""
+        with self._condition:
+            limit = max(1.0, self.limit / 2)
+            if int(limit) < int(self.limit):
+                log.info("Server overloaded, reducing to %d concurrent requests", int(limit))
+            self.limit = limit
+
+
+def send(request, policy, limiter=None, description='request', sleep=time.sleep):
+    """Send a request, retrying it while the server is overloaded.
+
+    The request body must support being sent several times. Connection
+    errors are only retried if the request wasn't sent, as flagged by their
+    request_sent attribute (see transport.ConnectionPool.request()).
+
+    Args:
+        request (callable): sends the request, returning a transport.Response
+        policy (RetryPolicy): when to retry
+        limiter (AIMDLimiter): bounds concurrent requests, if set
+        description (str): what is sent, for log messages
+        sleep (callable): waits for a number of seconds
+
+    Returns:
+        transport.Response: the last response received
+
+    Raises:
+        socket.error, http_client.HTTPException: if the last attempt failed
+            at the connection level
+    """
+    attempt = 0
+    while True:
+        error = None
+        response = None
+        with limiter.slot() if limiter is not None else _no_slot():
+            try:
+                response = request()
+            except (socket.error, http_client.HTTPException) as e:
+                error = e
+
+        if error is None and response.status not in RETRY_STATUSES:
+            if limiter is not None:
+                limiter.success()
+            return response
+        if error is not None and getattr(error, 'request_sent', True):
+            # The server may have processed it
+            raise error
+
+        if limiter is not None:
+            limiter.pushback()
+        if attempt >= policy.retries:
+            if error is not None:
+                raise error
+            return response
+
+        retry_after = None
+        if response is not None:
+            retry_after = parse_retry_after(response.getheader('Retry-After'))
+        delay = policy.delay(attempt, retry_after)
+        log.warn("Retrying %s in %.1fs (%s)", description, delay,
+            error if error is not None else '%s %s' % (response.status, response.reason))
+        sleep(delay)
+        attempt += 1
+
+
+@contextlib.contextmanager
+def _no_slot():
+    yield
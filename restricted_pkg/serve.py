@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""A local PEP 503 index, merging the private repository with PyPI.
+
+Project pages come from the private repository, or from PyPI for projects
+the private repository doesn't know: private names always take precedence.
+Pages and files are kept in an on-disk HTTP cache (see restricted_pkg.httpcache),
+evicting least recently used files; pages are served from the cache for
+--page-ttl seconds before being revalidated.
+
+File links are rewritten to go through the proxy; they carry a signature, so
+that the proxy never fetches URLs it didn't publish.
+
+Usage: restricted-pkg serve [options]
+"""
+
+from __future__ import print_function
+
+import base64
+import hashlib
+import hmac
+import optparse
+import os
+import re
+
+from distutils import log
+from distutils.errors import DistutilsError
+from xml.sax.saxutils import escape, quoteattr
+
+from . import httpcache
+from . import index
+from . import transport
+from . import wheelhouse
+from .compat import (
+    BaseHTTPRequestHandler, HTTPError, HTTPServer, Request, quote, socketserver, urlparse,
+)
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 3141
+DEFAULT_CACHE_DIR = '~/.cache/restricted_pkg/serve'
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_PAGE_TTL = 60
+CHUNK_SIZE = 64 * 1024
+
+_FILE_PATH_RE = re.compile(r'^/files/([0-9a-f]+)/([-\w=]+)/[^/]+$')
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text.encode('ascii'))
+
+
+class ProxyIndex(object):
+    """The merged index, independent of the HTTP server.
+
+    Attributes:
+        private_url (base.RepositoryURL): the private repository, with credentials
+        upstream_url (str): the public index, None to disable it
+        cache (httpcache.HTTPCache): where pages and files are kept
+        page_ttl (float): how long cached pages are served without revalidation
+    """
+
+    def __init__(self, private_url, upstream_url, cache, page_ttl=DEFAULT_PAGE_TTL):
+        self.private_url = private_url
+        self.upstream_url = upstream_url
+        self.cache = cache
+        self.page_ttl = page_ttl
+        self._secret = os.urandom(16)
+        self._private_netloc = urlparse(private_url.base_url).netloc
+
+    def sign(self, url):
+        return hmac.new(self._secret, url.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+    def file_path(self, link):
+        """The proxy path serving a link, with its fragment."""
+        path = '/files/%s/%s/%s' % (
+            self.sign(link.full_url), _b64encode(link.full_url.encode('utf-8')),
+            quote(link.filename))
+        if link.fragment:
+            path += '#' + link.fragment
+        return path
+
+    def check_file_path(self, path):
+        """Retrieve the URL behind a path built by file_path().
+
+        Returns:
+            str: the URL, None if the path is invalid
+        """
+        match = _FILE_PATH_RE.match(path)
+        if match is None:
+            return None
+        try:
+            url = _b64decode(match.group(2)).decode('utf-8')
+        except (TypeError, ValueError):
+            return None
+        if not hmac.compare_digest(match.group(1), self.sign(url)):
+            return None
+        return url
+
+    def open(self, url, max_age=None):
+        """Open a URL through the cache, with credentials on the private repository.
+
+        Returns:
+            a file-like response; None on 404
+        """
+        request = Request(url)
+        if urlparse(url).netloc == self._private_netloc and self.private_url.needs_auth:
+            request.add_header('Authorization',
+                transport.basic_auth(self.private_url.username, self.private_url.password))
+        try:
+            return self.cache.open(request, max_age=max_age)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def project_links(self, project):
+        """Fetch the links of a project, from the first index knowing it.
+
+        Returns:
+            index.Link list: the links, None if no index knows the project
+        """
+        index_urls = [self.private_url.base_url]
+        if self.upstream_url:
+            index_urls.append(self.upstream_url)
+        for index_url in index_urls:
+            url = index.project_url(index_url, project)
+            response = self.open(url, max_age=self.page_ttl)
+            if response is None:
+                continue
+            try:
+                charset = index.content_charset(response.info().get('Content-Type'))
+                page = response.read().decode(charset, 'replace')
+            finally:
+                response.close()
+            return index.parse_links(page, url)
+        return None
+
+    def render_project(self, project, links):
+        lines = [
+            '<!DOCTYPE html>',
+            '<html><head><title>Links for %s</title></head><body>' % escape(project),
+            '<h1>Links for %s</h1>' % escape(project),
+        ]
+        for link in links:
+            attrs = 'href=%s' % quoteattr(self.file_path(link))
+            if link.requires_python:
+                attrs += ' data-requires-python=%s' % quoteattr(link.requires_python)
+            lines.append('<a %s>%s</a><br/>' % (attrs, escape(link.filename)))
+        lines.append('</body></html>')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class ProxyRequestHandler(BaseHTTPRequestHandler):
+    """Serve /simple/<project>/ pages and /files/... downloads."""
+
+    def log_message(self, format, *args):
+        log.info("%s - %s", self.address_string(), format % args)
+
+    def _respond(self, status, body=b'', content_type='text/plain', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        try:
+            if path in ('/', '/simple/'):
+                self._respond(200, b'<!DOCTYPE html>\n<html><body></body></html>\n',
+                    'text/html')
+            elif path.startswith('/simple/'):
+                self.serve_project(path[len('/simple/'):])
+            elif path.startswith('/files/'):
+                self.serve_file(path)
+            else:
+                self._respond(404, b'Not found')
+        except (IOError, OSError, DistutilsError) as e:
+            log.error("Unable to serve %s: %s", path, e)
+            self._respond(502, ('Upstream error: %s' % e).encode('utf-8'))
+
+    def serve_project(self, name):
+        project = name.rstrip('/')
+        normalized = index.normalize_name(project)
+        if not project or '/' in project:
+            self._respond(404, b'Not found')
+            return
+        if project != normalized or not name.endswith('/'):
+            self._respond(301, headers=[('Location', '/simple/%s/' % normalized)])
+            return
+
+        proxy = self.server.proxy
+        links = proxy.project_links(normalized)
+        if links is None:
+            self._respond(404, b'Not found')
+            return
+        self._respond(200, proxy.render_project(normalized, links), 'text/html; charset=utf-8')
+
+    def serve_file(self, path):
+        url = self.server.proxy.check_file_path(path)
+        if url is None:
+            self._respond(404, b'Not found')
+            return
+        response = self.server.proxy.open(url)
+        if response is None:
+            self._respond(404, b'Not found')
+            return
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            length = response.info().get('Content-Length')
+            if length:
+                self.send_header('Content-Length', length)
+            self.end_headers()
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                self.wfile.write(chunk)
+        finally:
+            response.close()
+
+
+class ProxyServer(socketserver.ThreadingMixIn, HTTPServer):
+    """The HTTP server of a ProxyIndex."""
+
+    daemon_threads = True
+
+    def __init__(self, address, proxy):
+        HTTPServer.__init__(self, address, ProxyRequestHandler)
+        self.proxy = proxy
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/simple/' % (host, port)
+
+
+def get_private_repository(setup_dir):
+    """Read the private_repository setting of a setup.py."""
+    from . import publish
+
+    distribution = publish.load_distribution(publish.Package(os.path.abspath(setup_dir)))
+    private_repository = getattr(distribution, 'private_repository', None)
+    if private_repository is None:
+        raise DistutilsError("%s/setup.py doesn't set private_repository" % setup_dir)
+    return private_repository
+
+
+def main(argv):
+    from . import commands
+
+    parser = optparse.OptionParser(prog='restricted-pkg serve', usage="%prog [options]",
+        description="Serve a local index merging the private repository with PyPI.")
+    parser.add_option('-r', '--repository',
+        help="URL or .pypirc alias of the private repository "
+        "[default: the private_repository of SETUP_DIR/setup.py]")
+    parser.add_option('--setup-dir', default=os.curdir,
+        help="Directory of the setup.py to read private_repository from [default: %default]")
+    parser.add_option('--pypirc', default=commands.DEFAULT_PYPI_RC,
+        help="Path to .pypirc configuration file [default: %default]")
+    parser.add_option('--upstream', default=wheelhouse.PYPI_INDEX_URL,
+        help="Public index for projects unknown to the private repository [default: %default]")
+    parser.add_option('--disable-pypi', action='store_true', default=False,
+        help="Only serve the private repository")
+    parser.add_option('--host', default=DEFAULT_HOST, help="Address to listen on [default: %default]")
+    parser.add_option('-p', '--port', type='int', default=DEFAULT_PORT,
+        help="Port to listen on [default: %default]")
+    parser.add_option('--cache-dir', default=httpcache.default_cache_dir() or DEFAULT_CACHE_DIR,
+        help="Directory for cached pages and files [default: %default]")
+    parser.add_option('--cache-size', type='int', default=DEFAULT_CACHE_SIZE,
+        help="Maximum size of cached files, in MB [default: %default]")
+    parser.add_option('--page-ttl', type='float', default=DEFAULT_PAGE_TTL,
+        help="Seconds during which cached pages aren't revalidated [default: %default]")
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error("Unexpected arguments: %s" % ' '.join(args))
+
+    log.set_verbosity(1)
+    try:
+        private_repository = options.repository or get_private_repository(options.setup_dir)
+        private_url = commands.get_install_repo_url(options.pypirc, private_repository)
+    except DistutilsError as e:
+        parser.error(str(e))
+
+    proxy = ProxyIndex(
+        private_url=private_url,
+        upstream_url=None if options.disable_pypi else options.upstream,
+        cache=httpcache.HTTPCache(options.cache_dir, options.cache_size * 1024 * 1024),
+        page_ttl=options.page_ttl,
+    )
+    server = ProxyServer((options.host, options.port), proxy)
+    print("Serving %s%s on %s" % (private_url.base_url,
+        '' if options.disable_pypi else ' and %s' % options.upstream, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
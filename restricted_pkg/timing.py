@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Lightweight timing spans, written as a JSON report at exit.
+
+Recording is off until enable() is called (see the --timing-report option of
+commands); until then, span() and timed() only cost a global lookup.
+
+Report format:
+    {
+        "total": <seconds since timing was enabled>,
+        "spans": [{"name", "start", "duration", "depth", "thread"}, ...],
+        "summary": {<name>: {"count", "total"}, ...}
+    }
+"""
+
+import atexit
+import functools
+import json
+import threading
+import time
+
+from distutils import log
+
+
+class Recorder(object):
+    """Collect timing spans.
+
+    Attributes:
+        path (str): where the report is written
+        origin (float): when recording started
+        spans (dict list): finished spans
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.origin = clock()
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self, name):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        return (name, self.clock(), depth)
+
+    def finish(self, token):
+        name, start, depth = token
+        end = self.clock()
+        self._local.depth = depth
+        span = {
+            'name': name,
+            'start': start - self.origin,
+            'duration': end - start,
+            'depth': depth,
+            'thread': threading.current_thread().name,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def report(self):
+        """Build the report, as a JSON-serializable dict."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start'])
+        summary = {}
+        for span in spans:
+            entry = summary.setdefault(span['name'], {'count': 0, 'total': 0.0})
+            entry['count'] += 1
+            entry['total'] += span['duration']
+        return {
+            'total': self.clock() - self.origin,
+            'spans': spans,
+            'summary': summary,
+        }
+
+    def write(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+            f.write('\n')
+        log.info("Timing report written to %s", self.path)
+
+
+_recorder = None
+
+
+def enable(path):
+    """Start recording spans, for a report written to path at exit.
+
+    Returns:
+        Recorder
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(path)
+        atexit.register(_write_report)
+    elif _recorder.path != path:
+        log.warn("Timing report already enabled, to %s", _recorder.path)
+    return _recorder
+
+
+def disable():
+    """Stop recording spans, dropping the report."""
+    global _recorder
+    _recorder = None
+
+
+def _write_report():
+    if _recorder is not None:
+        _recorder.write()
+
+
+class _Span(object):
+    __slots__ = ('recorder', 'name', 'token')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.token = self.recorder.start(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.finish(self.token)
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing a block of code, as the 'name' span."""
+    if _recorder is None:
+        return _NO_SPAN
+    return _Span(_recorder, name)
+
+
+def timed(name):
+    """Decorator timing each call to a function, as the 'name' span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            token = recorder.start(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.finish(token)
+        return wrapper
+    return decorator
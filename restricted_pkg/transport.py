@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Shared keep-alive HTTP connections.
+
+All restricted_pkg commands of a process send their requests through the
+same ConnectionPool (see get_pool()), so that consecutive commands talking to
+the same repository reuse TCP connections and TLS sessions.
+
+As with urllib, the http_proxy, https_proxy and no_proxy environment
+variables are honored; HTTPS requests are tunneled through the proxy.
+"""
+
+import atexit
+import base64
+import collections
+import errno
+import select
+import socket
+import ssl
+import threading
+
+from . import base
+from . import timing
+from .compat import getproxies, http_client, proxy_bypass
+
+
+DEFAULT_TIMEOUT = 60
+# Maximum number of idle connections kept per (scheme, netloc)
+DEFAULT_MAXSIZE = 8
+
+# ssl.SSLContext.wrap_socket() accepts a 'session' since Python 3.6
+_TLS_SESSIONS = hasattr(ssl, 'SSLSession')
+
+# Errors meaning that the server closed a kept-alive connection
+_STALE_ERRNOS = (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED)
+_RemoteDisconnected = getattr(http_client, 'RemoteDisconnected', ())
+
+
+def get_proxy(scheme, netloc):
+    """Find the proxy for a location, from the environment.
+
+    Returns:
+        base.RepositoryURL: the proxy, None for direct connections
+    """
+    proxy = getproxies().get(scheme)
+    if not proxy or proxy_bypass(netloc):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    return base.RepositoryURL.interned(proxy)
+
+
+class _HTTPSConnection(http_client.HTTPSConnection):
+    """HTTPSConnection resuming a previous TLS session, if available."""
+
+    def __init__(self, host, tls_session=None, **kwargs):
+        http_client.HTTPSConnection.__init__(self, host, **kwargs)
+        self.tls_session = tls_session
+
+    def connect(self):
+        if self.tls_session is None or self._tunnel_host:
+            return http_client.HTTPSConnection.connect(self)
+        sock = socket.create_connection((self.host, self.port), self.timeout, self.source_address)
+        self.sock = self._context.wrap_socket(
+            sock, server_hostname=self.host, session=self.tls_session)
+
+
+class Response(object):
+    """A response received through a ConnectionPool.
+
+    The underlying connection goes back to the pool once the body has been
+    read, either through read() / .data or by calling release().
+
+    Attributes:
+        status (int): the HTTP status code
+        reason (str): the HTTP reason phrase
+        headers (http.client.HTTPMessage): the response headers
+    """
+
+    def __init__(self, pool, key, connection, raw):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._raw = raw
+        self._data = None
+        self.status = raw.status
+        self.reason = raw.reason
+        self.headers = raw.msg
+
+    def getheader(self, name, default=None):
+        # Still available once the connection has been released
+        return self.headers.get(name, default)
+
+    def read(self, amt=None):
+        """Read (part of) the body; the connection is released at EOF."""
+        if self._raw is None:
+            return b''
+        chunk = self._raw.read() if amt is None else self._raw.read(amt)
+        if amt is None or not chunk:
+            self.release()
+        return chunk
+
+    def iter_content(self, chunk_size=64 * 1024):
+        """Iterate over the body, chunk by chunk."""
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @property
+    def data(self):
+        """The full body of the response."""
+        if self._data is None:
+            self._data = self.read()
+        return self._data
+
+    def release(self):
+        """Give the connection back to the pool, or close it."""
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        if raw.isclosed() and not raw.will_close:
+            self._pool._put(self._key, self._connection)
+        else:
+            raw.close()
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP(S) connections, keyed by (scheme, netloc).
+
+    Attributes:
+        timeout (float): socket timeout for new connections
+        maxsize (int): maximum number of idle connections per location
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, maxsize=DEFAULT_MAXSIZE, ssl_context=None):
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._idle = collections.defaultdict(list)
+        self._tls_sessions = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, proxy=None):
+        """Retrieve a connection for a (scheme, netloc, proxy) key.
+
+        Returns:
+            (connection, reused)
+        """
+        with self._lock:
+            idle = self._idle[key]
+            while idle:
+                connection = idle.pop()
+                if not _is_dropped(connection):
+                    return connection, True
+                connection.close()
+            tls_session = self._tls_sessions.get(key)
+
+        scheme, netloc = key[:2]
+        host = proxy.netloc if proxy is not None else netloc
+        if scheme == 'https':
+            if _TLS_SESSIONS:
+                connection = _HTTPSConnection(host, tls_session=tls_session,
+                    timeout=self.timeout, context=self.ssl_context)
+            else:
+                connection = http_client.HTTPSConnection(host,
+                    timeout=self.timeout, context=self.ssl_context)
+            if proxy is not None:
+                tunnel_headers = {}
+                if proxy.needs_auth:
+                    tunnel_headers['Proxy-Authorization'] = basic_auth(
+                        proxy.username, proxy.password)
+                tunnel_host, port = base.split_host(netloc)
+                connection.set_tunnel(tunnel_host.strip('[]'), int(port) if port else None,
+                    headers=tunnel_headers)
+        elif scheme == 'http':
+            connection = http_client.HTTPConnection(host, timeout=self.timeout)
+        else:
+            raise ValueError("Unsupported scheme %r" % scheme)
+        return connection, False
+
+    def _put(self, key, connection):
+        """Keep an idle connection for later reuse."""
+        session = getattr(connection.sock, 'session', None)
+        with self._lock:
+            if session is not None:
+                self._tls_sessions[key] = session
+            idle = self._idle[key]
+            if len(idle) < self.maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, body=None, headers=None, stream=False):
+        """Send a request, reusing an idle connection if possible.
+
+        Credentials embedded in the URL are sent as Basic auth, unless an
+        Authorization header is provided.
+
+        Args:
+            method (str): the HTTP method
+            url (str): the full URL
+            body (bytes, file or iterable): the request body; iterables
+                require a Content-Length header, or are sent chunked
+            headers (dict): additional headers
+            stream (bool): if False, the body of the response is read and
+                the connection released before returning
+
+        Returns:
+            Response
+        Raises:
+            socket.error, http_client.HTTPException: on connection errors; their
+                request_sent attribute tells whether the whole request had
+                been written, i.e. whether the server may have processed it
+        """
+        repo_url = base.RepositoryURL.interned(url)
+        proxy = get_proxy(repo_url.scheme, repo_url.netloc)
+        key = (repo_url.scheme, repo_url.netloc, proxy.full_url if proxy is not None else None)
+        headers = dict(headers or {})
+        if repo_url.needs_auth and 'Authorization' not in headers:
+            headers['Authorization'] = basic_auth(repo_url.username, repo_url.password)
+        target = repo_url.path or '/'
+        if repo_url.params:
+            target += ';' + repo_url.params
+        if repo_url.query:
+            target += '?' + repo_url.query
+        if proxy is not None and repo_url.scheme == 'http':
+            # Plain HTTP proxies get the full URL; HTTPS goes through a tunnel
+            target = '%s://%s%s' % (repo_url.scheme, repo_url.netloc, target)
+            if proxy.needs_auth:
+                headers['Proxy-Authorization'] = basic_auth(proxy.username, proxy.password)
+
+        while True:
+            connection, reused = self._get(key, proxy)
+            sent = False
+            try:
+                if not reused:
+                    with timing.span('transport.connect'):
+                        connection.connect()
+                with timing.span('transport.request'):
+                    connection.request(method, target, body=body, headers=headers)
+                    sent = True
+                    raw = connection.getresponse()
+            except (socket.error, http_client.HTTPException) as e:
+                connection.close()
+                # A kept-alive connection may have been closed by the server
+                # in the meantime: send again, on a fresh connection, unless
+                # the server may have received the request.
+                if reused and _is_stale(e, sent) and _is_rewindable(body):
+                    _rewind(body)
+                    continue
+                e.request_sent = sent
+                raise
+            break
+
+        response = Response(self, key, connection, raw)
+        if not stream:
+            response.data
+        return response
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def _is_dropped(connection):
+    """Whether an idle connection was closed by the server."""
+    if connection.sock is None:
+        return True
+    try:
+        # An idle connection has nothing to read, but EOF
+        return bool(select.select([connection.sock], [], [], 0)[0])
+    except (ValueError, socket.error, select.error):
+        return True
+
+
+def _is_stale(error, sent):
+    """Whether an error means the server closed a kept-alive connection.
+
+    Args:
+        error (Exception): the error raised
+        sent (bool): whether the whole request had been written
+    """
+    if isinstance(error, _RemoteDisconnected):
+        # Closed without a single byte of response
+        return True
+    if sent or isinstance(error, socket.timeout):
+        return False
+    return isinstance(error, socket.error) and error.errno in _STALE_ERRNOS
+
+
+def _is_rewindable(body):
+    if body is None or isinstance(body, bytes) or hasattr(body, 'seek'):
+        return True
+    # Iterables, unlike iterators, can be iterated again
+    return hasattr(body, '__iter__') and iter(body) is not body
+
+
+def _rewind(body):
+    if hasattr(body, 'seek'):
+        body.seek(0)
+
+
+def basic_auth(username, password):
+    """Build the value of a Basic Authorization header."""
+    credentials = ('%s:%s' % (username, password)).encode('utf-8')
+    return 'Basic ' + base64.b64encode(credentials).decode('ascii')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retrieve the process-wide ConnectionPool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+            atexit.register(_pool.close)
+        return _pool
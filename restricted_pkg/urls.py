@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Repository URLs and allowlists.
+
+This module only depends on the standard library, so that setup keyword
+validators can use it without loading the rest of the package.
+"""
+
+import collections
+import fnmatch
+import functools
+import re
+import threading
+
+try:
+    from urllib.parse import urlparse, urlunparse
+except ImportError:  # Python2
+    from urlparse import urlparse, urlunparse
+
+
+
+@functools.total_ordering
+class RepositoryURL(object):
+    """Representation of a repository URL.
+
+    Also handles auth.
+
+    Instances are ordered by their components; interned (read-only) instances
+    are also hashable. Rendered URLs are memoized until a component changes.
+
+    Attributes:
+        scheme, netloc, path, params, query, fragment: usual URL components
+        with_auth (bool): whether the URL requires auth
+        username (str): Username to use for the URL
+        password (str): password to use for the URL
+    """
+
+    FIELDS = (
+        'scheme', 'netloc', 'path', 'params', 'query', 'fragment',
+        'with_auth', 'username', 'password',
+    )
+    __slots__ = FIELDS + ('_frozen', '_base_url', '_full_url')
+
+    # Maximum number of parsed URLs kept by interned()
+    INTERN_SIZE = 1024
+    _interned = collections.OrderedDict()
+    _interned_lock = threading.Lock()
+
+    def __init__(self, url):
+        self._set_components(self.interned(url)._components())
+
+    @classmethod
+    def _parse(cls, url):
+        """Parse a URL string into a tuple of FIELDS values."""
+        scheme, netloc, path, params, query, fragment = urlparse(url)
+
+        with_auth = False
+        username = password = ''
+
+        if '@' in netloc:
+            with_auth = True
+            ident, netloc = netloc.rsplit('@', 1)
+            if ':' in ident:
+                username, password = ident.split(':', 1)
+            else:
+                username = ident
+
+        return (
+            scheme, netloc, path, params, query, fragment,
+            with_auth, username, password,
+        )
+
+    @classmethod
+    def _from_components(cls, components, frozen=False):
+        url = cls.__new__(cls)
+        url._set_components(components, frozen=frozen)
+        return url
+
+    @classmethod
+    def interned(cls, url):
+        """Retrieve a shared, read-only RepositoryURL for a URL string.
+
+        Parsed URLs are kept in a bounded LRU table; use replace() to derive
+        a modifiable copy.
+        """
+        with cls._interned_lock:
+            instance = cls._interned.pop(url, None)
+            if instance is not None:
+                cls._interned[url] = instance
+                return instance
+
+        instance = cls._from_components(cls._parse(url), frozen=True)
+        with cls._interned_lock:
+            cls._interned[url] = instance
+            while len(cls._interned) > cls.INTERN_SIZE:
+                cls._interned.popitem(last=False)
+        return instance
+
+    def _set_components(self, components, frozen=False):
+        setter = object.__setattr__
+        for field, value in zip(self.FIELDS, components):
+            setter(self, field, value)
+        setter(self, '_base_url', None)
+        setter(self, '_full_url', None)
+        setter(self, '_frozen', frozen)
+
+    def _components(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(
+                "Interned RepositoryURL objects are read-only, use replace().")
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_base_url', None)
+        object.__setattr__(self, '_full_url', None)
+
+    def replace(self, **kwargs):
+        """Build a new, modifiable RepositoryURL with some fields replaced."""
+        components = tuple(
+            kwargs.pop(field, getattr(self, field)) for field in self.FIELDS)
+        if kwargs:
+            raise TypeError("Unknown RepositoryURL fields: %s" % ', '.join(sorted(kwargs)))
+        return self._from_components(components)
+
+    def __contains__(self, other):
+        """Another url is 'contained' if it shares scheme, host, path prefix."""
+        if not isinstance(other, RepositoryURL):
+            return NotImplemented
+
+        return (self.scheme == other.scheme
+            and self.netloc == other.netloc
+            and other.path.startswith(self.path)
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, RepositoryURL):
+            return NotImplemented
+        return self._components() == other._components()
+
+    def __ne__(self, other):
+        if not isinstance(other, RepositoryURL):
+            return NotImplemented
+        return self._components() != other._components()
+
+    def __lt__(self, other):
+        if not isinstance(other, RepositoryURL):
+            return NotImplemented
+        return self._components() < other._components()
+
+    def __hash__(self):
+        if not self._frozen:
+            # The hash would change along with the components
+            raise TypeError("Modifiable RepositoryURL objects are unhashable, use interned().")
+        return hash(self._components())
+
+    @property
+    def needs_auth(self):
+        """Whether this server needs auth."""
+        return bool(self.with_auth or self.username or self.password)
+
+    @property
+    def base_url(self):
+        """The base, unauthenticated URL for the repository."""
+        if self._base_url is None:
+            object.__setattr__(self, '_base_url', urlunparse((
+                self.scheme,
+                self.netloc,
+                self.path,
+                self.params,
+                self.query,
+                self.fragment,
+            )))
+        return self._base_url
+
+    @property
+    def full_url(self):
+        """The full URL, including username/password."""
+        if self._full_url is None:
+            if self.needs_auth:
+                netloc = '%s:%s@%s' % (self.username, self.password, self.netloc)
+            else:
+                netloc = self.netloc
+            object.__setattr__(self, '_full_url', urlunparse((
+                self.scheme,
+                netloc,
+                self.path,
+                self.params,
+                self.query,
+                self.fragment,
+            )))
+        return self._full_url
+
+    def __str__(self):
+        return self.full_url
+
+    def __repr__(self):
+        return '<RepositoryURL: %s>' % self.base_url
+
+
+def repository_urls(value):
+    """Split a private_repository setting into its URLs and patterns.
+
+    Args:
+        value (str or str list): a URL, several whitespace-separated URLs,
+            or a list of URLs; extra URLs are mirrors of the first one, and
+            glob patterns (see RepositoryMatcher) only extend the allowlist
+
+    Returns:
+        str list
+    """
+    if isinstance(value, (list, tuple)):
+        return [url for url in value if url]
+    return value.split()
+
+
+_GLOB_CHARS = re.compile(r'[*?[]')
+# A bracketed IPv6 host, as in http://[::1]:8080/
+_IPV6_HOST = re.compile(r'^\[[^\]]*\]')
+
+
+def split_host(netloc):
+    """Split a netloc into its host and port, keeping an IPv6 host whole."""
+    netloc = netloc.rpartition('@')[2]
+    match = _IPV6_HOST.match(netloc)
+    if match is not None:
+        return match.group(), netloc[match.end():].partition(':')[2]
+    host, _sep, port = netloc.partition(':')
+    return host, port
+
+
+def _is_ipv6_host(host):
+    return _IPV6_HOST.match(host) is not None
+
+
+def is_pattern(url):
+    """Whether a private_repository entry is a glob pattern rather than a URL."""
+    _scheme, sep, rest = url.partition('://')
+    if sep:
+        netloc, slash, path = rest.partition('/')
+        host, port = split_host(netloc)
+        if _is_ipv6_host(host):
+            # Those brackets aren't a character class
+            url = port + slash + path
+    return _GLOB_CHARS.search(url) is not None
+
+
+def mirror_urls(value):
+    """The actual URLs (not patterns) of a private_repository setting."""
+    return [url for url in repository_urls(value) if not is_pattern(url)]
+
+
+class _MatcherNode(object):
+    __slots__ = ('literals', 'globs', 'any_depth', 'terminal')
+
+    def __init__(self):
+        # token => _MatcherNode
+        self.literals = {}
+        # (compiled glob, _MatcherNode) list
+        self.globs = []
+        # _MatcherNode for '**', matching any number of path segments
+        self.any_depth = None
+        self.terminal = False
+
+
+class RepositoryMatcher(object):
+    """An allowlist of repository URLs and glob patterns, compiled into a trie.
+
+    A URL is allowed if it lies below an entry: same scheme, same host and
+    port, and the entry's path segments as a prefix of its own. In patterns,
+    '*' and '?' match within a single host label or path segment, and a
+    '**' path segment matches any number of segments, e.g.:
+
+        https://*.pypi.example.org/
+        https://pypi.example.org/teams/*/simple/
+
+    URLs are split into tokens (scheme, reversed host labels, port, path
+    segments) and walked down the trie: lookups depend on the length of the
+    URL, not on the number of entries.
+    """
+
+    # Maximum number of compiled matchers kept by compiled()
+    CACHE_SIZE = 64
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._root = _MatcherNode()
+        for pattern in self.patterns:
+            self._add(pattern)
+
+    @classmethod
+    def compiled(cls, patterns):
+        """Retrieve a shared matcher for a list of patterns."""
+        key = tuple(patterns)
+        with cls._cache_lock:
+            matcher = cls._cache.pop(key, None)
+            if matcher is None:
+                matcher = cls(key)
+            cls._cache[key] = matcher
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return matcher
+
+    @staticmethod
+    def _host_labels(url):
+        """The host labels of a RepositoryURL, most significant first.
+
+        An IPv6 host is a single label.
+        """
+        host = split_host(url.netloc)[0].lower()
+        if _is_ipv6_host(host):
+            return [host]
+        return list(reversed(host.split('.')))
+
+    @classmethod
+    def _tokens(cls, url):
+        """Split a RepositoryURL into matched tokens."""
+        tokens = [url.scheme.lower()]
+        tokens.extend(cls._host_labels(url))
+        tokens.append(':' + split_host(url.netloc)[1])
+        tokens.extend(url.path.split('/')[1:])
+        return tokens
+
+    @staticmethod
+    def _is_glob(index, token):
+        """Whether a token, at index in the output of _tokens(), is a glob."""
+        if index == 1 and _is_ipv6_host(token):
+            return False
+        return is_pattern(token)
+
+    @classmethod
+    def check_pattern(cls, pattern):
+        """Validate the syntax of a pattern.
+
+        Raises:
+            ValueError: if the pattern is invalid
+        """
+        url = RepositoryURL.interned(pattern)
+        if not url.scheme or not url.netloc:
+            raise ValueError("%r is not an absolute URL" % pattern)
+        if url.params or url.query or url.fragment:
+            raise ValueError("%r has a query string or a fragment" % pattern)
+        # Path segments follow the scheme, host labels and port
+        path_start = 2 + len(cls._host_labels(url))
+        for index, token in enumerate(cls._tokens(url)):
+            if not cls._is_glob(index, token):
+                continue
+            if token.count('[') != token.count(']'):
+                raise ValueError("%r has unbalanced brackets" % pattern)
+            if '**' in token and (token != '**' or index < path_start):
+                raise ValueError("%r: '**' may only be used as a whole path segment" % pattern)
+
+    def _add(self, pattern):
+        self.check_pattern(pattern)
+        tokens = self._tokens(RepositoryURL.interned(pattern))
+        # A trailing '/' doesn't restrict anything
+        if len(tokens) > 1 and tokens[-1] == '':
+            tokens.pop()
+
+        node = self._root
+        for index, token in enumerate(tokens):
+            if token == '**':
+                if node.any_depth is None:
+                    node.any_depth = _MatcherNode()
+                node = node.any_depth
+            elif self._is_glob(index, token):
+                regexp = re.compile(fnmatch.translate(token))
+                for glob, child in node.globs:
+                    if glob.pattern == regexp.pattern:
+                        node = child
+                        break
+                else:
+                    child = _MatcherNode()
+                    node.globs.append((regexp, child))
+                    node = child
+            else:
+                node = node.literals.setdefault(token, _MatcherNode())
+        node.terminal = True
+
+    def _match(self, node, tokens, index):
+        if node.terminal:
+            return True
+        if index == len(tokens):
+            return False
+        token = tokens[index]
+        child = node.literals.get(token)
+        if child is not None and self._match(child, tokens, index + 1):
+            return True
+        for glob, child in node.globs:
+            if glob.match(token) and self._match(child, tokens, index + 1):
+                return True
+        if node.any_depth is not None:
+            for skip in range(index, len(tokens) + 1):
+                if self._match(node.any_depth, tokens, skip):
+                    return True
+        return False
+
+    def __contains__(self, url):
+        """Whether a URL (str or RepositoryURL) is allowed."""
+        if not isinstance(url, RepositoryURL):
+            url = RepositoryURL.interned(url)
+        return self._match(self._root, self._tokens(url), 0)
+
+    def __repr__(self):
+        return '<RepositoryMatcher: %s>' % ', '.join(self.patterns)
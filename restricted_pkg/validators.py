@@ -8,7 +8,14 @@
 
 from distutils.errors import DistutilsSetupError
 
+from .urls import RepositoryMatcher, repository_urls
+
 
 def validate_private_repo(distribution, attr, value):
-    if not value:
+    if not value or not repository_urls(value):
         raise DistutilsSetupError("The %s value cannot be empty." % attr)
+    for pattern in repository_urls(value):
+        try:
+            RepositoryMatcher.check_pattern(pattern)
+        except ValueError as e:
+            raise DistutilsSetupError("Invalid %s entry: %s" % (attr, e))
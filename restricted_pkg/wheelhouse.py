@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Offline installs from a local directory of pre-built distributions.
+
+A wheelhouse is filled once, with network access, by the 'fetch' command
+(which relies on 'pip wheel'); later installs with --wheelhouse only read
+from that directory.
+
+Also holds the steps of 'install --backend=pip': resolve() the dependencies
+missing from the environment, build_wheels() for them, then install_wheels();
+the last two steps run concurrently, as wheels are installed without their
+dependencies once the whole set has been resolved.
+"""
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from distutils.errors import DistutilsError
+from distutils import log
+
+from . import parallel
+from .compat import pathname2url
+
+
+PYPI_INDEX_URL = 'https://pypi.org/simple/'
+
+# An --allow-hosts pattern matching no actual host ('.invalid' is reserved by
+# RFC 2606): only file:// URLs remain reachable.
+NO_HOSTS = 'no-network.invalid'
+
+
+def pip_index_environ(repo_url, disable_pypi=False):
+    """Build pip's index settings for a private repository.
+
+    They are passed through the environment rather than the command line,
+    where any local user could read the credentials.
+
+    Args:
+        repo_url (base.RepositoryURL): the private repository, with credentials
+        disable_pypi (bool): whether to use the private repository only
+
+    Returns:
+        dict: environment variables for pip
+    """
+    if disable_pypi:
+        return {'PIP_INDEX_URL': repo_url.full_url}
+    return {'PIP_INDEX_URL': PYPI_INDEX_URL, 'PIP_EXTRA_INDEX_URL': repo_url.full_url}
+
+
+def fetch(requirements, wheelhouse, index_args=(), index_environ=None):
+    """Download and build requirements and their dependencies into a wheelhouse.
+
+    Args:
+        requirements (str list): the requirements to fetch
+        wheelhouse (str): the target directory
+        index_args (str list): pip's index options
+        index_environ (dict): pip's index settings, from pip_index_environ()
+    """
+    if not os.path.isdir(wheelhouse):
+        os.makedirs(wheelhouse)
+    if not requirements:
+        log.info("No requirements to fetch.")
+        return
+
+    log.info("Fetching %d requirements into %s", len(requirements), wheelhouse)
+    _run_pip(['wheel', '--wheel-dir', wheelhouse] + list(index_args) + requirements,
+        "Fetching requirements", index_environ)
+
+
+def _run_pip(args, action, index_environ=None):
+    """Run pip in a subprocess.
+
+    Args:
+        args (str list): pip's arguments
+        action (str): what pip does, for error messages
+        index_environ (dict): extra environment variables, from pip_index_environ()
+
+    Raises:
+        DistutilsError: if pip couldn't be run or failed
+    """
+    command = [sys.executable, '-m', 'pip'] + args
+    environ = None
+    if index_environ:
+        environ = dict(os.environ)
+        environ.update(index_environ)
+    try:
+        subprocess.check_call(command, env=environ)
+    except OSError as e:
+        raise DistutilsError("Unable to run pip: %s" % e)
+    except subprocess.CalledProcessError as e:
+        raise DistutilsError("%s failed (pip exited with %d)" % (action, e.returncode))
+
+
+def resolve(requirements, index_args=(), install_args=(), index_environ=None):
+    """Find the distributions to install for requirements, with pip's resolver.
+
+    Distributions already installed in the target environment are kept.
+    This relies on 'pip install --dry-run --report' (pip 22.2+).
+
+    Args:
+        requirements (str list): the requirements to install
+        index_args (str list): pip's index options
+        install_args (str list): pip's installation scheme options, e.g. ['--user']
+        index_environ (dict): pip's index settings, from pip_index_environ()
+
+    Returns:
+        str list: 'name==version' of each distribution to install
+    """
+    fd, report_path = tempfile.mkstemp(prefix='restricted_pkg-', suffix='.json')
+    os.close(fd)
+    try:
+        _run_pip(['install', '--dry-run', '--quiet', '--report', report_path]
+            + list(index_args) + list(install_args) + requirements, "Resolving requirements",
+            index_environ)
+        with open(report_path) as f:
+            report = json.load(f)
+    finally:
+        os.unlink(report_path)
+    return [
+        '%s==%s' % (item['metadata']['name'], item['metadata']['version'])
+        for item in report.get('install', [])
+    ]
+
+
+def build_wheels(pinned, wheel_dir, index_args, jobs, index_environ=None):
+    """Download or build wheels for resolved distributions, concurrently.
+
+    Returns:
+        str list: paths to the wheels
+    """
+    def build(requirement):
+        # One directory per requirement, to find out which wheel it produced
+        out_dir = tempfile.mkdtemp(dir=wheel_dir)
+        _run_pip(['wheel', '--quiet', '--no-deps', '--wheel-dir', out_dir]
+            + list(index_args) + [requirement], "Building %s" % requirement, index_environ)
+        return glob.glob(os.path.join(out_dir, '*.whl'))
+
+    log.info("Building %d wheels with %d jobs", len(pinned), jobs)
+    return [path for paths in parallel.run_parallel(build, pinned, jobs) for path in paths]
+
+
+def install_wheels(wheels, install_args=(), jobs=1):
+    """Install wheels concurrently, without their dependencies."""
+    log.info("Installing %d wheels with %d jobs", len(wheels), jobs)
+    parallel.run_parallel(
+        lambda wheel: _run_pip(['install', '--quiet', '--no-deps', '--no-index']
+            + list(install_args) + [wheel], "Installing %s" % os.path.basename(wheel)),
+        wheels, jobs)
+
+
+def install(requirements, index_args=(), install_args=(), jobs=1, index_environ=None):
+    """Resolve, build and install requirements, through pip.
+
+    Args:
+        requirements (str list): the requirements to install
+        index_args (str list): pip's index options
+        install_args (str list): pip's installation scheme options
+        jobs (int): number of wheels built, then installed, concurrently
+        index_environ (dict): pip's index settings, from pip_index_environ()
+    """
+    pinned = resolve(requirements, index_args, install_args, index_environ)
+    if not pinned:
+        log.info("All requirements are already installed.")
+        return
+    wheel_dir = tempfile.mkdtemp(prefix='restricted_pkg-wheels-')
+    try:
+        wheels = build_wheels(pinned, wheel_dir, index_args, jobs, index_environ)
+        install_wheels(wheels, install_args, jobs)
+    finally:
+        shutil.rmtree(wheel_dir)
+
+
+def wheelhouse_url(wheelhouse):
+    """The file:// URL of a wheelhouse, usable as an index URL."""
+    url = 'file:' + pathname2url(os.path.abspath(wheelhouse))
+    if not url.endswith('/'):
+        url += '/'
+    return url
@@ -57,5 +57,8 @@ setup(
         'distutils.setup_keywords': [
             'private_repository = restricted_pkg.validators:validate_private_repo',
         ],
+        'console_scripts': [
+            'restricted-pkg = restricted_pkg.cli:main',
+        ],
     },
 )
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import asyncio
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # Python2
+    import mock
+
+from distutils.errors import DistutilsError, DistutilsOptionError
+
+from restricted_pkg import aio
+from restricted_pkg import base
+
+from .utils import IndexServerTestMixin
+from .test_commands import PYPIRC
+
+
+class GuessMetadataTestCase(unittest.TestCase):
+    def test_sdist(self):
+        self.assertEqual({'name': 'foo-bar', 'version': '1.0'},
+            aio.guess_metadata('/tmp/foo-bar-1.0.tar.gz'))
+
+    def test_wheel(self):
+        self.assertEqual({'name': 'foo_bar', 'version': '1.0'},
+            aio.guess_metadata('/tmp/foo_bar-1.0-py3-none-any.whl'))
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, aio.guess_metadata, '/tmp/foo-1.0.txt')
+
+
+class PublishTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(PublishTestCase, self).setUp()
+        base.clear_config_cache()
+        self.pypirc = self.write_pypirc(PYPIRC % self.server.url)
+        self.files = [
+            self.make_file('foo-1.0.tar.gz'),
+            self.make_file('foo-1.0-py3-none-any.whl'),
+            self.make_file('bar-2.0.tar.gz'),
+        ]
+        self.publisher = aio.Publisher(concurrency=2, pypirc=self.pypirc)
+
+    def tearDown(self):
+        self.publisher.close()
+        super(PublishTestCase, self).tearDown()
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_publish(self):
+        self.run_async(self.publisher.publish(self.files, self.server.url))
+        self.assertEqual(['bar-2.0.tar.gz', 'foo-1.0-py3-none-any.whl', 'foo-1.0.tar.gz'],
+            sorted(self.server.uploads))
+        bodies = [request[3] for request in self.server.requests]
+        self.assertTrue(any(b'name="name"\r\n\r\nbar' in body for body in bodies))
+
+    def test_module_publish(self):
+        self.run_async(aio.publish(self.files[:1], self.server.url, pypirc=self.pypirc,
+            metadata={'name': 'foo', 'version': '1.0'}))
+        self.assertEqual(['foo-1.0.tar.gz'], self.server.uploads)
+
+    def test_foreign_repository(self):
+        with self.assertRaises(DistutilsError) as context:
+            self.run_async(self.publisher.publish(self.files[:1], self.server.url,
+                repository='http://pypi.example.org/'))
+        self.assertIn('foo-1.0.tar.gz', str(context.exception))
+        self.assertEqual([], self.server.requests)
+        # The underlying error is the command's
+        self.assertRaises(DistutilsOptionError, self.publisher.make_upload,
+            self.files[0], self.server.url, repository='http://pypi.example.org/')
+
+    def test_missing_credentials(self):
+        base.clear_config_cache()
+        self.write_pypirc(PYPIRC.replace('password = doe\n', '') % self.server.url)
+        with mock.patch('getpass.getpass', side_effect=AssertionError("prompted")):
+            with self.assertRaises(DistutilsError) as context:
+                self.run_async(self.publisher.publish(self.files[:1], self.server.url))
+            self.assertRaises(DistutilsOptionError, self.publisher.make_upload,
+                self.files[0], self.server.url)
+        self.assertIn('Missing credentials', str(context.exception))
+        self.assertEqual([], self.server.requests)
+
+    def test_partial_failure(self):
+        self.server.status_codes = [500]
+        publisher = aio.Publisher(concurrency=1, pypirc=self.pypirc)
+        try:
+            with self.assertRaises(DistutilsError) as context:
+                self.run_async(publisher.publish(self.files, self.server.url))
+        finally:
+            publisher.close()
+        self.assertIn('1 of 3', str(context.exception))
+        self.assertEqual(2, len(self.server.uploads))
+
+    def test_cancel_pending(self):
+        async def cancelled_publish():
+            # Hold all slots: uploads wait, then get cancelled
+            for _i in range(self.publisher.concurrency):
+                await self.publisher.semaphore.acquire()
+            task = asyncio.ensure_future(self.publisher.publish(self.files, self.server.url))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.run_async(cancelled_publish())
+        self.assertEqual([], self.server.requests)
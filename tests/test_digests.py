@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from restricted_pkg import digests
+
+
+ALGORITHMS = [('md5', {}), ('sha256', {}), ('blake2b', {'digest_size': 32})]
+
+
+class DigestCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for index in range(3):
+            path = os.path.join(self.tmpdir, 'foo-1.%d.tar.gz' % index)
+            with open(path, 'wb') as f:
+                f.write(b'data %d' % index)
+            self.paths.append(path)
+        self.hashed = []
+        self.old_hash_file = digests.hash_file
+
+        def counting_hash_file(path, algorithms):
+            self.hashed.append(path)
+            return self.old_hash_file(path, algorithms)
+        digests.hash_file = counting_hash_file
+
+    def tearDown(self):
+        digests.hash_file = self.old_hash_file
+        shutil.rmtree(self.tmpdir)
+
+    def test_hash_file(self):
+        self.assertEqual({
+            'md5': hashlib.md5(b'data 0').hexdigest(),
+            'sha256': hashlib.sha256(b'data 0').hexdigest(),
+            'blake2b': hashlib.blake2b(b'data 0', digest_size=32).hexdigest(),
+        }, self.old_hash_file(self.paths[0], ALGORITHMS))
+
+    def test_compute(self):
+        results = digests.DigestCache(ALGORITHMS).compute(self.paths, jobs=3)
+        self.assertEqual(sorted(self.paths), sorted(self.hashed))
+        self.assertEqual(hashlib.sha256(b'data 2').hexdigest(), results[self.paths[2]]['sha256'])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, digests.MANIFEST_NAME)))
+
+        # Another process reuses the manifest
+        self.assertEqual(results, digests.DigestCache(ALGORITHMS).compute(self.paths, jobs=3))
+        self.assertEqual(3, len(self.hashed))
+
+    def test_invalidated_on_change(self):
+        cache = digests.DigestCache(ALGORITHMS)
+        cache.compute(self.paths)
+        with open(self.paths[0], 'wb') as f:
+            f.write(b'new data')
+        self.assertIsNone(cache.get(self.paths[0]))
+        results = digests.DigestCache(ALGORITHMS).compute(self.paths)
+        self.assertEqual(hashlib.md5(b'new data').hexdigest(), results[self.paths[0]]['md5'])
+        self.assertEqual(4, len(self.hashed))
+
+    def test_new_algorithm(self):
+        digests.DigestCache(ALGORITHMS[:1]).compute(self.paths[:1])
+        self.assertIsNone(digests.DigestCache(ALGORITHMS).get(self.paths[0]))
+
+    def test_removed_files(self):
+        cache = digests.DigestCache(ALGORITHMS)
+        cache.compute(self.paths[:1])
+        os.unlink(self.paths[0])
+        cache.compute(self.paths[1:2])
+        self.assertEqual([os.path.basename(self.paths[1])], list(cache._manifest(self.tmpdir)))
+
+    def test_invalid_entry(self):
+        cache = digests.DigestCache(ALGORITHMS)
+        cache.store(self.paths[0], {'md5': 'x', 'sha256': 'y', 'blake2b': 'z'},
+            digests.file_signature(self.paths[0]))
+        self.assertIsNone(digests.DigestCache(ALGORITHMS).get(self.paths[0]))
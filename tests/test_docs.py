@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from distutils.errors import DistutilsOptionError
+from setuptools.dist import Distribution
+
+from restricted_pkg import base
+from restricted_pkg import commands
+from restricted_pkg import docs
+
+from .utils import IndexServerTestMixin
+from .test_commands import PYPIRC
+
+
+def make_tree(root):
+    files = {
+        'index.html': b'<html>index</html>',
+        'api/module.html': b'<html>' + b'module ' * 1000 + b'</html>',
+        'api/nested/class.html': b'<html>class</html>',
+        '_static/logo.png': os.urandom(256),
+    }
+    for path, content in files.items():
+        full_path = os.path.join(root, *path.split('/'))
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, 'wb') as f:
+            f.write(content)
+    return files
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'html')
+        self.files = make_tree(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_manifest(self):
+        manifest = docs.build_manifest(self.root, jobs=2)
+        self.assertEqual(sorted(self.files), sorted(manifest['files']))
+        self.assertEqual(manifest, docs.build_manifest(self.root, jobs=1))
+
+        with open(os.path.join(self.root, 'index.html'), 'wb') as f:
+            f.write(b'<html>changed</html>')
+        self.assertNotEqual(manifest['digest'], docs.build_manifest(self.root)['digest'])
+
+    def test_archive(self):
+        manifest = docs.build_manifest(self.root)
+        target = os.path.join(self.tmpdir, 'docs.zip')
+        docs.write_archive(self.root, manifest, target, jobs=2)
+
+        archive = zipfile.ZipFile(target)
+        try:
+            self.assertIsNone(archive.testzip())
+            for path, content in self.files.items():
+                self.assertEqual(content, archive.read(path))
+            self.assertEqual(manifest, json.loads(archive.read(docs.MANIFEST_NAME).decode('utf-8')))
+            self.assertEqual(zipfile.ZIP_DEFLATED, archive.getinfo('api/module.html').compress_type)
+        finally:
+            archive.close()
+
+
+class UploadDocsTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(UploadDocsTestCase, self).setUp()
+        base.clear_config_cache()
+        self.write_pypirc(PYPIRC % self.server.url)
+        self.root = os.path.join(self.tmpdir, 'html')
+        make_tree(self.root)
+        self.dist = Distribution({'name': 'foo', 'version': '1.0'})
+        self.dist.private_repository = self.server.url
+
+    def make_command(self, **options):
+        cmd = commands.upload_docs(self.dist)
+        cmd.upload_dir = self.root
+        for key, value in options.items():
+            setattr(cmd, key, value)
+        cmd.ensure_finalized()
+        return cmd
+
+    def posts(self):
+        return [request for request in self.server.requests if request[0] == 'POST']
+
+    def test_upload(self):
+        self.make_command(jobs='2').run()
+        self.assertEqual(['foo.zip'], self.server.uploads)
+        self.assertIn(b'name=":action"\r\n\r\ndoc_upload', self.posts()[0][3])
+
+    def test_unchanged(self):
+        manifest = docs.build_manifest(self.root)
+        self.server.pages['/docs/foo/' + docs.MANIFEST_NAME] = json.dumps(manifest).encode('utf-8')
+        self.make_command().run()
+        self.assertEqual([], self.posts())
+        self.assertIn('Authorization', self.server.requests[0][2])
+
+        self.make_command(force=True).run()
+        self.assertEqual(1, len(self.posts()))
+
+    def test_changed(self):
+        self.server.pages['/docs/foo/' + docs.MANIFEST_NAME] = b'{"digest": "outdated"}'
+        self.make_command(docs_url=self.server.url + 'docs/foo').run()
+        self.assertEqual(1, len(self.posts()))
+
+    def test_empty(self):
+        shutil.rmtree(self.root)
+        os.makedirs(self.root)
+        cmd = self.make_command()
+        self.assertRaises(DistutilsOptionError, cmd.run)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import errno
+import hashlib
+import os
+import stat
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # Python2
+    import mock
+
+from restricted_pkg import httpcache
+from restricted_pkg.compat import HTTPError
+
+from .utils import IndexServerTestMixin
+
+
+class HTTPCacheTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(HTTPCacheTestCase, self).setUp()
+        self.cache = httpcache.HTTPCache(os.path.join(self.tmpdir, 'cache'))
+        self.server.pages['/simple/foo/'] = b'<a href="foo-1.0.tar.gz">foo</a>'
+        self.server.pages['/packages/foo-1.0.tar.gz'] = b'archive'
+
+    def fetch(self, path):
+        response = self.cache.open(self.server.url + path)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def test_revalidation(self):
+        self.assertEqual(b'<a href="foo-1.0.tar.gz">foo</a>', self.fetch('simple/foo/'))
+        self.assertEqual(b'<a href="foo-1.0.tar.gz">foo</a>', self.fetch('simple/foo/'))
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual('"%s"' % hashlib.md5(b'<a href="foo-1.0.tar.gz">foo</a>').hexdigest(),
+            self.server.requests[1][2]['If-None-Match'])
+
+        self.server.pages['/simple/foo/'] = b'updated'
+        self.assertEqual(b'updated', self.fetch('simple/foo/'))
+
+    def test_hashed_download(self):
+        digest = hashlib.sha256(b'archive').hexdigest()
+        path = 'packages/foo-1.0.tar.gz#sha256=%s' % digest
+        self.assertEqual(b'archive', self.fetch(path))
+        self.assertEqual(b'archive', self.fetch(path))
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_eviction(self):
+        self.cache.max_size = 10
+        self.fetch('packages/foo-1.0.tar.gz')
+        self.fetch('simple/foo/')
+        blobs = os.listdir(self.cache.blob_dir)
+        self.assertEqual([hashlib.sha256(self.server.pages['/simple/foo/']).hexdigest()], blobs)
+        # Meta files are bounded as well
+        self.assertEqual([httpcache._url_key(self.server.url + 'simple/foo/') + '.json'],
+            os.listdir(self.cache.meta_dir))
+
+    def test_incremental_size(self):
+        with mock.patch.object(self.cache, 'evict', wraps=self.cache.evict) as evict:
+            self.fetch('simple/foo/')
+            self.fetch('packages/foo-1.0.tar.gz')
+        # Only the first store scans the cache, which stays below max_size
+        self.assertEqual(1, evict.call_count)
+
+    def test_shared_modes(self):
+        self.fetch('simple/foo/')
+        for directory in (self.cache.blob_dir, self.cache.meta_dir):
+            for name in os.listdir(directory):
+                mode = stat.S_IMODE(os.stat(os.path.join(directory, name)).st_mode)
+                self.assertEqual(httpcache.FILE_MODE, mode)
+
+    def test_unreadable_entry(self):
+        self.fetch('simple/foo/')
+        blob_dir = self.cache.blob_dir
+
+        def restricted_open(path, *args):
+            if path.startswith(blob_dir):
+                raise IOError(errno.EACCES, "Permission denied", path)
+            return open(path, *args)
+
+        # e.g. stored by another user with a restrictive umask
+        with mock.patch.object(httpcache, 'open', restricted_open, create=True):
+            self.assertEqual(b'<a href="foo-1.0.tar.gz">foo</a>', self.fetch('simple/foo/'))
+        self.assertEqual(2, len(self.server.requests))
+        # Fetched again, not revalidated
+        self.assertNotIn('If-None-Match', self.server.requests[1][2])
+
+    def test_not_found(self):
+        self.assertRaises(HTTPError, self.fetch, 'missing')
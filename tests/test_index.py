@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import unittest
+
+import pkg_resources
+from setuptools.dist import Distribution
+
+from restricted_pkg import base
+from restricted_pkg import commands
+from restricted_pkg import index
+
+from .utils import IndexServerTestMixin
+from .test_commands import PYPIRC
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+  <head><title>Links for foo</title></head>
+  <body>
+    <h1>Links for foo</h1>
+    <a href="../../packages/foo-1.0.tar.gz#sha256=abcd">foo-1.0.tar.gz</a><br/>
+    <a href="../../packages/foo-1.0-py2.py3-none-any.whl" data-requires-python="&gt;=2.7">foo-1.0-py2.py3-none-any.whl</a><br/>
+    <a href='/packages/foo-2.0.zip'>foo-2.0.zip</a><br/>
+    <a href=/packages/foo_bar-2.0.tar.gz>foo_bar-2.0.tar.gz</a><br/>
+    <a href="https://files.example.org/foo-3.0b1.tar.gz?a=1&amp;b=2">foo-3.0b1.tar.gz</a><br/>
+  </body>
+</html>
+"""
+BASE_URL = 'https://pypi.example.org/simple/foo/'
+
+
+class LinkVersionTestCase(unittest.TestCase):
+    def test_sdist(self):
+        self.assertEqual('1.0', index.link_version('foo-1.0.tar.gz', 'foo'))
+        self.assertEqual('1.0', index.link_version('Foo.Bar-1.0.zip', 'foo-bar'))
+        self.assertIsNone(index.link_version('foo_bar-1.0.tar.gz', 'foo'))
+        self.assertIsNone(index.link_version('foo-1.0.exe', 'foo'))
+
+    def test_wheel(self):
+        self.assertEqual('1.0', index.link_version('foo_bar-1.0-py3-none-any.whl', 'foo-bar'))
+        self.assertIsNone(index.link_version('foo_bar-1.0-py3-none-any.whl', 'foo'))
+
+
+class LinkParserTestCase(unittest.TestCase):
+    def test_parse(self):
+        links = index.parse_links(PAGE, BASE_URL)
+        self.assertEqual([
+            'https://pypi.example.org/packages/foo-1.0.tar.gz',
+            'https://pypi.example.org/packages/foo-1.0-py2.py3-none-any.whl',
+            'https://pypi.example.org/packages/foo-2.0.zip',
+            'https://pypi.example.org/packages/foo_bar-2.0.tar.gz',
+            'https://files.example.org/foo-3.0b1.tar.gz?a=1&b=2',
+        ], [link.url for link in links])
+        self.assertEqual({'sha256': 'abcd'}, links[0].hashes)
+        self.assertEqual('>=2.7', links[1].requires_python)
+        self.assertEqual('foo-3.0b1.tar.gz', links[4].filename)
+
+    def test_chunked(self):
+        expected = [link.url for link in index.parse_links(PAGE, BASE_URL)]
+        for chunk_size in (1, 2, 7, 64):
+            parser = index.LinkParser(BASE_URL)
+            links = []
+            for start in range(0, len(PAGE), chunk_size):
+                links.extend(parser.feed(PAGE[start:start + chunk_size]))
+            self.assertEqual(expected, [link.url for link in links])
+
+    def test_base(self):
+        links = index.parse_links('<base href="/mirror/"><a href="foo-1.0.tar.gz">', BASE_URL)
+        self.assertEqual(['https://pypi.example.org/mirror/foo-1.0.tar.gz'], [l.url for l in links])
+
+    def test_requirement(self):
+        requirement = pkg_resources.Requirement.parse('foo>=1.0,<3')
+        links = index.parse_links(PAGE, BASE_URL, requirement)
+        self.assertEqual(
+            ['foo-1.0.tar.gz', 'foo-1.0-py2.py3-none-any.whl', 'foo-2.0.zip'],
+            [link.filename for link in links],
+        )
+
+
+class FetchTestCase(IndexServerTestMixin, unittest.TestCase):
+    def test_fetch(self):
+        self.server.pages['/simple/foo/'] = PAGE.encode('utf-8')
+        requirement = pkg_resources.Requirement.parse('foo==2.0')
+        links = index.fetch_project_links(self.server.url + 'simple', 'Foo', requirement)
+        self.assertEqual(['foo-2.0.zip'], [link.filename for link in links])
+
+    def test_missing(self):
+        self.assertEqual([], index.fetch_project_links(self.server.url + 'simple/', 'bar'))
+
+
+class PrivatePackageIndexTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(PrivatePackageIndexTestCase, self).setUp()
+        self.server.pages['/simple/foo/'] = PAGE.encode('utf-8')
+        self.package_index = commands.PrivatePackageIndex(self.server.url + 'simple/')
+
+    def versions(self):
+        return sorted(set(dist.version for dist in self.package_index['foo']))
+
+    def test_find_packages(self):
+        self.package_index.find_packages(pkg_resources.Requirement.parse('foo>=2'))
+        self.assertEqual(['2.0', '3.0b1'], self.versions())
+        self.package_index.find_packages(pkg_resources.Requirement.parse('foo>=2'))
+        paths = [request[1] for request in self.server.requests]
+        self.assertEqual(['/simple/foo/'], paths)
+
+    def test_other_requirement(self):
+        self.package_index.find_packages(pkg_resources.Requirement.parse('foo>=2'))
+        # Links were filtered: read the page again
+        self.package_index.find_packages(pkg_resources.Requirement.parse('foo<2'))
+        self.assertEqual(['1.0', '2.0', '3.0b1'], self.versions())
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_missing(self):
+        self.package_index.find_packages(pkg_resources.Requirement.parse('bar'))
+        self.assertEqual([], list(self.package_index['bar']))
+
+    def test_easy_install(self):
+        base.clear_config_cache()
+        self.write_pypirc(PYPIRC % (self.server.url + 'simple/'))
+        dist = Distribution({
+            'name': 'foo',
+            'version': '1.0',
+            'cmdclass': {'install': commands.install, 'easy_install': commands.easy_install},
+        })
+        dist.private_repository = self.server.url + 'simple/'
+        cmd = commands.easy_install(dist)
+        cmd.disable_pypi = True
+        cmd.install_dir = self.tmpdir
+        cmd.args = ['bar']
+        cmd.ensure_finalized()
+        self.assertIsInstance(cmd.package_index, commands.PrivatePackageIndex)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import os
+import subprocess
+import sys
+import unittest
+
+from setuptools.dist import Distribution
+
+from restricted_pkg import commands
+from restricted_pkg import lazy
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LazyCommandTestCase(unittest.TestCase):
+    def test_import(self):
+        code = (
+            "import sys, restricted_pkg; "
+            "print('restricted_pkg.commands' in sys.modules or 'setuptools' in sys.modules)"
+        )
+        env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(b'False', output.strip())
+
+    def test_validators_import(self):
+        code = (
+            "import sys, restricted_pkg.validators; "
+            "print('restricted_pkg.base' in sys.modules or 'restricted_pkg.compat' in sys.modules)"
+        )
+        env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(b'False', output.strip())
+
+    def test_proxy(self):
+        proxy = lazy.lazy_command('restricted_pkg.commands', 'upload')
+        self.assertEqual(commands.upload.user_options, proxy.user_options)
+        self.assertEqual(commands.upload.boolean_options, proxy.boolean_options)
+
+        dist = Distribution({'name': 'foo', 'version': '1.0', 'cmdclass': {'upload': proxy}})
+        dist.private_repository = 'http://pypi.example.org/'
+        self.assertIsInstance(dist.get_command_obj('upload'), commands.upload)
+
+    def test_sub_commands(self):
+        proxy = lazy.lazy_command('restricted_pkg.commands', 'install')
+        self.assertEqual(commands.install.sub_commands, proxy.sub_commands)
+
+    def test_commands_setup(self):
+        # Only one setup() to maintain
+        self.assertIs(lazy.setup, commands.setup)
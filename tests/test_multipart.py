@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from restricted_pkg import multipart
+from restricted_pkg import parallel
+
+
+class MultipartEncoderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        self.data = b'x' * 1000 + b'y' * 1000
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fields(self):
+        content_type, body = multipart.encode_multipart([
+            ('name', 'foo'),
+            ('classifiers', ['A', 'B']),
+            ('empty', []),
+        ])
+        self.assertEqual('multipart/form-data; boundary=%s' % multipart.BOUNDARY, content_type)
+        sep = b'\r\n--' + multipart.BOUNDARY.encode('ascii')
+        self.assertEqual(
+            sep + b'\r\nContent-Disposition: form-data; name="name"\r\n\r\nfoo'
+            + sep + b'\r\nContent-Disposition: form-data; name="classifiers"\r\n\r\nA'
+            + sep + b'\r\nContent-Disposition: form-data; name="classifiers"\r\n\r\nB'
+            + sep + b'--\r\n',
+            body,
+        )
+
+    def test_streamed_file(self):
+        content = multipart.FileContent(self.path, [('sha256', {})], chunk_size=128)
+        encoder = multipart.MultipartEncoder([
+            ('content', ('foo-1.0.tar.gz', content)),
+            ('sha256_digest', multipart.Digest(content, 'sha256')),
+        ])
+        chunks = list(encoder)
+        self.assertTrue(len(chunks) > 10)
+        body = b''.join(chunks)
+        self.assertEqual(encoder.content_length, len(body))
+        self.assertIn(b'filename="foo-1.0.tar.gz"\r\n\r\n' + self.data, body)
+        digest = hashlib.sha256(self.data).hexdigest().encode('ascii')
+        self.assertIn(b'name="sha256_digest"\r\n\r\n' + digest, body)
+        # Encoders can be replayed
+        self.assertEqual(body, encoder.to_bytes())
+
+
+
+class FanOutTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'foo-1.0.tar.gz')
+        self.data = os.urandom(2000)
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        self.reads = []
+
+        test = self
+
+        class CountingContent(multipart.FileContent):
+            def __iter__(self):
+                for chunk in multipart.FileContent.__iter__(self):
+                    test.reads.append(len(chunk))
+                    yield chunk
+
+        self.content = CountingContent(self.path, [('sha256', {})], chunk_size=128)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_branches(self):
+        fanout = multipart.FanOut(self.content, 2, window=100)
+        first, second = fanout.branches
+        first_iter, second_iter = iter(first), iter(second)
+        self.assertEqual(self.data[:128], next(first_iter))
+        self.assertEqual(self.data[128:256], next(first_iter))
+        # Both branches share the chunks read from disk
+        self.assertEqual(self.data[:128], next(second_iter))
+        self.assertEqual(2, len(self.reads))
+
+        self.assertEqual(self.data[256:], b''.join(first_iter))
+        self.assertEqual(self.data[128:], b''.join(second_iter))
+        self.assertEqual(len(self.data), sum(self.reads))
+        self.assertEqual(hashlib.sha256(self.data).hexdigest(), first.hashers['sha256'].hexdigest())
+        self.assertEqual({}, fanout._chunks)
+
+    def test_window(self):
+        fanout = multipart.FanOut(self.content, 2, window=2)
+        results = parallel.run_parallel(lambda branch: b''.join(branch), fanout.branches, 2)
+        self.assertEqual([self.data, self.data], results)
+        self.assertEqual(len(self.data), sum(self.reads))
+
+    def test_closed_branch(self):
+        fanout = multipart.FanOut(self.content, 2, window=1)
+        first, second = fanout.branches
+        second.close()
+        # The closed branch doesn't hold the other one back
+        self.assertEqual(self.data, b''.join(first))
+
+    def test_restart(self):
+        fanout = multipart.FanOut(self.content, 2, window=100)
+        first, second = fanout.branches
+        first_iter = iter(first)
+        next(first_iter)
+        next(iter(second))
+        self.assertEqual(self.data, b''.join(second))
+        # The shared stream was still fully read, for digests
+        self.assertEqual(self.data[128:], b''.join(first_iter))
+        self.assertEqual(len(self.data), sum(self.reads))
+
+    def test_encoder(self):
+        fanout = multipart.FanOut(self.content, 2, window=2)
+        bodies = []
+        for branch in fanout.branches:
+            bodies.append(multipart.MultipartEncoder([
+                ('content', ('foo-1.0.tar.gz', branch)),
+                ('sha256_digest', multipart.Digest(branch, 'sha256')),
+            ]))
+        first, second = parallel.run_parallel(lambda body: body.to_bytes(), bodies, 2)
+        self.assertEqual(first, second)
+        digest = hashlib.sha256(self.data).hexdigest().encode('ascii')
+        self.assertIn(b'name="sha256_digest"\r\n\r\n' + digest, first)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import hashlib
+import os
+import unittest
+
+import pkg_resources
+from setuptools.package_index import PackageIndex
+
+from restricted_pkg import httpcache
+from restricted_pkg import prefetch
+
+from .utils import IndexServerTestMixin
+
+
+class PrefetchTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(PrefetchTestCase, self).setUp()
+        self.server.pages['/simple/bar/'] = (
+            b'<a href="/packages/bar-1.0.tar.gz">bar-1.0.tar.gz</a>'
+            b'<a href="/packages/bar-2.0.tar.gz#sha256=%s">bar-2.0.tar.gz</a>'
+            % hashlib.sha256(b'bar2').hexdigest().encode('ascii'))
+        self.server.pages['/packages/bar-1.0.tar.gz'] = b'bar1'
+        self.server.pages['/packages/bar-2.0.tar.gz'] = b'bar2'
+        self.package_index = PackageIndex(self.server.url + 'simple/')
+
+    def test_pages(self):
+        requirements = list(pkg_resources.parse_requirements(['bar', 'baz']))
+        prefetch.prefetch_requirements(self.package_index, requirements, jobs=4)
+        self.assertEqual(2, len(self.server.requests))
+
+        # Served from the prefetched pages
+        self.package_index.find_packages(requirements[0])
+        self.package_index.find_packages(requirements[1])
+        self.assertEqual(['1.0', '2.0'], sorted(dist.version for dist in self.package_index['bar']))
+        paths = [request[1] for request in self.server.requests]
+        self.assertEqual(1, paths.count('/simple/bar/'))
+
+    def test_archives(self):
+        cache = httpcache.HTTPCache(os.path.join(self.tmpdir, 'cache'))
+        self.package_index.opener = cache.opener(self.package_index.opener)
+        requirements = list(pkg_resources.parse_requirements(['bar<3']))
+        prefetch.prefetch_requirements(self.package_index, requirements, jobs=4, archives=True)
+        paths = sorted(request[1] for request in self.server.requests)
+        self.assertEqual(['/packages/bar-2.0.tar.gz', '/simple/bar/'], paths)
+        self.assertIn(hashlib.sha256(b'bar2').hexdigest(), os.listdir(cache.blob_dir))
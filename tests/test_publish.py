@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import os
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # Python2
+    import mock
+
+from restricted_pkg import base
+from restricted_pkg import compat
+from restricted_pkg import publish
+
+from .utils import IndexServerTestMixin
+from .test_commands import PYPIRC
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP_PY = """from restricted_pkg import setup
+
+setup(name=%r, version='1.0', private_repository=%r)
+"""
+
+SETUP_CFG = """[restricted_pkg]
+index-servers = private
+
+[restricted_pkg:private]
+repository = %s
+username = alice
+password = secret
+"""
+
+
+class PublishTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(PublishTestCase, self).setUp()
+        base.clear_config_cache()
+        self.pypirc = self.write_pypirc(PYPIRC % self.server.url)
+        self.old_pythonpath = os.environ.get('PYTHONPATH')
+        os.environ['PYTHONPATH'] = ROOT_DIR
+        self.repo = os.path.join(self.tmpdir, 'repo')
+        for name in ['foo', 'bar']:
+            self.make_package(os.path.join('libs', name), SETUP_PY % (name, self.server.url))
+
+    def tearDown(self):
+        if self.old_pythonpath is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = self.old_pythonpath
+        super(PublishTestCase, self).tearDown()
+
+    def make_package(self, path, setup_py):
+        path = os.path.join(self.repo, path)
+        os.makedirs(path)
+        with open(os.path.join(path, 'setup.py'), 'w') as f:
+            f.write(setup_py)
+        return path
+
+    def test_find_packages(self):
+        self.make_package(os.path.join('.hidden', 'baz'), '')
+        self.make_package(os.path.join('libs', 'foo', 'nested'), '')
+        packages = publish.find_packages([self.repo])
+        self.assertEqual(['bar', 'foo'], [os.path.basename(package.path) for package in packages])
+
+    def test_dist_file(self):
+        self.assertEqual(('sdist', '', '/tmp/foo-1.0.tar.gz'),
+            publish.dist_file('/tmp/foo-1.0.tar.gz'))
+        self.assertEqual(('bdist_wheel', 'py3', '/tmp/foo-1.0-py3-none-any.whl'),
+            publish.dist_file('/tmp/foo-1.0-py3-none-any.whl'))
+        self.assertEqual(None, publish.dist_file('/tmp/foo-1.0.txt'))
+
+    def test_unknown_cpu_count(self):
+        with mock.patch('os.cpu_count', return_value=None):
+            self.assertEqual(4, compat.cpu_count())
+
+    def test_publish(self):
+        self.make_package(os.path.join('libs', 'broken'), 'raise SystemExit(1)\n')
+        # Succeeds without building anything
+        self.make_package(os.path.join('libs', 'empty'), 'pass\n')
+        packages = publish.find_packages([self.repo])
+        publish.publish(packages, formats=['sdist'], build_jobs=3, upload_jobs=1,
+            pypirc=self.pypirc)
+
+        statuses = dict((package.name, package.status) for package in packages)
+        self.assertEqual(
+            {'bar': 'uploaded', 'foo': 'uploaded', 'broken': 'failed', 'empty': 'failed'},
+            statuses)
+        self.assertEqual(['bar-1.0.tar.gz', 'foo-1.0.tar.gz'], sorted(self.server.uploads))
+        # Both uploads reused the same connection
+        self.assertEqual(1, len(self.server.clients))
+
+    def test_make_upload_project_config(self):
+        # Only declared in the package's setup.cfg
+        repo_url = self.server.url + '/teams/baz/'
+        path = self.make_package('baz', SETUP_PY % ('baz', repo_url))
+        with open(os.path.join(path, 'setup.cfg'), 'w') as f:
+            f.write(SETUP_CFG % repo_url)
+        package = publish.Package(path)
+        cwd = os.getcwd()
+        cmd = publish.make_upload(package, self.pypirc, skip_existing=False)
+        self.assertEqual(cwd, os.getcwd())
+        self.assertEqual('alice', cmd.username)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import socket
+import unittest
+
+from restricted_pkg import retry
+
+
+class FakeResponse(object):
+    def __init__(self, status, retry_after=None):
+        self.status = status
+        self.reason = 'Reason'
+        self.headers = {'Retry-After': retry_after} if retry_after else {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+class RetryAfterTestCase(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(120.0, retry.parse_retry_after('120'))
+
+    def test_date(self):
+        self.assertEqual(30.0, retry.parse_retry_after(
+            'Wed, 21 Oct 2015 07:28:30 GMT', now=1445412480.0))
+        self.assertEqual(0.0, retry.parse_retry_after(
+            'Wed, 21 Oct 2015 07:28:00 GMT', now=1445412500.0))
+
+    def test_invalid(self):
+        self.assertIsNone(retry.parse_retry_after(None))
+        self.assertIsNone(retry.parse_retry_after('soon'))
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def test_exponential(self):
+        policy = retry.RetryPolicy(backoff=1.0, max_backoff=10.0, random_func=lambda: 1.0)
+        self.assertEqual([1.0, 2.0, 4.0, 8.0, 10.0], [policy.delay(i) for i in range(5)])
+
+    def test_jitter(self):
+        policy = retry.RetryPolicy(backoff=1.0, random_func=lambda: 0.25)
+        self.assertEqual(1.0, policy.delay(2))
+
+    def test_retry_after(self):
+        policy = retry.RetryPolicy(backoff=1.0, max_backoff=10.0, random_func=lambda: 1.0)
+        self.assertEqual(120.0, policy.delay(0, retry_after=120.0))
+        self.assertEqual(4.0, policy.delay(2, retry_after=1.0))
+
+
+class AIMDLimiterTestCase(unittest.TestCase):
+    def test_aimd(self):
+        limiter = retry.AIMDLimiter(8)
+        limiter.pushback()
+        limiter.pushback()
+        self.assertEqual(2.0, limiter.limit)
+        for _i in range(3):
+            limiter.success()
+        # 2 + 1/2 + 1/2.5 + 1/2.9
+        self.assertEqual(3, int(limiter.limit))
+        for _i in range(100):
+            limiter.success()
+        self.assertEqual(8.0, limiter.limit)
+        for _i in range(10):
+            limiter.pushback()
+        self.assertEqual(1.0, limiter.limit)
+
+    def test_slot(self):
+        limiter = retry.AIMDLimiter(2)
+        with limiter.slot():
+            with limiter.slot():
+                self.assertEqual(2, limiter.in_flight)
+        self.assertEqual(0, limiter.in_flight)
+
+
+def unsent(error):
+    error.request_sent = False
+    return error
+
+
+class SendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.delays = []
+        self.policy = retry.RetryPolicy(retries=2, backoff=1.0, random_func=lambda: 1.0)
+
+    def send(self, outcomes, limiter=None):
+        outcomes = list(outcomes)
+
+        def request():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return retry.send(request, self.policy, limiter, sleep=self.delays.append)
+
+    def test_success(self):
+        self.assertEqual(200, self.send([FakeResponse(200)]).status)
+        self.assertEqual([], self.delays)
+
+    def test_overloaded(self):
+        limiter = retry.AIMDLimiter(4)
+        response = self.send([FakeResponse(503), FakeResponse(429, '5'), FakeResponse(200)],
+            limiter)
+        self.assertEqual(200, response.status)
+        self.assertEqual([1.0, 5.0], self.delays)
+        # Halved twice, then one success
+        self.assertEqual(2.0, limiter.limit)
+
+    def test_connection_error(self):
+        response = self.send([unsent(socket.error('refused')), FakeResponse(200)])
+        self.assertEqual(200, response.status)
+        self.assertEqual([1.0], self.delays)
+
+    def test_timeout_after_send(self):
+        timeout = socket.timeout('timed out')
+        timeout.request_sent = True
+        self.assertRaises(socket.timeout, self.send, [timeout, FakeResponse(200)])
+        self.assertEqual([], self.delays)
+        # Unknown origin: not retried either
+        self.assertRaises(socket.error, self.send, [socket.error('reset'), FakeResponse(200)])
+
+    def test_exhausted(self):
+        self.assertEqual(503, self.send([FakeResponse(503)] * 3).status)
+        self.assertEqual([1.0, 2.0], self.delays)
+        self.assertRaises(socket.error, self.send,
+            [unsent(socket.error('refused')) for _i in range(3)])
+
+    def test_other_error(self):
+        self.assertEqual(500, self.send([FakeResponse(500)]).status)
+        self.assertEqual([], self.delays)
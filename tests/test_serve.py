@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import hashlib
+import os
+import threading
+import unittest
+
+from restricted_pkg import base
+from restricted_pkg import cli
+from restricted_pkg import httpcache
+from restricted_pkg import serve
+from restricted_pkg.compat import HTTPError, Request, urlopen
+
+from .utils import IndexServer, IndexServerTestMixin
+
+
+class ServeTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(ServeTestCase, self).setUp()
+        self.upstream = IndexServer()
+        self.upstream.start()
+
+        self.archive = b'private archive'
+        digest = hashlib.sha256(self.archive).hexdigest()
+        self.server.pages['/foo/'] = (
+            '<a href="/packages/foo-1.0.tar.gz#sha256=%s" data-requires-python="&gt;=3">'
+            'foo-1.0.tar.gz</a>' % digest).encode('utf-8')
+        self.server.pages['/packages/foo-1.0.tar.gz'] = self.archive
+        self.upstream.pages['/foo/'] = b'<a href="/packages/foo-9.0.tar.gz">foo-9.0.tar.gz</a>'
+        self.upstream.pages['/bar/'] = b'<a href="/packages/bar-1.0.tar.gz">bar-1.0.tar.gz</a>'
+
+        private_url = base.RepositoryURL('http://john:doe@' + self.server.url[len('http://'):])
+        proxy = serve.ProxyIndex(private_url, self.upstream.url,
+            httpcache.HTTPCache(os.path.join(self.tmpdir, 'cache')), page_ttl=60)
+        self.proxy = serve.ProxyServer(('127.0.0.1', 0), proxy)
+        thread = threading.Thread(target=self.proxy.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.proxy.shutdown()
+        self.proxy.server_close()
+        self.upstream.stop()
+        super(ServeTestCase, self).tearDown()
+
+    def get(self, path):
+        response = urlopen(Request(self.proxy.url + path))
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def gets(self, server):
+        return [request[1] for request in server.requests if request[0] == 'GET']
+
+    def test_private_first(self):
+        page = self.get('foo/').decode('utf-8')
+        self.assertIn('foo-1.0.tar.gz', page)
+        self.assertIn('data-requires-python="&gt;=3"', page)
+        self.assertNotIn('foo-9.0', page)
+        self.assertEqual([], self.gets(self.upstream))
+        self.assertIn('Authorization', self.server.requests[0][2])
+
+    def test_upstream(self):
+        self.assertIn(b'bar-1.0.tar.gz', self.get('bar/'))
+        self.assertEqual(['/bar/'], self.gets(self.server))
+        self.assertEqual(['/bar/'], self.gets(self.upstream))
+
+    def test_unknown(self):
+        with self.assertRaises(HTTPError) as context:
+            self.get('baz/')
+        self.assertEqual(404, context.exception.code)
+
+    def test_normalized(self):
+        self.assertIn(b'foo-1.0.tar.gz', self.get('Foo/'))
+
+    def test_page_ttl(self):
+        self.get('foo/')
+        self.get('foo/')
+        self.assertEqual(['/foo/'], self.gets(self.server))
+
+    def test_files(self):
+        page = self.get('foo/').decode('utf-8')
+        href = page.split('href="', 1)[1].split('"', 1)[0]
+        self.assertTrue(href.startswith('/files/'))
+        url = 'http://127.0.0.1:%d%s' % (self.proxy.server_address[1], href.split('#')[0])
+        self.assertEqual(self.archive, urlopen(url).read())
+        self.assertEqual(self.archive, urlopen(url).read())
+        # Known sha256: served from the cache
+        self.assertEqual(1, self.gets(self.server).count('/packages/foo-1.0.tar.gz'))
+
+    def test_forged_file(self):
+        href = self.proxy.proxy.file_path(
+            serve.index.Link(self.server.url + 'packages/foo-1.0.tar.gz'))
+        forged = href.replace('/files/', '/files/0', 1)
+        with self.assertRaises(HTTPError) as context:
+            urlopen('http://127.0.0.1:%d%s' % (self.proxy.server_address[1], forged))
+        self.assertEqual(404, context.exception.code)
+
+    def test_cli(self):
+        self.assertIn('serve', cli.COMMANDS)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import json
+import os
+import unittest
+
+from setuptools.dist import Distribution
+
+from restricted_pkg import base
+from restricted_pkg import commands
+from restricted_pkg import timing
+
+from .utils import IndexServerTestMixin
+from .test_commands import PYPIRC
+
+
+class RecorderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.recorder = timing.Recorder('report.json', clock=lambda: self.now)
+
+    def test_nested(self):
+        outer = self.recorder.start('outer')
+        self.now += 1
+        inner = self.recorder.start('inner')
+        self.now += 2
+        self.recorder.finish(inner)
+        self.recorder.finish(outer)
+
+        report = self.recorder.report()
+        self.assertEqual(3.0, report['total'])
+        self.assertEqual(
+            [('outer', 0.0, 3.0, 0), ('inner', 1.0, 2.0, 1)],
+            [(span['name'], span['start'], span['duration'], span['depth'])
+                for span in report['spans']])
+        self.assertEqual({'count': 1, 'total': 2.0}, report['summary']['inner'])
+
+    def test_disabled(self):
+        self.assertIs(timing._NO_SPAN, timing.span('foo'))
+
+
+class TimingReportTestCase(IndexServerTestMixin, unittest.TestCase):
+    def tearDown(self):
+        timing.disable()
+        super(TimingReportTestCase, self).tearDown()
+
+    def test_upload(self):
+        base.clear_config_cache()
+        self.write_pypirc(PYPIRC % self.server.url)
+        dist = Distribution({'name': 'foo', 'version': '1.0'})
+        dist.private_repository = self.server.url
+        dist.dist_files = [('sdist', '', self.make_file('foo-1.0.tar.gz'))]
+
+        report_path = os.path.join(self.tmpdir, 'timing.json')
+        cmd = commands.upload(dist)
+        cmd.timing_report = report_path
+        cmd.ensure_finalized()
+        cmd.run()
+        timing._write_report()
+
+        with open(report_path) as f:
+            report = json.load(f)
+        for name in ['upload.finalize_options', 'get_repo_url', 'PyPIConfig._read_config',
+                'RepositoryConfig.get_clean_url', 'upload.run', 'upload.upload_file',
+                'transport.connect', 'transport.request']:
+            self.assertIn(name, report['summary'])
+
+    def test_register(self):
+        base.clear_config_cache()
+        self.write_pypirc(PYPIRC % self.server.url)
+        # No packages: the 'check' sub-command would look for some
+        dist = Distribution({'name': 'foo', 'version': '1.0', 'py_modules': []})
+        dist.private_repository = self.server.url
+
+        report_path = os.path.join(self.tmpdir, 'timing.json')
+        cmd = commands.register(dist)
+        cmd.timing_report = report_path
+        cmd.ensure_finalized()
+        cmd.run()
+        timing._write_report()
+
+        with open(report_path) as f:
+            report = json.load(f)
+        for name in ['register.finalize_options', 'register.run', 'register.post_to_server']:
+            self.assertIn(name, report['summary'])
+
+    def test_install_finalize_options(self):
+        report_path = os.path.join(self.tmpdir, 'timing.json')
+        cmd = commands.install(Distribution({'name': 'foo', 'version': '1.0'}))
+        cmd.timing_report = report_path
+        cmd.ensure_finalized()
+        timing._write_report()
+
+        with open(report_path) as f:
+            report = json.load(f)
+        self.assertIn('install.finalize_options', report['summary'])
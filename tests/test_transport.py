@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+import base64
+import os
+import socket
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # Python2
+    import mock
+
+from restricted_pkg import transport
+
+from .utils import IndexServerTestMixin
+
+
+class ConnectionPoolTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(ConnectionPoolTestCase, self).setUp()
+        self.pool = transport.ConnectionPool(timeout=5)
+        self.server.pages['/simple/'] = b'<html></html>'
+
+    def tearDown(self):
+        self.pool.close()
+        super(ConnectionPoolTestCase, self).tearDown()
+
+    def test_keep_alive(self):
+        for _i in range(3):
+            response = self.pool.request('GET', self.server.url + 'simple/')
+            self.assertEqual(200, response.status)
+            self.assertEqual(b'<html></html>', response.data)
+        self.assertEqual(1, len(self.server.clients))
+
+    def test_unread_response_is_not_reused(self):
+        response = self.pool.request('GET', self.server.url + 'simple/', stream=True)
+        response.release()
+        self.pool.request('GET', self.server.url + 'simple/')
+        self.assertEqual(2, len(self.server.clients))
+
+    def test_streaming(self):
+        response = self.pool.request('GET', self.server.url + 'simple/', stream=True)
+        self.assertEqual(b'<html></html>', b''.join(response.iter_content(4)))
+        self.pool.request('GET', self.server.url + 'simple/')
+        self.assertEqual(1, len(self.server.clients))
+
+    def test_auth_from_url(self):
+        url = self.server.url.replace('http://', 'http://john:doe@')
+        self.pool.request('GET', url + 'simple/')
+        headers = self.server.requests[0][2]
+        self.assertEqual(
+            'Basic ' + base64.b64encode(b'john:doe').decode('ascii'),
+            headers['Authorization'],
+        )
+
+    def test_server_closed_connection(self):
+        self.pool.request('GET', self.server.url + 'simple/')
+        # Simulate the server dropping the kept-alive connection
+        for connections in self.pool._idle.values():
+            for connection in connections:
+                connection.sock.close()
+        response = self.pool.request('GET', self.server.url + 'simple/')
+        self.assertEqual(200, response.status)
+
+    def test_timeout_after_send(self):
+        self.pool.request('GET', self.server.url + 'simple/')
+        self.pool.timeout = 0.2
+        self.server.post_delay = 0.5
+        # Reused connection, but the request may have been processed
+        for connections in self.pool._idle.values():
+            for connection in connections:
+                connection.sock.settimeout(0.2)
+        self.assertRaises(socket.timeout, self.pool.request,
+            'POST', self.server.url + 'upload/', body=b'data')
+        self.assertEqual(1, len([r for r in self.server.requests if r[0] == 'POST']))
+
+
+class ProxyTestCase(IndexServerTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(ProxyTestCase, self).setUp()
+        self.pool = transport.ConnectionPool(timeout=5)
+        self.server.pages['http://pypi.example.org/simple/'] = b'<html></html>'
+
+    def tearDown(self):
+        self.pool.close()
+        super(ProxyTestCase, self).tearDown()
+
+    def test_http_proxy(self):
+        proxy = self.server.url.replace('http://', 'http://john:doe@')
+        with mock.patch.dict(os.environ, {'http_proxy': proxy, 'no_proxy': ''}):
+            response = self.pool.request('GET', 'http://pypi.example.org/simple/')
+        self.assertEqual(b'<html></html>', response.data)
+        method, path, headers, body = self.server.requests[0]
+        self.assertEqual('http://pypi.example.org/simple/', path)
+        self.assertEqual(transport.basic_auth('john', 'doe'), headers['Proxy-Authorization'])
+
+    def test_no_proxy(self):
+        self.server.pages['/simple/'] = b'<html></html>'
+        environ = {'http_proxy': 'http://127.0.0.1:9/', 'no_proxy': '127.0.0.1'}
+        with mock.patch.dict(os.environ, environ):
+            response = self.pool.request('GET', self.server.url + 'simple/')
+        self.assertEqual(200, response.status)
+
+    def test_https_tunnel(self):
+        with mock.patch.dict(os.environ, {'https_proxy': 'proxy.example.org:3128', 'no_proxy': ''}):
+            proxy = transport.get_proxy('https', 'pypi.example.org:8443')
+        connection, reused = self.pool._get(('https', 'pypi.example.org:8443', None), proxy)
+        self.assertEqual(('proxy.example.org', 3128), (connection.host, connection.port))
+        self.assertEqual(('pypi.example.org', 8443),
+            (connection._tunnel_host, connection._tunnel_port))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2013 Raphaël Barrois.
+# Distributed under the MIT License.
+
+
+"""Test helpers: a local stand-in for a private package index."""
+
+import hashlib
+import re
+import shutil
+import tempfile
+import threading
+import time
+import os
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+FILENAME_RE = re.compile(br'filename="([^"]+)"')
+
+
+class IndexRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body=b'', headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_one_request(self):
+        self.server.clients.add(self.client_address)
+        BaseHTTPRequestHandler.handle_one_request(self)
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, self.headers, b''))
+        page = self.server.pages.get(self.path)
+        if page is None:
+            self._respond(404, b'Not found')
+            return
+        etag = '"%s"' % hashlib.md5(page).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self._respond(304, headers=[('ETag', etag)])
+        else:
+            self._respond(200, page, [('Content-Type', 'text/html'), ('ETag', etag)])
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        self.server.requests.append(('POST', self.path, self.headers, body))
+        time.sleep(self.server.post_delay)
+        status = self.server.status_codes.pop(0) if self.server.status_codes else 200
+        match = FILENAME_RE.search(body)
+        if status == 200 and match:
+            self.server.uploads.append(match.group(1).decode('utf-8'))
+        self._respond(status, b'OK' if status == 200 else b'Error')
+
+
+class IndexServer(ThreadingMixIn, HTTPServer):
+    """A minimal package index, recording requests.
+
+    Attributes:
+        requests (list): (method, path, headers, body) of received requests
+        uploads (list): names of successfully uploaded files
+        pages (dict): path => content of pages served on GET
+        status_codes (list): status codes for the next POST requests
+        post_delay (float): seconds to wait before answering POST requests
+        clients (set): addresses of clients that sent requests
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), IndexRequestHandler)
+        self.requests = []
+        self.uploads = []
+        self.pages = {}
+        self.status_codes = []
+        self.post_delay = 0
+        self.clients = set()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/' % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class IndexServerTestMixin(object):
+    """Run an IndexServer and a private $HOME for each test."""
+
+    def setUp(self):
+        super(IndexServerTestMixin, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.tmpdir
+        self.server = IndexServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        if self.old_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.tmpdir)
+        super(IndexServerTestMixin, self).tearDown()
+
+    def write_pypirc(self, content):
+        path = os.path.join(self.tmpdir, '.pypirc')
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def make_file(self, name, content=b'data'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path